@@ -0,0 +1,5 @@
+"""Allow running as: python -m bench"""
+
+from bench.hotpaths import main
+
+main()
@@ -0,0 +1,343 @@
+"""Micro-benchmarks for the hot paths, checked against JSON baselines.
+
+Benchmarks (ns per operation):
+  arcade_mix       motors.arcade_mix over a sweep of stick positions
+  dispatch_drive   json.loads + ControlServer._dispatch of a drive message
+  mjpeg_parse      MjpegParser.feed over a multipart capture in 16 KiB
+                   chunks, per frame (synthetic capture, or --capture FILE
+                   recorded with --record-capture)
+  output_fanout    StreamingOutput.write until 64 wait_frame() coroutines
+                   on one loop have the frame, per frame
+  trace_span       common.tracing span with a trace ID around a nested
+                   one that inherits it, per outer span
+  ui_render        ui.render of a 640x480 frame on a headless 1280x800 surface
+
+Each benchmark is calibrated to ~20 ms per round and run for several
+rounds with the GC disabled. The best round is compared with the
+baseline for this machine (bench/baselines/<hostname>.json): it is the
+least disturbed by other processes, so it moves with the code rather
+than with the load. A best round more than its threshold (default 20 %)
+above the baseline fails the run; the median is reported alongside.
+
+Usage:
+    uv run python -m bench                      # run, compare, exit 1 on regression
+    uv run python -m bench --save               # record this machine's baseline
+    uv run python -m bench --only mjpeg_parse ui_render --rounds 15
+    uv run python -m bench --record-capture capture.mjpeg --url http://robothector.local:5000/video_feed
+"""
+
+import argparse
+import asyncio
+import gc
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+BASELINE_DIR = os.path.join(os.path.dirname(__file__), "baselines")
+THRESHOLD = 0.20        # allowed slowdown of the best round vs. the baseline
+ROUND_TIME = 0.02       # seconds per calibrated round
+ROUNDS = 9
+CHUNK = 16384           # bytes per read fed to the MJPEG parser
+FANOUT_WAITERS = 64
+
+_BENCHMARKS: dict = {}
+
+
+def benchmark(name: str):
+    """Register `setup(args) -> run(n)`; run(n) performs n operations."""
+    def register(setup):
+        _BENCHMARKS[name] = setup
+        return setup
+    return register
+
+
+@benchmark("arcade_mix")
+def _arcade_mix(args):
+    from server import motors
+
+    sticks = [(x / 10, y / 10) for x in range(-10, 11) for y in range(-10, 11)]
+
+    def run(n):
+        mix = motors.arcade_mix
+        for i in range(n):
+            mix(*sticks[i % len(sticks)])
+    return run
+
+
+@benchmark("dispatch_drive")
+def _dispatch_drive(args):
+    from server.control import ControlServer
+
+    server = ControlServer()
+    raws = [json.dumps({"type": "drive", "axis_x": x / 10, "axis_y": -0.5}) for x in range(-10, 11)]
+
+    def run(n):
+        loads, dispatch = json.loads, server._dispatch
+        for i in range(n):
+            dispatch(loads(raws[i % len(raws)]))
+    return run
+
+
+@benchmark("mjpeg_parse")
+def _mjpeg_parse(args):
+    from client.video import MjpegParser
+
+    capture = _load_capture(args.capture) if args.capture else _synthetic_capture()
+    chunks = [capture[i:i + CHUNK] for i in range(0, len(capture), CHUNK)]
+    if not MjpegParser().feed(capture):
+        raise RuntimeError("capture contains no frames")
+
+    def run(n):
+        parsed = 0
+        while True:
+            parser = MjpegParser()
+            for chunk in chunks:
+                parsed += len(parser.feed(chunk))
+                if parsed >= n:
+                    return
+    return run
+
+
+@benchmark("output_fanout")
+def _output_fanout(args):
+    from server.camera import StreamingOutput
+
+    output = StreamingOutput("bench")
+    frame = _fake_jpeg(40 * 1024, 0)
+
+    async def cycle(n):
+        received = 0
+        done = asyncio.Event()
+
+        async def viewer():
+            nonlocal received
+            seq = output.seq
+            while True:
+                seq, _, _, _ = await output.wait_frame(seq)
+                received += 1
+                if received == FANOUT_WAITERS:
+                    done.set()
+
+        viewers = [asyncio.create_task(viewer()) for _ in range(FANOUT_WAITERS)]
+        await asyncio.sleep(0)
+        for _ in range(n):
+            received = 0
+            done.clear()
+            output.write(frame)
+            await done.wait()
+        for task in viewers:
+            task.cancel()
+
+    def run(n):
+        asyncio.run(cycle(n))
+    return run
+
+
+@benchmark("trace_span")
+def _trace_span(args):
+    from common import tracing
+
+    tracing.configure("bench", time.monotonic_ns)
+
+    def run(n):
+        span = tracing.span
+        for i in range(n):
+            with span("outer", i):
+                with span("inner"):
+                    pass
+    return run
+
+
+@benchmark("ui_render")
+def _ui_render(args):
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    import pygame
+    from client import ui
+
+    pygame.init()
+    ui.init()
+    screen = pygame.Surface((ui.SCREEN_W, ui.SCREEN_H))
+    frame = pygame.Surface((640, 480))
+    frame.fill((80, 120, 60))
+    state = {"type": "state", "mode": "firefighter", "connected": True}
+    stats = {"capture_to_receive": {"p50": 42.0, "p95": 60.0, "max": 80.0},
+             "capture_to_display": {"p50": 70.0, "p95": 95.0, "max": 120.0},
+             "frame_gap": {"p50": 33.0, "p95": 40.0, "max": 66.0},
+             "frames": 1000, "dropped": 3}
+    input_data = {"axis_x": 0.2, "axis_y": -0.6, "mode": "firefighter"}
+
+    def run(n):
+        for _ in range(n):
+            ui.render(screen, frame, state=state, input_data=input_data, connected=True,
+                      video_connected=True, video_stats=stats)
+    return run
+
+
+# --- Captures ---
+
+def _fake_jpeg(size: int, seed: int) -> bytes:
+    body = bytes((i * 31 + seed) % 255 for i in range(size))  # never 0xff
+    return b"\xff\xd8" + body + b"\xff\xd9"
+
+
+def _synthetic_capture(frames: int = 60) -> bytes:
+    """Multipart bytes exactly as the server emits them."""
+    from server.camera import StreamingOutput
+
+    output = StreamingOutput("bench")
+    parts = []
+    for i in range(frames):
+        jpeg = _fake_jpeg(20000 + (i * 7919) % 25000, i)
+        output.write(jpeg)
+        parts += [output.part_header, jpeg, b"\r\n"]
+    return b"".join(parts)
+
+
+def _load_capture(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+
+def record_capture(url: str, path: str, frames: int):
+    """Save the raw multipart body of a live /video_feed for --capture."""
+    import urllib.request
+
+    data = bytearray()
+    with urllib.request.urlopen(url, timeout=5) as stream:
+        while data.count(b"--frame") <= frames:
+            chunk = stream.read1(65536)
+            if not chunk:
+                break
+            data += chunk
+    end = data.rfind(b"--frame")
+    with open(path, "wb") as f:
+        f.write(data[:end])
+    print(f"[bench] saved {data[:end].count(b'--frame')} frames ({end >> 10} KiB) to {path}")
+
+
+# --- Runner ---
+
+def measure(run, rounds: int) -> dict:
+    """Best/median ns per operation over `rounds` calibrated rounds."""
+    n = 1
+    while True:
+        t0 = time.perf_counter()
+        run(n)
+        if time.perf_counter() - t0 >= ROUND_TIME / 4:
+            break
+        n *= 4
+    n = max(1, int(n * ROUND_TIME / max(time.perf_counter() - t0, 1e-9)))
+
+    per_op = []
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(rounds):
+            t0 = time.perf_counter_ns()
+            run(n)
+            per_op.append((time.perf_counter_ns() - t0) / n)
+    finally:
+        if enabled:
+            gc.enable()
+    return {"median_ns": statistics.median(per_op), "min_ns": min(per_op),
+            "ops_per_round": n, "rounds": rounds}
+
+
+def _baseline_path(args) -> str:
+    return args.baseline or os.path.join(BASELINE_DIR, f"{platform.node() or 'default'}.json")
+
+
+def _load_baseline(path: str) -> dict:
+    try:
+        with open(path) as f:
+            return json.load(f).get("results", {})
+    except FileNotFoundError:
+        return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot-path micro-benchmarks")
+    parser.add_argument("--only", nargs="+", choices=sorted(_BENCHMARKS), help="Benchmarks to run")
+    parser.add_argument("--rounds", type=int, default=ROUNDS)
+    parser.add_argument("--baseline", help="Baseline JSON (default: bench/baselines/<host>.json)")
+    parser.add_argument("--save", action="store_true", help="Write results as the new baseline")
+    parser.add_argument("--threshold", type=float, default=None,
+                        help="Override every benchmark's allowed slowdown (0.2 = 20 %%)")
+    parser.add_argument("--json", metavar="PATH", help="Also write results to PATH")
+    parser.add_argument("--capture", help="Recorded multipart capture for mjpeg_parse")
+    parser.add_argument("--record-capture", metavar="PATH", help="Record a capture and exit")
+    parser.add_argument("--url", default="http://robothector.local:5000/video_feed")
+    parser.add_argument("--frames", type=int, default=120, help="Frames to record")
+    args = parser.parse_args()
+
+    if args.record_capture:
+        record_capture(args.url, args.record_capture, args.frames)
+        return
+
+    path = _baseline_path(args)
+    baseline = _load_baseline(path)
+    results = {}
+    regressions = []
+
+    print(f"{'benchmark':<16} {'best':>12} {'median':>12} {'baseline':>12} {'change':>8}")
+    for name in args.only or list(_BENCHMARKS):
+        r = measure(_BENCHMARKS[name](args), args.rounds)
+        base = baseline.get(name)
+        threshold = args.threshold if args.threshold is not None else (
+            base or {}).get("threshold", THRESHOLD)
+        r["threshold"] = threshold
+        results[name] = r
+        line = f"{name:<16} {_fmt(r['min_ns']):>12} {_fmt(r['median_ns']):>12}"
+        if base:
+            change = r["min_ns"] / base["min_ns"] - 1
+            line += f" {_fmt(base['min_ns']):>12} {change:>+7.1%}"
+            if change > threshold:
+                regressions.append(name)
+                line += f"  REGRESSION (> {threshold:.0%})"
+        print(line)
+
+    document = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "host": platform.node(),
+        "machine": platform.machine(),
+        "python": platform.python_version(),
+        "results": results,
+    }
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(document, f, indent=2)
+    if args.save:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        if os.path.exists(path):
+            # Keep hand-tuned thresholds and benchmarks not run this time
+            with open(path) as f:
+                previous = json.load(f).get("results", {})
+            for name, r in previous.items():
+                if name in results and args.threshold is None:
+                    results[name]["threshold"] = r.get("threshold", THRESHOLD)
+                results.setdefault(name, r)
+        with open(path, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"[bench] baseline saved to {path}")
+    elif not baseline:
+        print(f"[bench] no baseline at {path}; run with --save to create one")
+
+    if regressions and not args.save:
+        print(f"[bench] regressed: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+def _fmt(ns: float) -> str:
+    if ns >= 1e6:
+        return f"{ns / 1e6:.2f} ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:.2f} us"
+    return f"{ns:.0f} ns"
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""Client/server clock offset estimation from ping/pong exchanges.
+
+Each ping carries the client send time `t`; the pong echoes it with the
+server time `server_ns`. Assuming the server stamped the pong halfway
+through the round trip, offset = server_ns - (t0 + t1) / 2. The estimate
+with the smallest RTT in a recent window is the least distorted by
+queuing, so that one is used.
+"""
+
+import collections
+import threading
+import time
+
+WINDOW = 16  # recent exchanges considered
+
+
+def now_ns() -> int:
+    """Client-side clock used for every latency measurement."""
+    return time.monotonic_ns()
+
+
+class ClockSync:
+    def __init__(self):
+        self._samples = collections.deque(maxlen=WINDOW)  # (rtt_ns, offset_ns)
+        self._lock = threading.Lock()
+        self._offset = None
+        self._rtt = None
+        self._last_rtt = None
+
+    def update(self, t0_ns: int, server_ns: int, t1_ns: int):
+        """Record one exchange: sent at t0, stamped server_ns, received at t1."""
+        rtt = t1_ns - t0_ns
+        offset = server_ns - (t0_ns + t1_ns) // 2
+        with self._lock:
+            self._samples.append((rtt, offset))
+            self._rtt, self._offset = min(self._samples)
+            self._last_rtt = rtt
+
+    def synced(self) -> bool:
+        return self._offset is not None
+
+    def to_local(self, server_ns: int) -> int | None:
+        """Convert a server timestamp to the client clock, or None if unsynced."""
+        offset = self._offset
+        return None if offset is None else server_ns - offset
+
+    def offset_ns(self) -> int | None:
+        """Server clock minus client clock, or None if unsynced."""
+        return self._offset
+
+    def rtt_ms(self) -> float | None:
+        """Most recent round-trip time in ms."""
+        rtt = self._last_rtt
+        return None if rtt is None else rtt / 1e6
+
+    def uncertainty_ms(self) -> float | None:
+        """Half the best RTT: bound on the offset error."""
+        rtt = self._rtt
+        return None if rtt is None else rtt / 2e6
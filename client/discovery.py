@@ -43,6 +43,28 @@ def discover(timeout: float = DEFAULT_TIMEOUT) -> tuple[str, int, int] | None:
         sock.close()
 
 
+def parse_beacon(data: bytes) -> tuple[str, int, int] | None:
+    """Decode a beacon datagram into (ip, ws_port, video_port), or None if invalid."""
+    try:
+        beacon = json.loads(data.decode())
+        return beacon["ip"], int(beacon["ws_port"]), int(beacon["video_port"])
+    except (UnicodeDecodeError, json.JSONDecodeError, KeyError, TypeError, ValueError):
+        return None
+
+
+def open_beacon_socket() -> socket.socket:
+    """Create a non-blocking UDP socket bound to the beacon port.
+
+    SO_REUSEADDR lets several listeners (e.g. fleet mode and the
+    connection test) share the port on the same machine.
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.setblocking(False)
+    sock.bind(("", BEACON_PORT))
+    return sock
+
+
 if __name__ == "__main__":
     result = discover()
     if result:
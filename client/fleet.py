@@ -0,0 +1,352 @@
+"""Multi-robot fleet client on a single asyncio loop.
+
+Listens for every robot beacon and keeps a control WebSocket and an
+MJPEG video session open to each robot, all multiplexed on one event
+loop in a background thread. Thumbnails for the wall view come from
+the server's 160x120 lores stream. Only the focused robot receives
+drive commands; switching focus just moves a pointer, so no session is
+torn down and unfocused robots fall back to their own dead-man's switch.
+
+Per-robot CPU time (measured with thread_time around that robot's
+parsing and decoding work) and bandwidth are sampled every second and
+logged every STATS_LOG_INTERVAL seconds with a capacity estimate.
+"""
+
+import asyncio
+import io
+import json
+import threading
+import time
+
+import pygame
+import websockets
+
+from client.discovery import open_beacon_socket, parse_beacon
+from client.video import MjpegParser
+
+THUMB_SIZE = (320, 240)
+THUMB_INTERVAL = 0.1        # unfocused robots: decode at most 10 thumbnails/s
+RECONNECT_DELAY = 2.0
+STATS_INTERVAL = 1.0
+STATS_LOG_INTERVAL = 10.0
+CPU_BUDGET = 0.8            # fraction of one core the fleet loop may use
+
+
+class RobotSession:
+    """Control and video sessions to one robot.
+
+    Attributes read by the UI thread (state, thumbnail, stats, ...) are
+    replaced wholesale by the loop thread, never mutated in place.
+    """
+
+    def __init__(self, ip: str, ws_port: int, video_port: int):
+        self.ip = ip
+        self.ws_port = ws_port
+        self.video_port = video_port
+        self.connected = False
+        self.video_connected = False
+        self.focused = False
+        self.state = None
+        self.thumbnail = None
+        self.stats = {"fps": 0.0, "rx_kbps": 0.0, "tx_kbps": 0.0, "cpu_pct": 0.0}
+        self._drive = None
+        self._mode = None
+        self._wake = asyncio.Event()
+        self._last_thumb = 0.0
+        self._bytes_rx = 0
+        self._bytes_tx = 0
+        self._frames = 0
+        self._cpu = 0.0
+
+    def run(self) -> list[asyncio.Task]:
+        """Start the control and video tasks on the running loop."""
+        return [
+            asyncio.create_task(self._control_loop()),
+            asyncio.create_task(self._video_loop()),
+        ]
+
+    def queue_drive(self, axis_x: float, axis_y: float):
+        """Replace the pending drive command (latest wins). Loop thread only."""
+        self._drive = {"type": "drive", "axis_x": axis_x, "axis_y": axis_y}
+        self._wake.set()
+
+    def queue_mode(self, mode: str):
+        """Queue a mode command. Loop thread only."""
+        self._mode = {"type": "mode", "mode": mode}
+        self._wake.set()
+
+    def sample_stats(self, elapsed: float):
+        """Convert counters accumulated over `elapsed` seconds into rates."""
+        self.stats = {
+            "fps": self._frames / elapsed,
+            "rx_kbps": self._bytes_rx * 8 / 1000 / elapsed,
+            "tx_kbps": self._bytes_tx * 8 / 1000 / elapsed,
+            "cpu_pct": self._cpu / elapsed * 100,
+        }
+        self._frames = 0
+        self._bytes_rx = 0
+        self._bytes_tx = 0
+        self._cpu = 0.0
+
+    async def _control_loop(self):
+        url = f"ws://{self.ip}:{self.ws_port}"
+        while True:
+            try:
+                async with websockets.connect(url, open_timeout=3) as ws:
+                    self.connected = True
+                    _log(f"{self.ip}: control connected")
+                    tasks = [
+                        asyncio.create_task(self._send_loop(ws)),
+                        asyncio.create_task(self._recv_loop(ws)),
+                    ]
+                    try:
+                        await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                    finally:
+                        for task in tasks:
+                            task.cancel()
+            except (OSError, asyncio.TimeoutError, websockets.WebSocketException) as e:
+                _log(f"{self.ip}: control error: {e}")
+            finally:
+                self.connected = False
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _send_loop(self, ws):
+        while True:
+            await self._wake.wait()
+            self._wake.clear()
+            for attr in ("_mode", "_drive"):
+                msg = getattr(self, attr)
+                if msg is None:
+                    continue
+                setattr(self, attr, None)
+                raw = json.dumps(msg)
+                self._bytes_tx += len(raw)
+                await ws.send(raw)
+
+    async def _recv_loop(self, ws):
+        async for raw in ws:
+            t0 = time.thread_time()
+            self._bytes_rx += len(raw)
+            try:
+                data = json.loads(raw)
+            except json.JSONDecodeError:
+                continue
+            if data.get("type") == "state":
+                self.state = data
+            self._cpu += time.thread_time() - t0
+
+    async def _video_loop(self):
+        while True:
+            writer = None
+            try:
+                reader, writer = await asyncio.wait_for(
+                    asyncio.open_connection(self.ip, self.video_port), timeout=5
+                )
+                # HTTP/1.0 keeps the response unchunked
+                writer.write(f"GET /video_feed?stream=lores HTTP/1.0\r\n"
+                             f"Host: {self.ip}\r\n\r\n".encode())
+                header = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout=5)
+                status = header.split(b"\r\n", 1)[0]
+                if b" 200 " not in status + b" ":
+                    raise OSError(f"bad response: {status.decode(errors='replace')}")
+                self.video_connected = True
+                _log(f"{self.ip}: video connected")
+                await self._read_video(reader)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                    asyncio.LimitOverrunError) as e:
+                _log(f"{self.ip}: video error: {e}")
+            finally:
+                self.video_connected = False
+                if writer is not None:
+                    writer.close()
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    async def _read_video(self, reader: asyncio.StreamReader):
+        parser = MjpegParser()
+        while True:
+            chunk = await reader.read(65536)
+            if not chunk:
+                return
+            t0 = time.thread_time()
+            self._bytes_rx += len(chunk)
+            for _, jpeg_data in parser.feed(chunk):
+                self._frames += 1
+                now = time.monotonic()
+                # The focused robot gets every frame; the rest are rate-limited
+                if not self.focused and now - self._last_thumb < THUMB_INTERVAL:
+                    continue
+                self._last_thumb = now
+                try:
+                    surface = pygame.image.load(io.BytesIO(jpeg_data), "frame.jpg")
+                    if surface.get_width() > THUMB_SIZE[0]:
+                        # Older servers without a lores stream send full frames
+                        surface = pygame.transform.smoothscale(surface, THUMB_SIZE)
+                    self.thumbnail = surface
+                except Exception:
+                    pass
+            self._cpu += time.thread_time() - t0
+
+
+class FleetClient:
+    """Discovers robots and runs a RobotSession per robot.
+
+    The public methods are called from the pygame main thread; they hand
+    work to the loop thread with call_soon_threadsafe.
+    """
+
+    def __init__(self, hosts: list[str] | None = None, ws_port: int = 8765,
+                 video_port: int = 5000, discover: bool = True):
+        self._initial = [(host, ws_port, video_port) for host in hosts or []]
+        self._discover = discover
+        self._sessions: dict[str, RobotSession] = {}
+        self._order: list[str] = []
+        self._focus = 0
+        self._lock = threading.Lock()
+        self._loop = None
+        self._stop = None
+        self._thread = None
+
+    def start(self):
+        """Start the background event loop thread."""
+        self._thread = threading.Thread(target=asyncio.run, args=(self._main(),), daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop every session and the loop thread."""
+        if self._loop is not None and self._stop is not None:
+            self._loop.call_soon_threadsafe(self._stop.set)
+        if self._thread is not None:
+            self._thread.join(timeout=5.0)
+
+    def sessions(self) -> list[RobotSession]:
+        """Sessions in a stable order (first seen first)."""
+        with self._lock:
+            return [self._sessions[ip] for ip in self._order]
+
+    def focused(self) -> RobotSession | None:
+        with self._lock:
+            if not self._order:
+                return None
+            return self._sessions[self._order[self._focus]]
+
+    def focus_index(self) -> int:
+        return self._focus
+
+    def set_focus(self, index: int):
+        """Move drive focus to the session at `index` (wraps around)."""
+        with self._lock:
+            if not self._order:
+                return
+            old = self._sessions[self._order[self._focus]]
+            self._focus = index % len(self._order)
+            new = self._sessions[self._order[self._focus]]
+        if old is new:
+            return
+        self._call(self._switch_focus, old, new)
+        _log(f"drive focus -> {new.ip}")
+
+    def focus_next(self, step: int = 1):
+        self.set_focus(self._focus + step)
+
+    def send_drive(self, axis_x: float, axis_y: float):
+        """Send a drive command to the focused robot only."""
+        session = self.focused()
+        if session is not None:
+            self._call(session.queue_drive, axis_x, axis_y)
+
+    def send_mode(self, mode: str):
+        """Send a mode command to the focused robot only."""
+        session = self.focused()
+        if session is not None:
+            self._call(session.queue_mode, mode)
+
+    def _call(self, fn, *args):
+        if self._loop is not None:
+            self._loop.call_soon_threadsafe(fn, *args)
+
+    def _switch_focus(self, old: RobotSession, new: RobotSession):
+        # Stop the robot we are leaving instead of waiting for its dead-man timeout
+        old.queue_drive(0.0, 0.0)
+        old.focused = False
+        new.focused = True
+
+    def _add_robot(self, ip: str, ws_port: int, video_port: int):
+        if ip in self._sessions:
+            return
+        session = RobotSession(ip, ws_port, video_port)
+        with self._lock:
+            self._sessions[ip] = session
+            self._order.append(ip)
+            session.focused = len(self._order) - 1 == self._focus
+        self._tasks.extend(session.run())
+        _log(f"robot added: {ip} (ws={ws_port}, video={video_port}) — {len(self._order)} total")
+
+    async def _main(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._stats_loop())]
+        for host, ws_port, video_port in self._initial:
+            self._add_robot(host, ws_port, video_port)
+
+        transport = None
+        if self._discover:
+            try:
+                transport, _ = await self._loop.create_datagram_endpoint(
+                    lambda: _BeaconProtocol(self._add_robot), sock=open_beacon_socket()
+                )
+                _log("listening for robot beacons")
+            except OSError as e:
+                _log(f"beacon listener unavailable: {e}")
+
+        try:
+            await self._stop.wait()
+        finally:
+            if transport is not None:
+                transport.close()
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _stats_loop(self):
+        last = time.monotonic()
+        last_log = last
+        while True:
+            await asyncio.sleep(STATS_INTERVAL)
+            now = time.monotonic()
+            sessions = self.sessions()
+            for session in sessions:
+                session.sample_stats(now - last)
+            last = now
+            if sessions and now - last_log >= STATS_LOG_INTERVAL:
+                last_log = now
+                _log_stats(sessions)
+
+
+class _BeaconProtocol(asyncio.DatagramProtocol):
+    def __init__(self, on_beacon):
+        self._on_beacon = on_beacon
+
+    def datagram_received(self, data, addr):
+        result = parse_beacon(data)
+        if result is not None:
+            self._on_beacon(*result)
+
+
+def _log_stats(sessions: list[RobotSession]):
+    total_cpu = 0.0
+    total_rx = 0.0
+    for s in sessions:
+        st = s.stats
+        total_cpu += st["cpu_pct"]
+        total_rx += st["rx_kbps"]
+        _log(f"{s.ip}: {st['fps']:.1f} fps, rx {st['rx_kbps']:.0f} kb/s, "
+             f"tx {st['tx_kbps']:.1f} kb/s, cpu {st['cpu_pct']:.1f}%"
+             + (" [focus]" if s.focused else ""))
+    per_robot = total_cpu / len(sessions)
+    capacity = int(CPU_BUDGET * 100 / per_robot) if per_robot > 0 else 0
+    _log(f"fleet: {len(sessions)} robots, cpu {total_cpu:.1f}%, rx {total_rx / 1000:.2f} Mb/s"
+         + (f", est. capacity ~{capacity} robots" if capacity else ""))
+
+
+def _log(msg: str):
+    print(f"[fleet] {msg}")
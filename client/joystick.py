@@ -2,6 +2,7 @@
 
 Reads left stick axes and shoulder buttons from any SDL-compatible gamepad.
 Axis mapping follows standard SDL layout. Mode buttons are toggles.
+The right stick and triggers (Steam Deck axes 2-5) drive camera pan/zoom.
 """
 
 import pygame
@@ -9,9 +10,18 @@ import pygame
 DEADZONE = 0.1
 
 # Standard SDL gamepad button indices
+BUTTON_B = 1   # toggle picture-in-picture
+BUTTON_X = 2   # next camera
+BUTTON_Y = 3   # reset camera zoom
 BUTTON_L1 = 4  # toggle firefighter
 BUTTON_R1 = 5  # toggle ambulance
 
+# Steam Deck axis indices (docs/steamdeck-env.md)
+AXIS_RIGHT_X = 2
+AXIS_RIGHT_Y = 3
+AXIS_L2 = 4
+AXIS_R2 = 5
+
 _joystick = None
 _current_mode = ""
 
@@ -68,10 +78,12 @@ def get_input() -> dict:
     """Read current joystick state.
 
     Returns:
-        dict with axis_x, axis_y, mode
+        dict with axis_x, axis_y, mode, and look_x, look_y (right stick)
+        and zoom (R2 minus L2)
     """
     if _joystick is None:
-        return {"axis_x": 0.0, "axis_y": 0.0, "mode": _current_mode}
+        return {"axis_x": 0.0, "axis_y": 0.0, "mode": _current_mode,
+                "look_x": 0.0, "look_y": 0.0, "zoom": 0.0}
 
     axis_x = _joystick.get_axis(0)
     axis_y = _joystick.get_axis(1)
@@ -82,7 +94,20 @@ def get_input() -> dict:
     if abs(axis_y) < DEADZONE:
         axis_y = 0.0
 
-    return {"axis_x": axis_x, "axis_y": axis_y, "mode": _current_mode}
+    look_x = look_y = zoom = 0.0
+    if _joystick.get_numaxes() > AXIS_R2:
+        look_x = _deadzone(_joystick.get_axis(AXIS_RIGHT_X))
+        look_y = _deadzone(_joystick.get_axis(AXIS_RIGHT_Y))
+        # Triggers rest at -1 (0 on some pads until first pulled): only the upper half counts
+        zoom = _deadzone(max(0.0, _joystick.get_axis(AXIS_R2))
+                         - max(0.0, _joystick.get_axis(AXIS_L2)))
+
+    return {"axis_x": axis_x, "axis_y": axis_y, "mode": _current_mode,
+            "look_x": look_x, "look_y": look_y, "zoom": zoom}
+
+
+def _deadzone(value: float) -> float:
+    return 0.0 if abs(value) < DEADZONE else value
 
 
 def _log(msg: str):
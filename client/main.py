@@ -1,6 +1,18 @@
 """Client main loop — pygame app with video, joystick, and WebSocket.
 
 Usage: uv run python -m client.main [--host HOST] [--ws-port PORT] [--video-port PORT]
+       uv run python -m client.main --fleet [--robot IP ...]
+
+D-pad runs server-timed maneuvers: left/right spin 90 degrees, up/down
+nudge forward/back for 0.5 s; moving the stick cancels them.
+Right stick pans and R2/L2 zoom the camera (cropped on the sensor); Y resets.
+With several cameras on the robot, X (or C) switches camera and B (or P)
+toggles a picture-in-picture inset of the next one (its lores stream).
+F3 toggles the performance overlay (client/perf.py), F4 dumps its last
+10 s to client-perf-*.csv in --profile-dir. F5 writes the client's and
+the robot's recent tracing spans, merged, to trace-*.json (client/trace.py).
+F9 toggles the client's sampling profiler, F10 the robot's (driver only).
+SIGUSR1 also toggles the client profiler.
 """
 
 import argparse
@@ -8,9 +20,25 @@ import sys
 
 import pygame
 
-from client import joystick, ui
+from client import joystick, trace, ui
+from client.clocksync import now_ns
 from client.network import NetworkClient
+from client.perf import PerfRecorder
 from client.video import VideoStream
+from client.zoom import ZoomControl
+from common import gcmode, netqos, tracing
+from common.profiler import SamplingProfiler, install_signal
+
+# Events folded into one frame's drive/ROI commands (perf overlay "input samples")
+_INPUT_EVENTS = (pygame.JOYAXISMOTION, pygame.JOYHATMOTION, pygame.JOYBUTTONDOWN)
+
+# D-pad (hat x, hat y) -> motion program steps
+MANEUVERS = {
+    (-1, 0): [{"spin": -90}],
+    (1, 0): [{"spin": 90}],
+    (0, 1): [{"left": 1.0, "right": 1.0, "duration": 0.5}],
+    (0, -1): [{"left": -1.0, "right": -1.0, "duration": 0.5}],
+}
 
 
 def parse_args():
@@ -19,11 +47,60 @@ def parse_args():
     parser.add_argument("--ws-port", type=int, default=8765, help="WebSocket port")
     parser.add_argument("--video-port", type=int, default=5000, help="MJPEG video port")
     parser.add_argument("--windowed", action="store_true", help="Start in windowed mode")
+    parser.add_argument("--spectate", action="store_true",
+                        help="Watch video and telemetry without taking the driver seat")
+    parser.add_argument("--fleet", action="store_true",
+                        help="Connect to every discovered robot and show a thumbnail wall")
+    parser.add_argument("--robot", action="append", default=[], metavar="IP",
+                        help="Fleet mode: add a robot without waiting for its beacon (repeatable)")
+    parser.add_argument("--qos", action="append", type=_qos_spec, default=[],
+                        metavar="CLASS:OPTION=VALUE[,...]",
+                        help="Socket QoS for control/video traffic, e.g. video:dscp=10 or "
+                             "control:priority=5; 'off' leaves sockets untouched "
+                             "(repeatable, see common/netqos.py)")
+    parser.add_argument("--gc", choices=gcmode.MODES, default="off",
+                        help="Garbage collector: untouched, frozen after startup with raised "
+                             "thresholds, or collected right after each frame flip "
+                             "(pauses show in the F3 overlay in every mode)")
+    parser.add_argument("--gc-threshold", type=_gc_thresholds, default=None,
+                        metavar="G0[,G1[,G2]]",
+                        help="Collector thresholds for --gc freeze; for --gc safepoint, the "
+                             "gen0 count a safe point waits for")
+    parser.add_argument("--trace-buffer", type=int, default=tracing.CAPACITY, metavar="SPANS",
+                        help="Tracing spans kept per thread for F5 (0 = tracing off)")
+    parser.add_argument("--profile", type=float, default=None, metavar="SECONDS",
+                        help="Sample all threads from startup (0 = until stopped)")
+    parser.add_argument("--profile-dir", default=".", help="Where profile files are written")
+    parser.add_argument("--profile-format", choices=("speedscope", "collapsed"),
+                        default="speedscope")
     return parser.parse_args()
 
 
+def _gc_thresholds(text: str) -> tuple:
+    try:
+        return gcmode.parse_thresholds(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def _qos_spec(text: str) -> str:
+    try:
+        netqos.parse_spec(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+    return text
+
+
 def main():
     args = parse_args()
+    for spec in args.qos:
+        netqos.configure(spec)
+    tracing.configure("client", now_ns, args.trace_buffer)
+    gcmode.configure(args.gc, args.gc_threshold)
+    profiler = SamplingProfiler("client", out_dir=args.profile_dir, fmt=args.profile_format)
+    install_signal(profiler)
+    if args.profile is not None:
+        profiler.start(args.profile or None)
 
     pygame.init()
 
@@ -36,42 +113,93 @@ def main():
     ui.init()
     joystick.init()
 
-    network = NetworkClient(host=args.host, ws_port=args.ws_port)
+    if args.fleet:
+        try:
+            _run_fleet(args, screen, clock, fullscreen, profiler)
+        finally:
+            profiler.stop(wait=True)
+        return
+
+    network = NetworkClient(host=args.host, ws_port=args.ws_port, spectator=args.spectate)
     network.start()
 
-    video = VideoStream(host=args.host, video_port=args.video_port)
+    video = VideoStream(host=args.host, video_port=args.video_port, clock=network.clock)
     video.start()
 
     last_mode = ""
+    zoom = ZoomControl()
+    cameras = _Cameras(network, video, zoom, args)
+    perf = PerfRecorder()
 
+    gcmode.freeze()
     print("[main] client started — press Escape to quit, F11 to toggle fullscreen")
 
     try:
         while True:
+            perf.begin_frame()
+            input_samples = 0
             for event in pygame.event.get():
+                if event.type in _INPUT_EVENTS:
+                    input_samples += 1
                 if event.type == pygame.QUIT:
                     raise SystemExit
                 elif event.type == pygame.KEYDOWN:
                     if event.key == pygame.K_ESCAPE:
                         raise SystemExit
+                    elif event.key == pygame.K_F3:
+                        perf.visible = not perf.visible
+                    elif event.key == pygame.K_F4:
+                        perf.dump_csv(args.profile_dir)
+                    elif event.key == pygame.K_F5:
+                        trace.capture(network, args.host, args.video_port, args.profile_dir)
                     elif event.key == pygame.K_F11:
                         fullscreen = not fullscreen
                         if fullscreen:
                             screen = pygame.display.set_mode((ui.SCREEN_W, ui.SCREEN_H), pygame.FULLSCREEN)
                         else:
                             screen = pygame.display.set_mode((ui.SCREEN_W, ui.SCREEN_H))
+                    elif event.key == pygame.K_F9:
+                        profiler.toggle()
+                    elif event.key == pygame.K_F10 and not args.spectate:
+                        network.send_profile()
+                    elif event.key == pygame.K_c:
+                        cameras.next()
+                    elif event.key == pygame.K_p:
+                        cameras.toggle_pip()
+                elif event.type == pygame.JOYHATMOTION and not args.spectate:
+                    steps = MANEUVERS.get(tuple(event.value))
+                    if steps:
+                        network.send_motion(steps)
                 elif event.type in (pygame.JOYBUTTONDOWN, pygame.JOYDEVICEADDED, pygame.JOYDEVICEREMOVED):
+                    if event.type == pygame.JOYBUTTONDOWN and event.button == joystick.BUTTON_Y:
+                        zoom.reset()
+                    elif event.type == pygame.JOYBUTTONDOWN and event.button == joystick.BUTTON_X:
+                        cameras.next()
+                    elif event.type == pygame.JOYBUTTONDOWN and event.button == joystick.BUTTON_B:
+                        cameras.toggle_pip()
                     joystick.handle_event(event)
+            perf.mark("events")
 
-            input_data = joystick.get_input()
-            network.send_drive(input_data["axis_x"], input_data["axis_y"])
+            # One trace per frame's commands: joystick read -> send -> server dispatch -> GPIO
+            with tracing.span("input", tracing.new_id()):
+                input_data = joystick.get_input()
+                if not args.spectate:
+                    network.send_drive(input_data["axis_x"], input_data["axis_y"])
+                    roi = zoom.update(input_data["look_x"], input_data["look_y"], input_data["zoom"])
+                    if roi:
+                        network.send_roi(**roi, source=cameras.current)
 
-            if input_data["mode"] != last_mode:
-                network.send_mode(input_data["mode"])
-                last_mode = input_data["mode"]
+                    if input_data["mode"] != last_mode:
+                        network.send_mode(input_data["mode"])
+                        last_mode = input_data["mode"]
+            perf.mark("input")
 
             frame = video.get_frame()
             state = network.get_state()
+            cameras.update(state)
+            roi = (state or {}).get("roi")
+            if roi and roi.get("source", cameras.current) != cameras.current:
+                roi = None  # zoomed on a camera not on screen
 
             ui.render(
                 screen, frame,
@@ -79,18 +207,159 @@ def main():
                 input_data=input_data,
                 connected=network.is_connected(),
                 video_connected=video.is_connected(),
+                video_stats=video.stats.summary(),
+                roi=roi,
+                source=cameras.current if len(cameras.names) > 1 else None,
+                pip=cameras.pip_frame(),
+                pip_source=cameras.pip_source,
+                perf=perf,
             )
+            perf.mark("render")
 
             pygame.display.flip()
+            perf.mark("flip")
+            video.mark_displayed()
+            gcmode.safe_point()  # the frame is on screen; the next is ~30 ms away
+            perf.end_frame(video.stats, network, input_samples)
             clock.tick(30)
 
     except SystemExit:
         pass
     finally:
         print("[main] shutting down...")
-        network.send_drive(0.0, 0.0)
+        if not args.spectate:
+            network.send_drive(0.0, 0.0)
         network.stop()
         video.stop()
+        cameras.stop()
+        joystick.cleanup()
+        pygame.quit()
+        profiler.stop(wait=True)
+        print("[main] goodbye")
+
+
+class _Cameras:
+    """Which of the robot's cameras is on screen, and the picture-in-picture one.
+
+    Camera names come from the state stream ("sources"); until they
+    arrive the main view shows the robot's primary camera.
+    """
+
+    def __init__(self, network: NetworkClient, video: VideoStream, zoom: ZoomControl, args):
+        self._network = network
+        self._video = video
+        self._zoom = zoom
+        self._args = args
+        self.names: list = []
+        self.current = None
+        self.pip_source = None
+        self._pip = None
+        self._pip_wanted = False
+
+    def update(self, state: dict | None):
+        names = (state or {}).get("sources") or []
+        if names == self.names:
+            return
+        self.names = names
+        if self.current not in names:
+            self.current = names[0] if names else None
+            self._video.set_source(self.current)
+        self._sync_pip()
+
+    def next(self):
+        if len(self.names) < 2:
+            return
+        if self._zoom.zoom > 1.0 and not self._args.spectate:
+            self._network.send_roi(1.0, 0.5, 0.5, source=self.current)
+        self._zoom.reset()
+        self.current = self.names[(self.names.index(self.current) + 1) % len(self.names)]
+        self._video.set_source(self.current)
+        print(f"[main] camera: {self.current}")
+        self._sync_pip()
+
+    def toggle_pip(self):
+        self._pip_wanted = not self._pip_wanted
+        self._sync_pip()
+
+    def pip_frame(self):
+        return self._pip.get_frame() if self._pip is not None else None
+
+    def stop(self):
+        if self._pip is not None:
+            self._pip.stop()
+            self._pip = None
+
+    def _sync_pip(self):
+        """Show the camera after the current one in the inset, or none."""
+        self.pip_source = None
+        if self._pip_wanted and len(self.names) > 1:
+            i = self.names.index(self.current) if self.current in self.names else 0
+            self.pip_source = self.names[(i + 1) % len(self.names)]
+        if self.pip_source is None:
+            self.stop()
+        elif self._pip is None:
+            self._pip = VideoStream(host=self._args.host, video_port=self._args.video_port,
+                                    source=self.pip_source, stream="lores")
+            self._pip.start()
+        else:
+            self._pip.set_source(self.pip_source)
+
+
+def _run_fleet(args, screen: pygame.Surface, clock: pygame.time.Clock, fullscreen: bool,
+               profiler: SamplingProfiler):
+    """Fleet main loop: drive the focused robot, watch all of them.
+
+    Tab / D-pad left-right / number keys switch drive focus.
+    """
+    from client.fleet import FleetClient
+
+    fleet = FleetClient(hosts=args.robot, ws_port=args.ws_port, video_port=args.video_port)
+    fleet.start()
+    last_mode = ""
+
+    print("[main] fleet mode — Tab or D-pad to switch robot, Escape to quit")
+
+    try:
+        while True:
+            for event in pygame.event.get():
+                if event.type == pygame.QUIT:
+                    raise SystemExit
+                elif event.type == pygame.KEYDOWN:
+                    if event.key == pygame.K_ESCAPE:
+                        raise SystemExit
+                    elif event.key == pygame.K_F11:
+                        fullscreen = not fullscreen
+                        flags = pygame.FULLSCREEN if fullscreen else 0
+                        screen = pygame.display.set_mode((ui.SCREEN_W, ui.SCREEN_H), flags)
+                    elif event.key == pygame.K_F9:
+                        profiler.toggle()
+                    elif event.key == pygame.K_TAB:
+                        fleet.focus_next(-1 if event.mod & pygame.KMOD_SHIFT else 1)
+                    elif pygame.K_1 <= event.key <= pygame.K_9:
+                        fleet.set_focus(event.key - pygame.K_1)
+                elif event.type == pygame.JOYHATMOTION and event.value[0] != 0:
+                    fleet.focus_next(event.value[0])
+                elif event.type in (pygame.JOYBUTTONDOWN, pygame.JOYDEVICEADDED, pygame.JOYDEVICEREMOVED):
+                    joystick.handle_event(event)
+
+            input_data = joystick.get_input()
+            fleet.send_drive(input_data["axis_x"], input_data["axis_y"])
+
+            if input_data["mode"] != last_mode:
+                fleet.send_mode(input_data["mode"])
+                last_mode = input_data["mode"]
+
+            ui.render_fleet(screen, fleet.sessions(), input_data)
+
+            pygame.display.flip()
+            clock.tick(30)
+
+    except SystemExit:
+        pass
+    finally:
+        print("[main] shutting down fleet...")
+        fleet.send_drive(0.0, 0.0)
+        fleet.stop()
         joystick.cleanup()
         pygame.quit()
         print("[main] goodbye")
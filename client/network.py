@@ -1,7 +1,12 @@
 """WebSocket client for sending commands and receiving state.
 
 Runs a background thread with auto-reconnect. Thread-safe for use
-from the pygame main loop.
+from the pygame main loop. Pings the server every PING_INTERVAL to
+measure RTT and keep the client/server clock offset estimate fresh.
+Commands go out from their own sender thread the moment they are
+queued, rather than waiting for the receive poll to time out, on a
+socket tuned as the "control" traffic class (common/netqos.py).
+Commands queued inside a tracing span carry its ID as "trace".
 """
 
 import json
@@ -11,11 +16,18 @@ import time
 
 import websocket
 
+from client.clocksync import ClockSync, now_ns
+from common import netqos, tracing
+
+PING_INTERVAL = 1.0
+
 
 class NetworkClient:
-    def __init__(self, host: str = "robothector.local", ws_port: int = 8765):
+    def __init__(self, host: str = "robothector.local", ws_port: int = 8765,
+                 spectator: bool = False):
         self._host = host
         self._ws_port = ws_port
+        self._query = "/?role=spectator" if spectator else ""
         self._ws = None
         self._thread = None
         self._running = False
@@ -23,6 +35,12 @@ class NetworkClient:
         self._send_queue = queue.Queue(maxsize=100)
         self._state = None
         self._state_lock = threading.Lock()
+        self.clock = ClockSync()
+        self.bytes_sent = 0     # payload bytes, for client.perf
+        self.messages_sent = 0
+        self._sent_lock = threading.Lock()
+        self._trace_reply = None
+        self._trace_event = threading.Event()
 
     def start(self):
         """Start the background network thread."""
@@ -49,6 +67,38 @@ class NetworkClient:
         """Queue a mode command."""
         self._enqueue({"type": "mode", "mode": mode})
 
+    def send_motion(self, steps: list, motion_id: str | None = None):
+        """Upload a timed motion program (see server/motion.py)."""
+        self._enqueue({"type": "motion", "id": motion_id, "steps": steps})
+
+    def cancel_motion(self):
+        self._enqueue({"type": "motion", "action": "cancel"})
+
+    def send_roi(self, zoom: float, x: float, y: float, source: str | None = None):
+        """Set a camera's region of interest (driver only, see client/zoom.py).
+
+        `source` names the camera; None means the robot's primary one.
+        """
+        msg = {"type": "roi", "zoom": zoom, "x": x, "y": y}
+        if source is not None:
+            msg["source"] = source
+        self._enqueue(msg)
+
+    def send_profile(self, action: str = "toggle"):
+        """Start/stop the robot's sampling profiler (driver only)."""
+        self._enqueue({"type": "profile", "action": action})
+
+    def request_trace_ports(self, timeout: float = 2.0) -> list | None:
+        """Ask the robot which HTTP ports serve /trace (driver only).
+
+        Blocks up to `timeout`; returns None if no reply came.
+        """
+        self._trace_event.clear()
+        self._enqueue({"type": "trace"})
+        if not self._trace_event.wait(timeout):
+            return None
+        return self._trace_reply.get("ports")
+
     def get_state(self) -> dict | None:
         """Get the latest state from the server."""
         with self._state_lock:
@@ -57,7 +107,14 @@ class NetworkClient:
     def is_connected(self) -> bool:
         return self._connected
 
+    def get_rtt(self) -> float | None:
+        """Latest control round-trip time in ms."""
+        return self.clock.rtt_ms()
+
     def _enqueue(self, msg: dict):
+        trace_id = tracing.current_id()
+        if trace_id is not None:
+            msg["trace"] = trace_id
         try:
             self._send_queue.put_nowait(msg)
         except queue.Full:
@@ -75,16 +132,20 @@ class NetworkClient:
                 time.sleep(2.0)
                 continue
 
+            ws = self._ws
+            sender = threading.Thread(target=self._send_loop, args=(ws,), daemon=True)
             try:
                 self._ws.settimeout(0.05)  # 50ms poll
+                sender.start()
+                last_ping = 0.0
                 while self._running:
-                    # Send queued messages
-                    while not self._send_queue.empty():
-                        try:
-                            msg = self._send_queue.get_nowait()
-                            self._ws.send(json.dumps(msg))
-                        except queue.Empty:
-                            break
+                    if time.monotonic() - last_ping >= PING_INTERVAL:
+                        last_ping = time.monotonic()
+                        ping = {"type": "ping", "t": now_ns()}
+                        rtt = self.clock.rtt_ms()
+                        if rtt is not None:
+                            ping["rtt_ms"] = round(rtt, 3)
+                        self._send(json.dumps(ping))
 
                     # Receive state
                     try:
@@ -94,6 +155,18 @@ class NetworkClient:
                             if data.get("type") == "state":
                                 with self._state_lock:
                                     self._state = data
+                            elif data.get("type") == "pong" and "t" in data:
+                                self.clock.update(data["t"], data["server_ns"], now_ns())
+                            elif data.get("type") == "motion":
+                                _log(f"motion {data.get('id')}: {data.get('status')}"
+                                     + (f" ({data['reason']})" if data.get("reason") else ""))
+                            elif data.get("type") == "trace":
+                                self._trace_reply = data
+                                self._trace_event.set()
+                            elif data.get("type") == "profile":
+                                _log("robot profiler " + (
+                                    "running" if data.get("running")
+                                    else f"stopped, writing {data.get('path')}"))
                     except websocket.WebSocketTimeoutException:
                         pass
 
@@ -106,16 +179,46 @@ class NetworkClient:
                 except Exception:
                     pass
                 self._ws = None
+                if sender.is_alive():
+                    sender.join(timeout=1.0)
                 if self._running:
                     _log("reconnecting in 2s...")
                     time.sleep(2.0)
 
+    def _send_loop(self, ws):
+        """Send queued commands as soon as they arrive, until `ws` goes away."""
+        while self._running and self._ws is ws:
+            try:
+                msg = self._send_queue.get(timeout=0.2)
+            except queue.Empty:
+                continue
+            try:
+                with tracing.span("ws_send", msg.get("trace"), type=msg.get("type")):
+                    self._send(json.dumps(msg), ws)
+            except (websocket.WebSocketException, OSError) as e:
+                # Includes a send that outlasted the receive loop's 50 ms timeout, which
+                # may have left a partial frame: drop the socket so the receive loop
+                # reconnects instead of pinging on while no command goes out
+                _log(f"send failed: {e!r}")
+                try:
+                    ws.shutdown()
+                except Exception:
+                    pass
+                return
+
+    def _send(self, payload: str, ws=None):
+        (ws or self._ws).send(payload)
+        with self._sent_lock:
+            self.bytes_sent += len(payload)
+            self.messages_sent += 1
+
     def _connect(self) -> bool:
         """Try to connect, with discovery fallback."""
-        url = f"ws://{self._host}:{self._ws_port}"
+        url = f"ws://{self._host}:{self._ws_port}{self._query}"
         try:
             _log(f"connecting to {url}...")
             self._ws = websocket.create_connection(url, timeout=3)
+            netqos.apply(self._ws.sock, "control", f"{self._host}:{self._ws_port}")
             self._connected = True
             _log("connected")
             return True
@@ -128,9 +231,10 @@ class NetworkClient:
             result = discover(timeout=5.0)
             if result:
                 ip, ws_port, _ = result
-                url = f"ws://{ip}:{ws_port}"
+                url = f"ws://{ip}:{ws_port}{self._query}"
                 _log(f"discovered server, connecting to {url}...")
                 self._ws = websocket.create_connection(url, timeout=3)
+                netqos.apply(self._ws.sock, "control", f"{ip}:{ws_port}")
                 self._connected = True
                 self._host = ip
                 self._ws_port = ws_port
@@ -0,0 +1,116 @@
+"""Per-frame client pipeline timings for the performance overlay.
+
+The main loop brackets each stage with mark(), which costs one
+perf_counter() call; the video and network threads only bump counters
+(VideoStats.decode_ms_total / frames, NetworkClient.bytes_sent /
+messages_sent) that end_frame() turns into per-frame decode time and
+rates over the last second. Rows are kept for WINDOW frames; ui.py
+draws them as rolling graphs (F3) and dump_csv() writes them out (F4).
+
+Columns (times in ms):
+  frame     start of one frame to the start of the next (incl. tick wait)
+  events    pygame event handling
+  input     joystick read, drive/ROI/mode sends
+  render    ui.render (incl. scale and this overlay)
+  scale     the video frame's smoothscale/scale inside render
+  flip      pygame.display.flip
+  decode    mean JPEG decode of the video frames received this frame
+  gc        garbage-collector pauses that ended this frame, any thread
+            (common/gcmode.py)
+  video_fps, send_kbps, send_hz   over the last second
+  input_samples   pygame input events folded into this frame's commands
+  rtt       latest control ping round trip
+
+Usage:
+    perf = PerfRecorder()
+    perf.begin_frame(); ...; perf.mark("events"); ...
+    perf.end_frame(video.stats, network, input_samples)
+"""
+
+import collections
+import csv
+import os
+import time
+
+from common import gcmode
+
+WINDOW = 300        # frames kept (10 s at 30 fps)
+RATE_WINDOW = 1.0   # seconds behind the rate columns
+COLUMNS = ("t", "frame", "events", "input", "render", "scale", "flip", "decode", "gc",
+           "video_fps", "send_kbps", "send_hz", "input_samples", "rtt")
+
+
+class PerfRecorder:
+    def __init__(self, window: int = WINDOW):
+        self.rows = collections.deque(maxlen=window)
+        self.visible = False
+        self._start = time.perf_counter()
+        self._frame_start = None
+        self._mark = None
+        self._row = {}
+        self._counters = collections.deque()  # (t, video frames, decode ms, bytes, messages)
+        self._decode = None
+        self._gc_total = gcmode.pause_total_ms()
+
+    def begin_frame(self):
+        now = time.perf_counter()
+        frame_ms = (now - self._frame_start) * 1000 if self._frame_start is not None else None
+        self._frame_start = self._mark = now
+        self._row = {"t": round(now - self._start, 3), "frame": frame_ms}
+
+    def mark(self, stage: str):
+        """Record the time since the previous mark (or begin_frame) as `stage`."""
+        now = time.perf_counter()
+        self._row[stage] = (now - self._mark) * 1000
+        self._mark = now
+
+    def add(self, stage: str, ms: float):
+        """Record a duration measured elsewhere (e.g. scale inside render)."""
+        self._row[stage] = ms
+
+    def end_frame(self, video_stats=None, network=None, input_samples: int = 0):
+        row = self._row
+        now = time.perf_counter()
+        frames = video_stats.frames if video_stats else 0
+        decode_total = video_stats.decode_ms_total if video_stats else 0.0
+        sent = network.bytes_sent if network else 0
+        messages = network.messages_sent if network else 0
+
+        counters = self._counters
+        if counters and frames > counters[-1][1]:
+            self._decode = (decode_total - counters[-1][2]) / (frames - counters[-1][1])
+        counters.append((now, frames, decode_total, sent, messages))
+        while now - counters[0][0] > RATE_WINDOW and len(counters) > 2:
+            counters.popleft()
+        t0, frames0, _, sent0, messages0 = counters[0]
+        span = now - t0
+        row["decode"] = self._decode
+        gc_total = gcmode.pause_total_ms()
+        row["gc"] = gc_total - self._gc_total
+        self._gc_total = gc_total
+        row["video_fps"] = (frames - frames0) / span if span > 0 else None
+        row["send_kbps"] = (sent - sent0) * 8 / 1000 / span if span > 0 else None
+        row["send_hz"] = (messages - messages0) / span if span > 0 else None
+        row["input_samples"] = input_samples
+        row["rtt"] = network.get_rtt() if network else None
+        self.rows.append(row)
+
+    def series(self, column: str) -> list:
+        """Values of one column, oldest first (None where unknown)."""
+        return [row.get(column) for row in self.rows]
+
+    def dump_csv(self, out_dir: str = ".") -> str:
+        """Write the kept rows to client-perf-<time>.csv; returns the path."""
+        os.makedirs(out_dir, exist_ok=True)
+        path = os.path.join(out_dir, time.strftime("client-perf-%Y%m%d-%H%M%S.csv"))
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(COLUMNS)
+            for row in list(self.rows):
+                writer.writerow(["" if row.get(c) is None else round(row[c], 3) for c in COLUMNS])
+        _log(f"wrote {len(self.rows)} frames to {path}")
+        return path
+
+
+def _log(msg: str):
+    print(f"[perf] {msg}")
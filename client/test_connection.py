@@ -1,49 +1,140 @@
 """Connection test script — verify all connectivity before a driving session.
 
-Usage: uv run python -m client.test_connection
+Checks run concurrently. mDNS, the UDP beacon and SSH start at once; the
+host-dependent probes start as soon as a host is known (--host, else
+the first beacon or the mDNS answer, whichever comes first):
+
+  mDNS         resolve robothector.local
+  UDP beacon   listen for --beacon-seconds; beacon interval mean/jitter
+  SSH          `ssh robothector echo ok` (critical)
+  HTTP video   GET /health
+  WebSocket    --pings sequential pings as a spectator (does not displace
+               the driver); RTT p50/p95/p99/max
+  Video        /video_feed for --video-seconds; fps, Mbit/s, frame gaps
+
+Usage:
+    uv run python -m client.test_connection
+    uv run python -m client.test_connection --host 192.168.50.169 --json
+    uv run python -m client.test_connection --json report.json --pings 500
 """
 
+import argparse
+import concurrent.futures
+import json
+import os
+import select
 import socket
+import statistics
 import subprocess
 import sys
+import threading
 import time
 import urllib.request
 
-DEFAULT_HOST = "192.168.50.169"
+MDNS_NAME = "robothector.local"
 WS_PORT = 8765
 VIDEO_PORT = 5000
+PINGS = 300
+PING_INTERVAL = 0.005    # seconds between pings, so the sample spans a few seconds
+VIDEO_SECONDS = 5.0
+BEACON_SECONDS = 8.0     # the server beacons every 2 s
+HOST_TIMEOUT = 6.0       # wait for discovery before the host probes give up
+
+
+class _Host:
+    """First discovered (ip, ws_port, video_port), shared between checks."""
+
+    def __init__(self, host: str | None = None):
+        self._found = threading.Event()
+        self._lock = threading.Lock()
+        self.info = None
+        self.source = None
+        if host:
+            self.offer((host, WS_PORT, VIDEO_PORT), "--host")
+
+    def offer(self, info: tuple, source: str):
+        with self._lock:
+            if self.info is None:
+                self.info, self.source = info, source
+                self._found.set()
+
+    def wait(self, timeout: float) -> tuple | None:
+        self._found.wait(timeout)
+        return self.info
+
 
+def _result(passed: bool, detail: str, start: float, **metrics) -> dict:
+    return {"passed": passed, "detail": detail,
+            "elapsed_ms": round((time.monotonic() - start) * 1000), "metrics": metrics}
 
-def test_mdns() -> tuple[bool, str]:
+
+def _stats(values: list) -> dict:
+    data = sorted(values)
+    n = len(data)
+    return {
+        "p50": round(data[n // 2], 3),
+        "p95": round(data[min(n - 1, int(n * 0.95))], 3),
+        "p99": round(data[min(n - 1, int(n * 0.99))], 3),
+        "max": round(data[-1], 3),
+        "mean": round(statistics.fmean(data), 3),
+    }
+
+
+def test_mdns(found: _Host) -> dict:
     """Test mDNS resolution of robothector.local."""
     start = time.monotonic()
     try:
-        results = socket.getaddrinfo("robothector.local", None)
-        elapsed = (time.monotonic() - start) * 1000
-        ip = results[0][4][0]
-        return True, f"resolved to {ip} ({elapsed:.0f}ms)"
+        results = socket.getaddrinfo(MDNS_NAME, None, socket.AF_INET)
     except socket.gaierror as e:
-        elapsed = (time.monotonic() - start) * 1000
-        return False, f"{e} ({elapsed:.0f}ms)"
+        return _result(False, str(e), start)
+    ip = results[0][4][0]
+    found.offer((ip, WS_PORT, VIDEO_PORT), "mDNS")
+    return _result(True, f"resolved to {ip}", start, ip=ip)
+
 
+def test_udp_beacon(found: _Host, seconds: float) -> dict:
+    """Listen for server beacons and measure their arrival jitter."""
+    from client.discovery import open_beacon_socket, parse_beacon
 
-def test_udp_beacon() -> tuple[bool, str]:
-    """Listen for UDP beacon from server."""
     start = time.monotonic()
     try:
-        from client.discovery import discover
-        result = discover(timeout=5.0)
-        elapsed = (time.monotonic() - start) * 1000
-        if result:
-            ip, ws_port, video_port = result
-            return True, f"found at {ip} ws={ws_port} video={video_port} ({elapsed:.0f}ms)"
-        return False, f"no beacon received ({elapsed:.0f}ms)"
-    except Exception as e:
-        elapsed = (time.monotonic() - start) * 1000
-        return False, f"{e} ({elapsed:.0f}ms)"
+        sock = open_beacon_socket()
+    except OSError as e:
+        return _result(False, str(e), start)
+    arrivals = []
+    info = None
+    try:
+        deadline = start + seconds
+        while (remaining := deadline - time.monotonic()) > 0:
+            readable, _, _ = select.select([sock], [], [], remaining)
+            if not readable:
+                break
+            data, _ = sock.recvfrom(1024)
+            beacon = parse_beacon(data)
+            if beacon is None:
+                continue
+            arrivals.append(time.monotonic())
+            if info is None:
+                info = beacon
+                found.offer(beacon, "beacon")
+    finally:
+        sock.close()
+    if info is None:
+        return _result(False, f"no beacon received in {seconds:.0f}s", start)
+    ip, ws_port, video_port = info
+    metrics = {"ip": ip, "ws_port": ws_port, "video_port": video_port, "beacons": len(arrivals)}
+    detail = f"found at {ip} ws={ws_port} video={video_port}"
+    intervals = [(b - a) * 1000 for a, b in zip(arrivals, arrivals[1:])]
+    if len(intervals) >= 2:
+        metrics["interval_ms"] = round(statistics.fmean(intervals), 1)
+        metrics["jitter_ms"] = round(statistics.stdev(intervals), 1)
+        metrics["max_interval_ms"] = round(max(intervals), 1)
+        detail += (f", {len(arrivals)} beacons, interval {metrics['interval_ms']:.0f}ms "
+                   f"± {metrics['jitter_ms']:.1f}ms (max {metrics['max_interval_ms']:.0f}ms)")
+    return _result(True, detail, start, **metrics)
 
 
-def test_ssh() -> tuple[bool, str]:
+def test_ssh() -> dict:
     """Test SSH connectivity to Pi."""
     start = time.monotonic()
     try:
@@ -52,74 +143,178 @@ def test_ssh() -> tuple[bool, str]:
              "robothector", "echo ok"],
             capture_output=True, text=True, timeout=10,
         )
-        elapsed = (time.monotonic() - start) * 1000
-        if result.returncode == 0 and "ok" in result.stdout:
-            return True, f"connected ({elapsed:.0f}ms)"
-        return False, f"exit={result.returncode} ({elapsed:.0f}ms)"
     except subprocess.TimeoutExpired:
-        elapsed = (time.monotonic() - start) * 1000
-        return False, f"timeout ({elapsed:.0f}ms)"
+        return _result(False, "timeout", start)
     except FileNotFoundError:
-        return False, "ssh not found"
+        return _result(False, "ssh not found", start)
+    if result.returncode == 0 and "ok" in result.stdout:
+        return _result(True, "connected", start)
+    return _result(False, f"exit={result.returncode}", start)
 
 
-def test_http_video(host: str) -> tuple[bool, str]:
+def test_http_video(found: _Host) -> dict:
     """Test HTTP video endpoint."""
     start = time.monotonic()
-    url = f"http://{host}:{VIDEO_PORT}/health"
+    info = found.wait(HOST_TIMEOUT)
+    if info is None:
+        return _result(False, "no host discovered (pass --host)", start)
+    url = f"http://{info[0]}:{info[2]}/health"
     try:
-        resp = urllib.request.urlopen(url, timeout=3)
-        elapsed = (time.monotonic() - start) * 1000
-        return True, f"HTTP {resp.status} ({elapsed:.0f}ms)"
+        with urllib.request.urlopen(url, timeout=3) as resp:
+            status = resp.status
     except Exception as e:
-        elapsed = (time.monotonic() - start) * 1000
-        return False, f"{e} ({elapsed:.0f}ms)"
+        return _result(False, str(e), start)
+    return _result(True, f"HTTP {status}", start, status=status)
 
 
-def test_websocket(host: str) -> tuple[bool, str]:
-    """Test WebSocket connectivity."""
+def test_websocket(found: _Host, pings: int) -> dict:
+    """Connect as a spectator and measure ping round trips."""
     start = time.monotonic()
     try:
         import websocket
-        ws = websocket.create_connection(f"ws://{host}:{WS_PORT}", timeout=3)
-        ws.close()
-        elapsed = (time.monotonic() - start) * 1000
-        return True, f"connected ({elapsed:.0f}ms)"
     except ImportError:
-        return False, "websocket-client not installed"
+        return _result(False, "websocket-client not installed", start)
+    info = found.wait(HOST_TIMEOUT)
+    if info is None:
+        return _result(False, "no host discovered (pass --host)", start)
+    from client.clocksync import now_ns
+
+    try:
+        ws = websocket.create_connection(f"ws://{info[0]}:{info[1]}/?role=spectator", timeout=3)
+    except Exception as e:
+        return _result(False, str(e), start)
+    connect_ms = (time.monotonic() - start) * 1000
+    rtts = []
+    lost = 0
+    try:
+        for _ in range(pings):
+            t0 = now_ns()
+            ws.send(json.dumps({"type": "ping", "t": t0}))
+            while True:
+                try:
+                    msg = json.loads(ws.recv())
+                except websocket.WebSocketTimeoutException:
+                    lost += 1
+                    break
+                if msg.get("type") == "pong" and msg.get("t") == t0:
+                    rtts.append((now_ns() - t0) / 1e6)
+                    break
+            time.sleep(PING_INTERVAL)
     except Exception as e:
-        elapsed = (time.monotonic() - start) * 1000
-        return False, f"{e} ({elapsed:.0f}ms)"
+        return _result(False, f"{e} after {len(rtts)} pings", start)
+    finally:
+        ws.close()
+    if not rtts:
+        return _result(False, f"connected ({connect_ms:.0f}ms), no pongs", start)
+    rtt = _stats(rtts)
+    return _result(True, f"connected ({connect_ms:.0f}ms), {len(rtts)} pings RTT "
+                   f"p50/p95/p99/max {rtt['p50']:.1f}/{rtt['p95']:.1f}/{rtt['p99']:.1f}/"
+                   f"{rtt['max']:.1f}ms", start,
+                   connect_ms=round(connect_ms, 1), pings=len(rtts), lost=lost, rtt_ms=rtt)
 
 
-def main():
-    print("Robothector Connection Test")
-    print("=" * 50)
+def test_video_stream(found: _Host, seconds: float) -> dict:
+    """Read /video_feed for `seconds`; sustained fps and bandwidth."""
+    start = time.monotonic()
+    info = found.wait(HOST_TIMEOUT)
+    if info is None:
+        return _result(False, "no host discovered (pass --host)", start)
+    os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")  # keep --json stdout clean
+    from client.video import MjpegParser
 
-    host = DEFAULT_HOST
-    all_pass = True
+    parser = MjpegParser()
+    received = 0
+    arrivals = []
+    try:
+        with urllib.request.urlopen(f"http://{info[0]}:{info[2]}/video_feed", timeout=3) as stream:
+            t0 = time.monotonic()
+            while time.monotonic() - t0 < seconds:
+                chunk = stream.read1(65536)
+                if not chunk:
+                    break
+                received += len(chunk)
+                now = time.monotonic()
+                arrivals.extend(now for _ in parser.feed(chunk))
+            window = time.monotonic() - t0
+    except Exception as e:
+        return _result(False, str(e), start)
+    if len(arrivals) < 2:
+        return _result(False, f"{len(arrivals)} frames in {window:.1f}s", start)
+    fps = (len(arrivals) - 1) / (arrivals[-1] - arrivals[0])
+    mbps = received * 8 / window / 1e6
+    gaps = _stats([(b - a) * 1000 for a, b in zip(arrivals, arrivals[1:])])
+    return _result(True, f"{fps:.1f} fps, {mbps:.1f} Mbit/s over {window:.1f}s, frame gap "
+                   f"p50/p95/max {gaps['p50']:.0f}/{gaps['p95']:.0f}/{gaps['max']:.0f}ms", start,
+                   frames=len(arrivals), fps=round(fps, 2), mbit_s=round(mbps, 2),
+                   kib_per_frame=round(received / len(arrivals) / 1024, 1), gap_ms=gaps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Robothector connection test")
+    parser.add_argument("--host", help="Server address (default: first beacon or mDNS answer)")
+    parser.add_argument("--pings", type=int, default=PINGS)
+    parser.add_argument("--video-seconds", type=float, default=VIDEO_SECONDS)
+    parser.add_argument("--beacon-seconds", type=float, default=BEACON_SECONDS)
+    parser.add_argument("--json", nargs="?", const="-", metavar="PATH",
+                        help="Write the report as JSON to PATH (default: stdout only)")
+    args = parser.parse_args()
 
+    found = _Host(args.host)
     tests = [
-        ("mDNS", test_mdns, False),          # not critical
-        ("UDP beacon", test_udp_beacon, False),  # not critical
-        ("SSH", test_ssh, True),              # critical
-        ("HTTP video", lambda: test_http_video(host), False),
-        ("WebSocket", lambda: test_websocket(host), False),
+        ("mDNS", lambda: test_mdns(found), False),
+        ("UDP beacon", lambda: test_udp_beacon(found, args.beacon_seconds), False),
+        ("SSH", test_ssh, True),
+        ("HTTP video", lambda: test_http_video(found), False),
+        ("WebSocket", lambda: test_websocket(found, args.pings), False),
+        ("Video stream", lambda: test_video_stream(found, args.video_seconds), False),
     ]
+    quiet = args.json == "-"
+    if not quiet:
+        print("Robothector Connection Test")
+        print("=" * 50)
+
+    start = time.monotonic()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=len(tests)) as pool:
+        futures = [pool.submit(fn) for _, fn, _ in tests]
+    results = []
+    for (name, _, critical), future in zip(tests, futures):
+        try:
+            r = future.result()
+        except Exception as e:
+            r = {"passed": False, "detail": f"{type(e).__name__}: {e}", "elapsed_ms": None,
+                 "metrics": {}}
+        results.append(dict(name=name, critical=critical, **r))
+    all_pass = all(r["passed"] for r in results if r["critical"])
+
+    if not quiet:
+        for r in results:
+            status = "PASS" if r["passed"] else "FAIL"
+            marker = " [critical]" if r["critical"] and not r["passed"] else ""
+            print(f"  {status}: {r['name']} — {r['detail']} ({r['elapsed_ms']}ms){marker}")
+        print("=" * 50)
+        print(f"Host: {found.info[0] if found.info else 'not found'}"
+              + (f" (via {found.source})" if found.source else "")
+              + f", {time.monotonic() - start:.1f}s total")
+        if all_pass:
+            print("All critical tests passed.")
+        else:
+            print("Some critical tests FAILED.")
 
-    for name, test_fn, critical in tests:
-        passed, detail = test_fn()
-        status = "PASS" if passed else "FAIL"
-        marker = " [critical]" if critical and not passed else ""
-        print(f"  {status}: {name} — {detail}{marker}")
-        if critical and not passed:
-            all_pass = False
-
-    print("=" * 50)
-    if all_pass:
-        print("All critical tests passed.")
-    else:
-        print("Some critical tests FAILED.")
+    if args.json:
+        report = {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "host": found.info[0] if found.info else None,
+            "host_source": found.source,
+            "elapsed_s": round(time.monotonic() - start, 2),
+            "passed": all_pass,
+            "tests": results,
+        }
+        if quiet:
+            json.dump(report, sys.stdout, indent=2)
+            print()
+        else:
+            with open(args.json, "w") as f:
+                json.dump(report, f, indent=2)
     sys.exit(0 if all_pass else 1)
 
 
@@ -0,0 +1,64 @@
+"""Merged client + robot trace capture (F5).
+
+Snapshots this process's spans, asks the robot which HTTP ports serve
+/trace (one per server process: the control process and, with
+--video-loop process, the camera process), fetches those and writes one
+Chrome trace / Perfetto JSON file with the robot's spans shifted onto
+the client clock by the ping/pong offset estimate (common/tracing.py).
+Runs on its own thread so the UI keeps drawing.
+
+Usage:
+    capture(network, host, video_port, out_dir)   # -> trace-<time>.json
+"""
+
+import json
+import os
+import threading
+import time
+import urllib.request
+
+from common import tracing
+
+
+def capture(network, host: str, video_port: int, out_dir: str = ".") -> threading.Thread:
+    """Start writing a merged trace in the background; returns the thread."""
+    thread = threading.Thread(target=_capture, args=(network, host, video_port, out_dir),
+                              name="trace-capture", daemon=True)
+    thread.start()
+    return thread
+
+
+def _capture(network, host: str, video_port: int, out_dir: str):
+    dumps = [(tracing.dump(), 0)]
+    ports = network.request_trace_ports() or [video_port]
+    offset = network.clock.offset_ns()
+    if offset is None:
+        _log("clock not synced: robot spans are left on the robot clock")
+    seen = set()
+    for port in ports:
+        url = f"http://{host}:{port}/trace"
+        try:
+            with urllib.request.urlopen(url, timeout=10) as response:
+                data = json.load(response)
+        except (OSError, ValueError) as e:
+            _log(f"could not fetch {url}: {e}")
+            continue
+        if data["pid"] in seen:
+            continue  # the video port is served by the control process too
+        seen.add(data["pid"])
+        dumps.append((data, offset or 0))
+
+    os.makedirs(out_dir, exist_ok=True)
+    path = os.path.join(out_dir, time.strftime("trace-%Y%m%d-%H%M%S.json"))
+    try:
+        with open(path, "w") as f:
+            json.dump(tracing.chrome_trace(dumps), f)
+    except OSError as e:
+        _log(f"could not write {path}: {e}")
+        return
+    spans = sum(len(t["spans"]) for data, _ in dumps for t in data["threads"])
+    _log(f"wrote {spans} spans from {len(dumps)} processes to {path}")
+
+
+def _log(msg: str):
+    print(f"[trace] {msg}")
@@ -1,15 +1,37 @@
 """HUD overlay rendering for the client display.
 
 Renders camera feed, connection status, mode indicator, and joystick position.
+Fleet mode renders a thumbnail wall of every robot instead. With a
+visible client.perf.PerfRecorder the performance overlay is drawn on top:
+rolling graphs of the client pipeline and a per-stage time breakdown.
 """
 
+import math
+import statistics
+import time
+
 import pygame
 
 SCREEN_W, SCREEN_H = 1280, 800
 VIDEO_W, VIDEO_H = 640, 480
+PIP_W = 256  # picture-in-picture inset width
+
+# Performance overlay graphs: (column, label, minimum full scale, reference line)
+PERF_GRAPHS = (
+    ("frame", "frame ms", 50.0, 1000 / 30),
+    ("decode", "decode ms", 10.0, None),
+    ("gc", "gc pause ms", 5.0, None),
+    ("video_fps", "video fps", 35.0, 30.0),
+    ("send_kbps", "send kbit/s", 20.0, None),
+    ("input_samples", "input events/frame", 4.0, None),
+    ("rtt", "control rtt ms", 20.0, None),
+)
+PERF_STAGES = ("events", "input", "render", "scale", "flip")
+PERF_GRAPH_W, PERF_GRAPH_H = 300, 52
 
 _font = None
 _font_large = None
+_perf_panel = None  # translucent overlay background, built on first use
 
 
 def init():
@@ -21,18 +43,36 @@ def init():
 
 def render(screen: pygame.Surface, frame: pygame.Surface | None,
            state: dict | None, input_data: dict, connected: bool,
-           video_connected: bool):
-    """Render full UI frame."""
+           video_connected: bool, video_stats: dict | None = None,
+           roi: dict | None = None, source: str | None = None,
+           pip: pygame.Surface | None = None, pip_source: str | None = None,
+           perf=None):
+    """Render full UI frame.
+
+    `source` names the camera shown when the robot has several; `pip`
+    is a second camera's frame for the picture-in-picture inset. `perf`
+    (a PerfRecorder) gets the video scale time and, when visible, is
+    drawn as the performance overlay.
+    """
     screen.fill((20, 20, 20))
 
     # Camera feed
     if frame is not None:
+        t0 = time.perf_counter()
         _draw_video(screen, frame)
+        if perf is not None:
+            perf.add("scale", (time.perf_counter() - t0) * 1000)
     else:
         _draw_no_signal(screen)
 
-    # Connection status (top-left)
+    # Connection status and camera name (top-left)
     _draw_connection(screen, connected, video_connected)
+    if source:
+        screen.blit(_font.render(f"CAM {source}", True, (200, 200, 200)), (12, 60))
+
+    # Second camera (top-right, under the mode)
+    if pip is not None:
+        _draw_pip(screen, pip, pip_source)
 
     # Mode indicator (top-right)
     mode = input_data.get("mode", "")
@@ -42,6 +82,18 @@ def render(screen: pygame.Surface, frame: pygame.Surface | None,
     # Joystick indicator (bottom-center)
     _draw_joystick_indicator(screen, input_data.get("axis_x", 0), input_data.get("axis_y", 0))
 
+    # Video latency (bottom-left)
+    if video_stats:
+        _draw_video_stats(screen, video_stats)
+
+    # Camera zoom (bottom-right)
+    if roi and roi.get("zoom", 1.0) > 1.0:
+        _draw_roi(screen, roi)
+
+    # Performance overlay (left, under the status)
+    if perf is not None and perf.visible:
+        _draw_perf(screen, perf)
+
 
 def _draw_video(screen: pygame.Surface, frame: pygame.Surface):
     """Scale and center the camera feed."""
@@ -54,6 +106,16 @@ def _draw_video(screen: pygame.Surface, frame: pygame.Surface):
     screen.blit(scaled, (x, y))
 
 
+def _draw_pip(screen: pygame.Surface, frame: pygame.Surface, name: str | None):
+    """Draw a second camera as an inset with its name."""
+    rect = pygame.Rect(SCREEN_W - PIP_W - 12, 70, PIP_W, PIP_W * VIDEO_H // VIDEO_W)
+    screen.blit(pygame.transform.scale(frame, rect.size), rect.topleft)
+    pygame.draw.rect(screen, (200, 200, 200), rect, 2)
+    if name:
+        label = _font.render(name, True, (230, 230, 230))
+        screen.blit(label, (rect.x + 6, rect.bottom - 22))
+
+
 def _draw_no_signal(screen: pygame.Surface):
     """Show 'No Signal' placeholder."""
     text = _font_large.render("No Signal", True, (120, 120, 120))
@@ -76,6 +138,77 @@ def _draw_connection(screen: pygame.Surface, ws_connected: bool, video_connected
     screen.blit(label, (34, 36))
 
 
+def _draw_video_stats(screen: pygame.Surface, stats: dict):
+    """Draw glass-to-glass latency and drop count."""
+    lines = []
+    glass = stats.get("capture_to_display")
+    recv = stats.get("capture_to_receive")
+    if glass:
+        lines.append(f"glass {glass['p50']:.0f} ms (p95 {glass['p95']:.0f})")
+    if recv:
+        lines.append(f"recv {recv['p50']:.0f} ms")
+    lines.append(f"drops {stats.get('dropped', 0)}")
+    for i, line in enumerate(lines):
+        text = _font.render(line, True, (200, 200, 200))
+        screen.blit(text, (12, SCREEN_H - 24 * (len(lines) - i) - 8))
+
+
+def _draw_roi(screen: pygame.Surface, roi: dict):
+    """Draw the zoomed region inside the full field of view, and the zoom factor."""
+    w, h = 120, 90
+    frame = pygame.Rect(SCREEN_W - w - 12, SCREEN_H - h - 12, w, h)
+    pygame.draw.rect(screen, (80, 80, 80), frame, 1)
+    zoom = roi["zoom"]
+    crop = pygame.Rect(0, 0, max(2, int(w / zoom)), max(2, int(h / zoom)))
+    crop.center = (frame.x + int(roi["x"] * w), frame.y + int(roi["y"] * h))
+    pygame.draw.rect(screen, (0, 180, 255), crop, 2)
+    text = _font.render(f"{zoom:.1f}x", True, (200, 200, 200))
+    screen.blit(text, text.get_rect(bottomright=(frame.right, frame.top - 4)))
+
+
+def _draw_perf(screen: pygame.Surface, perf):
+    """Draw the rolling pipeline graphs and the median time of each stage."""
+    global _perf_panel
+    x, y = 12, 90
+    if _perf_panel is None:
+        _perf_panel = pygame.Surface(
+            (PERF_GRAPH_W + 16, len(PERF_GRAPHS) * (PERF_GRAPH_H + 8) + 40), pygame.SRCALPHA)
+        _perf_panel.fill((0, 0, 0, 170))
+    screen.blit(_perf_panel, (x - 8, y - 8))
+    for column, label, floor, ref in PERF_GRAPHS:
+        _draw_graph(screen, pygame.Rect(x, y, PERF_GRAPH_W, PERF_GRAPH_H),
+                    perf.series(column), label, floor, ref)
+        y += PERF_GRAPH_H + 8
+    medians = []
+    for stage in PERF_STAGES:
+        values = [v for v in perf.series(stage)[-60:] if v is not None]
+        medians.append(f"{stage} {statistics.median(values):.1f}" if values else f"{stage} -")
+    text = _font.render("  ".join(medians) + " ms", True, (220, 220, 220))
+    screen.blit(text, (x, y))
+
+
+def _draw_graph(screen: pygame.Surface, rect: pygame.Rect, values: list, label: str,
+                floor: float, ref: float | None):
+    """One rolling line graph, newest sample at the right edge."""
+    pygame.draw.rect(screen, (70, 70, 70), rect, 1)
+    known = [v for v in values if v is not None]
+    top = max([floor] + [v * 1.1 for v in known])
+
+    def y_of(v: float) -> int:
+        return rect.bottom - 1 - int(min(v, top) / top * (rect.height - 2))
+
+    if ref is not None:
+        pygame.draw.line(screen, (120, 90, 0), (rect.x, y_of(ref)), (rect.right - 1, y_of(ref)))
+    step = rect.width / max(1, len(values) - 1)
+    points = [(rect.x + int(i * step), y_of(v)) for i, v in enumerate(values) if v is not None]
+    if len(points) >= 2:
+        pygame.draw.lines(screen, (0, 200, 255), False, points)
+    current = f"{known[-1]:.1f}" if known else "-"
+    peak = f"{max(known):.1f}" if known else "-"
+    text = _font.render(f"{label}  {current} (max {peak})", True, (220, 220, 220))
+    screen.blit(text, (rect.x + 4, rect.y + 2))
+
+
 def _draw_mode(screen: pygame.Surface, mode: str):
     """Draw mode label in top-right."""
     colors = {
@@ -100,3 +233,58 @@ def _draw_joystick_indicator(screen: pygame.Surface, axis_x: float, axis_y: floa
     sx = cx + int(axis_x * (radius - 6))
     sy = cy + int(axis_y * (radius - 6))
     pygame.draw.circle(screen, (0, 180, 255), (sx, sy), 6)
+
+
+def render_fleet(screen: pygame.Surface, sessions: list, input_data: dict):
+    """Render the fleet thumbnail wall with the focused robot highlighted."""
+    screen.fill((20, 20, 20))
+
+    if not sessions:
+        text = _font_large.render("Searching for robots...", True, (120, 120, 120))
+        screen.blit(text, text.get_rect(center=(SCREEN_W // 2, SCREEN_H // 2)))
+        return
+
+    cols = math.ceil(math.sqrt(len(sessions)))
+    rows = math.ceil(len(sessions) / cols)
+    cell_w, cell_h = SCREEN_W // cols, (SCREEN_H - 100) // rows
+    tile_w = min(cell_w - 12, (cell_h - 12) * VIDEO_W // VIDEO_H)
+    tile_h = tile_w * VIDEO_H // VIDEO_W
+
+    for i, session in enumerate(sessions):
+        x = (i % cols) * cell_w + (cell_w - tile_w) // 2
+        y = (i // cols) * cell_h + (cell_h - tile_h) // 2
+        _draw_fleet_tile(screen, pygame.Rect(x, y, tile_w, tile_h), session)
+
+    _draw_joystick_indicator(screen, input_data.get("axis_x", 0), input_data.get("axis_y", 0))
+
+
+def _draw_fleet_tile(screen: pygame.Surface, rect: pygame.Rect, session):
+    """Draw one robot's thumbnail, status and resource usage."""
+    thumb = session.thumbnail
+    if thumb is not None:
+        screen.blit(pygame.transform.scale(thumb, rect.size), rect.topleft)
+    else:
+        pygame.draw.rect(screen, (40, 40, 40), rect)
+        text = _font.render("No Signal", True, (120, 120, 120))
+        screen.blit(text, text.get_rect(center=rect.center))
+
+    border = (255, 200, 0) if session.focused else (80, 80, 80)
+    pygame.draw.rect(screen, border, rect, 4 if session.focused else 1)
+
+    # Link dots and name (top-left of tile)
+    for j, ok in enumerate((session.connected, session.video_connected)):
+        color = (0, 200, 0) if ok else (200, 0, 0)
+        pygame.draw.circle(screen, color, (rect.x + 14 + j * 18, rect.y + 14), 6)
+    state = session.state or {}
+    name = session.ip + (f"  {state['mode'].upper()}" if state.get("mode") else "")
+    screen.blit(_font.render(name, True, (230, 230, 230)), (rect.x + 50, rect.y + 6))
+    if session.focused:
+        label = _font.render("DRIVE", True, (255, 200, 0))
+        screen.blit(label, label.get_rect(topright=(rect.right - 8, rect.y + 6)))
+
+    # Resource usage (bottom of tile)
+    st = session.stats
+    usage = (f"{st['fps']:.0f} fps  {st['rx_kbps'] / 1000:.2f} Mb/s  "
+             f"cpu {st['cpu_pct']:.1f}%")
+    text = _font.render(usage, True, (200, 200, 200))
+    screen.blit(text, (rect.x + 8, rect.bottom - 24))
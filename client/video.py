@@ -1,26 +1,49 @@
 """MJPEG stream receiver and pygame surface decoder.
 
 Connects to the server's MJPEG HTTP endpoint in a background thread
-and decodes JPEG frames into pygame Surfaces.
+and decodes JPEG frames into pygame Surfaces. `source` picks one of the
+robot's cameras (None: its primary) and `stream` main or lores;
+set_source() switches cameras on the running reader. The socket is tuned
+as the "video" traffic class (common/netqos.py): a bounded receive
+window, so video cannot pile up in flight ahead of control traffic.
+
+Parts carry X-Frame-Seq / X-Sensor-Timestamp / X-Encode-Time headers.
+With a ClockSync (from NetworkClient) these become capture-to-receive
+and capture-to-display latencies; sequence gaps count dropped frames.
+X-Trace-Id ties the client's decode and display spans (common/tracing.py)
+to the server's capture and send spans of the same frame.
 """
 
+import collections
+import http.client
 import io
 import threading
 import time
-import urllib.request
 
 import pygame
 
+from client.clocksync import now_ns
+from common import netqos, tracing
+
+STATS_WINDOW = 300        # frames kept for percentiles
+STATS_LOG_INTERVAL = 10.0
+
 
 class VideoStream:
-    def __init__(self, host: str = "robothector.local", video_port: int = 5000):
+    def __init__(self, host: str = "robothector.local", video_port: int = 5000,
+                 clock=None, source: str | None = None, stream: str = "main"):
         self._host = host
         self._video_port = video_port
+        self.source = source
+        self._stream = stream
         self._thread = None
         self._running = False
         self._connected = False
         self._frame = None
+        self._frame_meta = None  # (capture_ns in client clock or None, displayed,
+                                 #  trace_id, decoded at (tracing clock))
         self._lock = threading.Lock()
+        self.stats = VideoStats(clock)
 
     def start(self):
         """Start the background stream reader thread."""
@@ -39,39 +62,225 @@ class VideoStream:
         with self._lock:
             return self._frame
 
+    def mark_displayed(self):
+        """Call right after the frame from get_frame() reached the screen."""
+        with self._lock:
+            meta = self._frame_meta
+            if meta is None or meta[1]:
+                return
+            self._frame_meta = (meta[0], True, meta[2], meta[3])
+        self.stats.record_display(meta[0])
+        if meta[2] is not None:
+            tracing.record("display", meta[3], tracing.now(), meta[2])
+
     def is_connected(self) -> bool:
         return self._connected
 
+    def set_source(self, source: str | None):
+        """Switch cameras; the reader reconnects after the current frame."""
+        self.source = source
+
+    def _path(self) -> str:
+        query = f"?stream={self._stream}"
+        if self.source:
+            query += f"&source={self.source}"
+        return f"/video_feed{query}"
+
+    def _url(self) -> str:
+        return f"http://{self._host}:{self._video_port}{self._path()}"
+
+    def _open(self):
+        """Connect, tune the socket, request the stream; returns (conn, response)."""
+        conn = http.client.HTTPConnection(self._host, self._video_port, timeout=5)
+        try:
+            conn.connect()
+            netqos.apply(conn.sock, "video", f"{self._host}:{self._video_port}")
+            conn.request("GET", self._path())
+            response = conn.getresponse()
+            if response.status != 200:
+                raise OSError(f"HTTP {response.status} {response.reason}")
+        except Exception:
+            conn.close()
+            raise
+        return conn, response
+
     def _run_loop(self):
         """Connect to MJPEG stream and decode frames."""
         while self._running:
-            url = f"http://{self._host}:{self._video_port}/video_feed"
+            source = self.source
+            url = self._url()
             try:
                 _log(f"connecting to {url}...")
-                stream = urllib.request.urlopen(url, timeout=5)
+                conn, stream = self._open()
                 self._connected = True
                 _log("connected")
-                self._read_stream(stream)
+                try:
+                    self._read_stream(stream, source)
+                finally:
+                    conn.close()
             except Exception as e:
                 _log(f"stream error: {e}")
                 self._connected = False
             finally:
                 self._connected = False
 
-            if self._running:
+            if self._running and self.source == source:
                 time.sleep(2.0)
 
-    def _read_stream(self, stream):
-        """Parse multipart MJPEG stream and decode frames."""
-        buf = b""
-        while self._running:
-            chunk = stream.read(4096)
+    def _read_stream(self, stream, source: str | None):
+        """Parse multipart MJPEG stream and decode frames until the source changes."""
+        parser = MjpegParser()
+        self.stats.reset_sequence()
+        while self._running and self.source == source:
+            # read1 returns what has arrived; read(n) would hold a finished
+            # frame back until n bytes of the next one came in
+            chunk = stream.read1(65536)
             if not chunk:
                 break
-            buf += chunk
 
-            # Find JPEG start (FFD8) and end (FFD9) markers
-            while True:
+            for headers, jpeg_data in parser.feed(chunk):
+                capture_ns = self.stats.record_receive(headers)
+                trace_id = tracing.parse_id(headers.get("x-trace-id"))
+                try:
+                    t0 = time.perf_counter()
+                    with tracing.span("decode", trace_id):
+                        bio = io.BytesIO(jpeg_data)
+                        surface = pygame.image.load(bio, "frame.jpg")
+                    self.stats.decode_ms_total += (time.perf_counter() - t0) * 1000
+                    with self._lock:
+                        self._frame = surface
+                        self._frame_meta = (capture_ns, False, trace_id, tracing.now())
+                except Exception:
+                    pass
+            self.stats.maybe_log()
+
+
+class VideoStats:
+    """Rolling frame timing: latency, inter-frame gaps and drops.
+
+    Written by the stream thread, read by the HUD; values are replaced,
+    and summary() works on copies, so no lock is needed for reads.
+    """
+
+    def __init__(self, clock=None):
+        self._clock = clock
+        self._receive_ms = collections.deque(maxlen=STATS_WINDOW)
+        self._display_ms = collections.deque(maxlen=STATS_WINDOW)
+        self._gaps_ms = collections.deque(maxlen=STATS_WINDOW)
+        self._last_seq = None
+        self._last_receive = None
+        self.frames = 0
+        self.dropped = 0
+        self.decode_ms_total = 0.0  # JPEG decode time, for client.perf
+        self._last_log = time.monotonic()
+
+    def reset_sequence(self):
+        """New connection: sequence numbers and gaps restart."""
+        self._last_seq = None
+        self._last_receive = None
+
+    def record_receive(self, headers: dict) -> int | None:
+        """Account for a received part; returns its capture time in client ns."""
+        now = now_ns()
+        self.frames += 1
+        if self._last_receive is not None:
+            self._gaps_ms.append((now - self._last_receive) / 1e6)
+        self._last_receive = now
+
+        seq = headers.get("x-frame-seq")
+        if seq is not None:
+            seq = int(seq)
+            if self._last_seq is not None and seq > self._last_seq + 1:
+                self.dropped += seq - self._last_seq - 1
+            self._last_seq = seq
+
+        sensor = headers.get("x-sensor-timestamp")
+        if sensor is None or self._clock is None:
+            return None
+        capture_ns = self._clock.to_local(int(sensor))
+        if capture_ns is not None:
+            self._receive_ms.append((now - capture_ns) / 1e6)
+        return capture_ns
+
+    def record_display(self, capture_ns: int | None):
+        if capture_ns is not None:
+            self._display_ms.append((now_ns() - capture_ns) / 1e6)
+
+    def summary(self) -> dict:
+        """Percentiles over the last STATS_WINDOW frames (ms)."""
+        return {
+            "capture_to_receive": _percentiles(self._receive_ms),
+            "capture_to_display": _percentiles(self._display_ms),
+            "frame_gap": _percentiles(self._gaps_ms),
+            "frames": self.frames,
+            "dropped": self.dropped,
+        }
+
+    def maybe_log(self):
+        now = time.monotonic()
+        if now - self._last_log < STATS_LOG_INTERVAL:
+            return
+        self._last_log = now
+        s = self.summary()
+        parts = [f"{s['frames']} frames, {s['dropped']} dropped"]
+        for key, label in (("capture_to_receive", "recv"), ("capture_to_display", "glass"),
+                           ("frame_gap", "gap")):
+            p = s[key]
+            if p:
+                parts.append(f"{label} p50/p95/max {p['p50']:.0f}/{p['p95']:.0f}/{p['max']:.0f} ms")
+        _log(", ".join(parts))
+
+
+def _percentiles(values) -> dict | None:
+    data = sorted(values)
+    if not data:
+        return None
+    n = len(data)
+    return {
+        "p50": data[n // 2],
+        "p95": data[min(n - 1, int(n * 0.95))],
+        "max": data[-1],
+    }
+
+
+class MjpegParser:
+    """Incremental splitter for a multipart MJPEG byte stream.
+
+    Feed it raw chunks as they arrive; it returns (headers, jpeg) for the
+    complete parts found so far, with header names lower-cased. Parts
+    with Content-Length are cut by length; older servers that omit it
+    fall back to scanning for the JPEG start/end markers. Shared by
+    VideoStream and the fleet client.
+    """
+
+    def __init__(self):
+        self._buf = b""
+        self._headers = None  # headers of the part whose body is pending
+
+    def feed(self, chunk: bytes) -> list[tuple[dict, bytes]]:
+        """Append a chunk and return any complete (headers, jpeg) parts."""
+        buf = self._buf + chunk
+        parts = []
+
+        while True:
+            if self._headers is None:
+                end = buf.find(b"\r\n\r\n")
+                if end == -1:
+                    if len(buf) > 65536:
+                        buf = buf[-4096:]
+                    break
+                self._headers = _parse_part_headers(buf[:end])
+                buf = buf[end + 4:]
+
+            length = self._headers.get("content-length")
+            if length is not None:
+                length = int(length)
+                if len(buf) < length:
+                    break
+                jpeg_data = buf[:length]
+                buf = buf[length:]
+            else:
+                # Find JPEG start (FFD8) and end (FFD9) markers
                 start = buf.find(b"\xff\xd8")
                 end = buf.find(b"\xff\xd9", start + 2) if start != -1 else -1
                 if start == -1 or end == -1:
@@ -81,17 +290,24 @@ class VideoStream:
                     elif len(buf) > 65536:
                         buf = buf[-4096:]
                     break
-
                 jpeg_data = buf[start:end + 2]
                 buf = buf[end + 2:]
 
-                try:
-                    bio = io.BytesIO(jpeg_data)
-                    surface = pygame.image.load(bio, "frame.jpg")
-                    with self._lock:
-                        self._frame = surface
-                except Exception:
-                    pass
+            parts.append((self._headers, jpeg_data))
+            self._headers = None
+
+        self._buf = buf
+        return parts
+
+
+def _parse_part_headers(block: bytes) -> dict:
+    """Header lines of a part; the boundary line has no colon and is skipped."""
+    headers = {}
+    for line in block.decode("latin-1").split("\r\n"):
+        key, sep, value = line.partition(":")
+        if sep:
+            headers[key.strip().lower()] = value.strip()
+    return headers
 
 
 def _log(msg: str):
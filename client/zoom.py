@@ -0,0 +1,48 @@
+"""Pan/zoom of the robot camera's region of interest from the gamepad.
+
+The right stick pans and the triggers zoom (R2 in, L2 out), both as
+rates, so holding a direction keeps moving; Y resets to the full view.
+The server crops on the sensor (ScalerCrop), so a zoomed view carries
+real detail rather than upscaled pixels. Changes go out as
+{"type": "roi", "zoom", "x", "y"} at most every SEND_INTERVAL.
+"""
+
+import time
+
+MAX_ZOOM = 5.0        # same limit as server.camera
+ZOOM_RATE = 2.0       # zoom factor per second at full trigger
+PAN_RATE = 0.6        # visible widths per second at full deflection
+SEND_INTERVAL = 0.1
+
+
+class ZoomControl:
+    def __init__(self):
+        self.zoom, self.x, self.y = 1.0, 0.5, 0.5
+        self._sent = (self.zoom, self.x, self.y)
+        self._last_send = 0.0
+        self._last_update = time.monotonic()
+
+    def reset(self):
+        self.zoom, self.x, self.y = 1.0, 0.5, 0.5
+
+    def update(self, look_x: float, look_y: float, zoom: float) -> dict | None:
+        """Apply stick/trigger rates; returns an roi message when one is due."""
+        now = time.monotonic()
+        dt = min(now - self._last_update, 0.1)
+        self._last_update = now
+        if zoom:
+            self.zoom *= ZOOM_RATE ** (zoom * dt)
+        step = PAN_RATE * dt / self.zoom
+        self.zoom, self.x, self.y = _clamp(self.zoom, self.x + look_x * step,
+                                           self.y + look_y * step)
+        current = (round(self.zoom, 3), round(self.x, 4), round(self.y, 4))
+        if current == self._sent or now - self._last_send < SEND_INTERVAL:
+            return None
+        self._sent, self._last_send = current, now
+        return {"zoom": current[0], "x": current[1], "y": current[2]}
+
+
+def _clamp(zoom: float, x: float, y: float) -> tuple[float, float, float]:
+    zoom = max(1.0, min(MAX_ZOOM, zoom))
+    half = 0.5 / zoom
+    return zoom, max(half, min(1.0 - half, x)), max(half, min(1.0 - half, y))
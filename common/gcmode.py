@@ -0,0 +1,198 @@
+"""Garbage-collector pause control and telemetry for the control and video paths.
+
+Every drive message and every decoded frame leaves short-lived dicts and
+strings behind, so CPython's generational collector runs every few
+hundred allocations. Each run stops whichever thread triggered it.
+Modes:
+
+  off        collector untouched; pauses are still measured
+  freeze     after startup, collect once and gc.freeze() everything alive
+             (imports, config, long-lived servers), so later collections
+             never rescan it; thresholds raised to FREEZE_THRESHOLDS
+  safepoint  freeze, then collect explicitly from safe_point(), which the
+             control loop calls right after a command has been applied
+             (server) or a frame flipped (client). The automatic thresholds
+             go up to BACKSTOP_THRESHOLDS, so the collector only triggers
+             by itself if safe points stop coming.
+
+Pause telemetry comes from gc.callbacks: every collection's duration,
+generation and trigger ("explicit" or "auto") goes to the listeners
+(server.metrics.watch_gc exports a histogram), to a tracing span
+(common/tracing.py), and into status() / pause_total_ms() for the state
+stream and the client's perf overlay.
+
+Usage:
+    gcmode.configure("safepoint")      # at startup, after --gc is parsed
+    ...                                 # build long-lived objects
+    gcmode.freeze()                    # once, before the main loop
+    gcmode.safe_point()                # after each command / frame
+"""
+
+import collections
+import gc
+import time
+
+from common import tracing
+
+MODES = ("off", "freeze", "safepoint")
+FREEZE_THRESHOLDS = (10000, 20, 20)
+BACKSTOP_THRESHOLDS = (100000, 50, 100)
+SAFEPOINT_GEN0 = 2000   # gen0 allocations before a safe point collects
+SAFEPOINT_RATIOS = (10, 10)  # gen0 runs per gen1 run, gen1 runs per gen2 run (CPython's)
+RECENT = 200            # pauses kept for status() percentiles
+
+_mode = "off"
+_thresholds = None      # override from --gc-threshold
+_safepoint_gen0 = SAFEPOINT_GEN0
+_explicit = False
+_start_ns = 0
+_trace_start = 0
+_listeners: list = []
+_recent = collections.deque(maxlen=RECENT)   # pause seconds
+_collections = [0, 0, 0]
+_pause_total = 0.0
+_pause_max = 0.0
+_safe_points = 0
+_frozen = 0
+
+
+def configure(mode: str, thresholds: tuple | None = None):
+    """Choose the mode and start measuring pauses.
+
+    Args:
+        mode: One of MODES.
+        thresholds: gc.set_threshold() values replacing the mode's; with
+            "safepoint" the first one is the gen0 count a safe point waits for.
+
+    Raises:
+        ValueError: Unknown mode.
+    """
+    global _mode, _thresholds, _safepoint_gen0
+    if mode not in MODES:
+        raise ValueError(f"gc mode must be one of {', '.join(MODES)}")
+    _mode, _thresholds = mode, thresholds
+    if mode == "safepoint" and thresholds:
+        _safepoint_gen0 = thresholds[0]
+    if _callback not in gc.callbacks:
+        gc.callbacks.append(_callback)
+
+
+def settings() -> dict:
+    """Current mode for a child process (see restore()).
+
+    A child without a control loop has no safe points, so "safepoint"
+    becomes "freeze" there.
+    """
+    return {"mode": "freeze" if _mode == "safepoint" else _mode,
+            "thresholds": None if _mode == "safepoint" else _thresholds}
+
+
+def restore(state: dict):
+    configure(state["mode"], state["thresholds"])
+
+
+def parse_thresholds(text: str) -> tuple:
+    """"G0[,G1[,G2]]" -> a tuple of ints for configure().
+
+    Raises:
+        ValueError: Not 1-3 positive integers.
+    """
+    try:
+        values = tuple(int(v) for v in text.split(","))
+    except ValueError:
+        values = ()
+    if not 1 <= len(values) <= 3 or min(values) < 1:
+        raise ValueError(f"gc thresholds {text!r}: expected G0[,G1[,G2]] positive integers")
+    return values
+
+
+def freeze():
+    """End of startup: move every live object out of the collector's reach.
+
+    No-op in "off" mode. Call once, after the long-lived objects exist.
+    """
+    global _frozen, _explicit
+    if _mode == "off":
+        return
+    _explicit = True
+    try:
+        gc.collect()
+    finally:
+        _explicit = False
+    gc.freeze()
+    _frozen = gc.get_freeze_count()
+    if _mode == "freeze":
+        gc.set_threshold(*(_thresholds or FREEZE_THRESHOLDS))
+    else:
+        gc.set_threshold(*BACKSTOP_THRESHOLDS)
+    _log(f"{_mode}: froze {_frozen} objects, thresholds {gc.get_threshold()}")
+
+
+def safe_point():
+    """Collect now if enough has been allocated (only in "safepoint" mode)."""
+    global _explicit, _safe_points
+    if _mode != "safepoint":
+        return
+    count0, count1, count2 = gc.get_count()
+    if count0 < _safepoint_gen0:
+        return
+    ratio1, ratio2 = SAFEPOINT_RATIOS
+    generation = 2 if count2 >= ratio2 else 1 if count1 >= ratio1 else 0
+    _explicit = True
+    try:
+        gc.collect(generation)
+    finally:
+        _explicit = False
+    _safe_points += 1
+
+
+def add_listener(listener):
+    """Call `listener(generation, seconds, trigger)` after every collection.
+
+    Runs inside the collector's callback, on the collecting thread: keep it cheap.
+    """
+    _listeners.append(listener)
+
+
+def pause_total_ms() -> float:
+    """Collector pause time since configure(), for per-frame deltas."""
+    return _pause_total * 1000
+
+
+def status() -> dict:
+    """Mode, collections per generation and recent pause percentiles (ms)."""
+    pauses = sorted(_recent)
+    n = len(pauses)
+    return {
+        "mode": _mode,
+        "frozen": _frozen,
+        "threshold": list(gc.get_threshold()),
+        "collections": list(_collections),
+        "safe_points": _safe_points,
+        "pause_p50_ms": round(pauses[n // 2] * 1000, 3) if n else None,
+        "pause_p99_ms": round(pauses[min(n - 1, int(n * 0.99))] * 1000, 3) if n else None,
+        "pause_max_ms": round(_pause_max * 1000, 3),
+    }
+
+
+def _callback(phase: str, info: dict):
+    global _start_ns, _trace_start, _pause_total, _pause_max
+    if phase == "start":
+        _start_ns = time.perf_counter_ns()
+        _trace_start = tracing.now()
+        return
+    seconds = (time.perf_counter_ns() - _start_ns) / 1e9
+    generation = info["generation"]
+    trigger = "explicit" if _explicit else "auto"
+    _collections[generation] += 1
+    _pause_total += seconds
+    _pause_max = max(_pause_max, seconds)
+    _recent.append(seconds)
+    tracing.record("gc", _trace_start, tracing.now(), None, generation=generation,
+                   trigger=trigger, collected=info["collected"])
+    for listener in _listeners:
+        listener(generation, seconds, trigger)
+
+
+def _log(msg: str):
+    print(f"[gc] {msg}")
@@ -0,0 +1,160 @@
+"""Per-traffic-class socket tuning (QoS), shared by server and client.
+
+Control messages and MJPEG video share the WiFi link. Every control and
+video socket goes through apply() with its class, which sets:
+
+  nodelay        TCP_NODELAY (asyncio and websocket-client already set
+                 it; applied anyway so the report shows it)
+  dscp           IP DSCP (IP_TOS / IPV6_TCLASS). mac80211 maps it to a
+                 WMM access category on the Pi's WiFi and most APs honour
+                 it downstream: EF (46) rides the voice queue, CS1 (8)
+                 the background queue.
+  priority       SO_PRIORITY, the local qdisc band (6 = interactive,
+                 2 = bulk); values above 6 need CAP_NET_ADMIN
+  sndbuf/rcvbuf  SO_SNDBUF / SO_RCVBUF in bytes (0 = kernel autotuning).
+                 The video receive buffer caps the TCP window, so at most
+                 ~RCVBUF of video is in flight ahead of control packets.
+  notsent_lowat  TCP_NOTSENT_LOWAT: the video sender only becomes
+                 writable once less than this is unsent, so frames wait
+                 (and get skipped) in the server instead of queueing in
+                 the kernel.
+
+PROFILES holds the defaults; configure() changes them from --qos specs.
+apply() logs what the kernel actually reports back at connect time;
+options the platform or permissions refuse are listed as failed and
+never raise.
+
+Usage:
+    netqos.configure("video:dscp=10,rcvbuf=131072")   # or "off"
+    netqos.apply(sock, "control", peer="192.168.1.20:51234")
+"""
+
+import socket
+
+OPTIONS = ("nodelay", "dscp", "priority", "sndbuf", "rcvbuf", "notsent_lowat")
+PROFILES = {
+    "control": {"nodelay": 1, "dscp": 46, "priority": 6, "sndbuf": 0, "rcvbuf": 0,
+                "notsent_lowat": 0},
+    "video": {"nodelay": 1, "dscp": 8, "priority": 2, "sndbuf": 0, "rcvbuf": 256 * 1024,
+              "notsent_lowat": 64 * 1024},
+}
+SPEC_HELP = ("CLASS:OPTION=VALUE[,...] with CLASS control|video and OPTION "
+             + "|".join(OPTIONS) + ", or 'off' (repeatable)")
+
+_TCP_NOTSENT_LOWAT = getattr(socket, "TCP_NOTSENT_LOWAT", 25)  # Linux value
+_enabled = True
+
+
+def configure(spec: str):
+    """Apply one --qos spec: "CLASS:OPTION=VALUE[,...]" or "off".
+
+    Raises:
+        ValueError: See parse_spec().
+    """
+    global _enabled
+    name, updates = parse_spec(spec)
+    if name is None:
+        _enabled = False
+    else:
+        PROFILES[name].update(updates)
+
+
+def parse_spec(spec: str) -> tuple:
+    """Parse a --qos spec into (class, {option: value}); class is None for "off".
+
+    Raises:
+        ValueError: Unknown class or option, or a non-integer value.
+    """
+    if spec == "off":
+        return None, {}
+    name, sep, assignments = spec.partition(":")
+    if name not in PROFILES or not sep:
+        raise ValueError(f"--qos {spec!r}: expected {SPEC_HELP}")
+    updates = {}
+    for assignment in assignments.split(","):
+        option, _, value = assignment.partition("=")
+        if option not in OPTIONS:
+            raise ValueError(f"--qos {spec!r}: unknown option {option!r}")
+        try:
+            updates[option] = int(value, 0)
+        except ValueError:
+            raise ValueError(f"--qos {spec!r}: {option} needs an integer") from None
+    return name, updates
+
+
+def settings() -> dict:
+    """Current configuration, for handing to a child process (see restore())."""
+    return {"enabled": _enabled, "profiles": {k: dict(v) for k, v in PROFILES.items()}}
+
+
+def restore(state: dict):
+    global _enabled
+    _enabled = state["enabled"]
+    for name, profile in state["profiles"].items():
+        PROFILES[name].update(profile)
+
+
+def apply(sock, profile: str, peer: str = "") -> dict | None:
+    """Tune a connected socket for traffic class `profile` and log the result.
+
+    Returns what the kernel reports back ({option: value, "failed": [...]}),
+    or None when QoS is off or there is no socket.
+    """
+    if not _enabled or sock is None:
+        return None
+    wanted = PROFILES[profile]
+    failed = []
+    for option in OPTIONS:
+        value = wanted[option]
+        if not value and option != "nodelay":
+            continue
+        try:
+            _set(sock, option, value)
+        except (OSError, AttributeError):
+            failed.append(option)
+    report = {option: _get(sock, option) for option in OPTIONS}
+    report["failed"] = failed
+    shown = " ".join(f"{k}={v}" for k, v in report.items() if k != "failed" and v is not None)
+    _log(f"{profile} {peer or '?'}: {shown}" + (f" (failed: {', '.join(failed)})" if failed else ""))
+    return report
+
+
+def _set(sock, option: str, value: int):
+    if option == "nodelay":
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1 if value else 0)
+    elif option == "dscp":
+        if sock.family == socket.AF_INET6:
+            sock.setsockopt(socket.IPPROTO_IPV6, socket.IPV6_TCLASS, value << 2)
+        else:
+            sock.setsockopt(socket.IPPROTO_IP, socket.IP_TOS, value << 2)
+    elif option == "priority":
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_PRIORITY, value)
+    elif option == "sndbuf":
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, value)
+    elif option == "rcvbuf":
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, value)
+    elif option == "notsent_lowat":
+        sock.setsockopt(socket.IPPROTO_TCP, _TCP_NOTSENT_LOWAT, value)
+
+
+def _get(sock, option: str) -> int | None:
+    try:
+        if option == "nodelay":
+            return sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        if option == "dscp":
+            if sock.family == socket.AF_INET6:
+                return sock.getsockopt(socket.IPPROTO_IPV6, socket.IPV6_TCLASS) >> 2
+            return sock.getsockopt(socket.IPPROTO_IP, socket.IP_TOS) >> 2
+        if option == "priority":
+            return sock.getsockopt(socket.SOL_SOCKET, socket.SO_PRIORITY)
+        if option == "sndbuf":
+            return sock.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)
+        if option == "rcvbuf":
+            return sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)
+        return sock.getsockopt(socket.IPPROTO_TCP, _TCP_NOTSENT_LOWAT)
+    except (OSError, AttributeError):
+        return None
+
+
+def _log(msg: str):
+    print(f"[netqos] {msg}")
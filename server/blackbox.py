@@ -0,0 +1,276 @@
+"""Black-box recorder: the last few seconds of video, commands and motor output.
+
+Keeps a ring of timestamped records in memory:
+
+  frame    JPEG from a StreamingOutput tap (the encoder's bytes, not copied)
+  command  raw driver message as received
+  motor    (IN1, IN2, IN3, IN4) levels whenever a motors write changes them
+  event    connection / watchdog / motion events as JSON
+
+Records older than `seconds` are dropped, and so are the oldest records
+whenever the total size would exceed `max_bytes` (payload plus a fixed
+per-record overhead), so memory is strictly bounded. Appending is one
+lock, one deque append and an eviction check; nothing is encoded or
+copied on the frame path.
+
+dump() snapshots the ring (references only) and writes it from a
+background thread to an indexed file:
+
+  b"RHBB" u8 version  u32 meta_len  meta JSON
+  records: i64 ts_ns  u8 kind  u16 extra_len  u32 len  extra  payload
+  index:   per record u64 offset  i64 ts_ns  u8 kind
+  trailer: u64 index_offset  u32 count  b"RHBI"
+
+Dumps happen on request ({"type": "blackbox"} control message, SIGUSR2),
+on safe-mode entry, and on an uncaught exception in any thread.
+
+Reader:
+    uv run python -m server.blackbox blackbox/blackbox-20250101-120000.123-1-safe_mode.rbb
+    uv run python -m server.blackbox FILE --list
+    uv run python -m server.blackbox FILE --frames out/      # JPEGs, named by time
+"""
+
+import argparse
+import collections
+import itertools
+import json
+import os
+import struct
+import sys
+import threading
+import time
+
+from server.clock import now_ns
+
+MAGIC = b"RHBB"
+INDEX_MAGIC = b"RHBI"
+VERSION = 1
+KINDS = ("frame", "command", "motor", "event")
+FRAME, COMMAND, MOTOR, EVENT = range(len(KINDS))
+RECORD = struct.Struct("<qBHI")
+INDEX = struct.Struct("<QqB")
+TRAILER = struct.Struct("<QI4s")
+FRAME_EXTRA = struct.Struct("<Iq")  # seq, sensor_ns
+RECORD_OVERHEAD = 160   # bytes charged per record for the tuple and object headers
+MAX_FILES = 20          # oldest dumps are deleted beyond this
+MIN_DUMP_INTERVAL = 5.0 # seconds between automatic dumps
+
+
+class BlackBox:
+    """Bounded in-memory ring of recent records.
+
+    Args:
+        seconds: History kept.
+        max_bytes: Hard cap on the ring's size.
+        out_dir: Where dumps are written.
+    """
+
+    def __init__(self, seconds: float = 10.0, max_bytes: int = 32 << 20,
+                 out_dir: str = "blackbox"):
+        self._window_ns = int(seconds * 1e9)
+        self._max_bytes = max_bytes
+        self._out_dir = out_dir
+        self._records = collections.deque()  # (ts_ns, kind, extra, payload, size)
+        self._bytes = 0
+        # Reentrant: the SIGUSR2 handler dumps on the main thread, which may be in _append()
+        self._lock = threading.RLock()
+        self._dump_ids = itertools.count(1)  # tells apart dumps within one millisecond
+        self._last_auto_dump = 0.0
+        self._last_levels = None
+        self.evicted = 0
+
+    # --- Recording (any thread) ---
+
+    def record_frame(self, seq: int, sensor_ns: int, jpeg: bytes):
+        """StreamingOutput or camera-process RingOutput tap, added with copy=True.
+
+        A ring slot is reused within a second and frames are kept for
+        longer, so the tap needs the RingOutput's checked copy, not a view.
+        """
+        self._append(FRAME, FRAME_EXTRA.pack(seq, sensor_ns), jpeg)
+
+    def record_motor(self, levels: tuple):
+        """motors output sink; the watchdog's repeated stops are recorded once."""
+        if levels != self._last_levels:
+            self._last_levels = levels
+            self._append(MOTOR, b"", bytes(levels))
+
+    def record_control(self, kind: str, text):
+        """ControlServer tap; dumps on safe-mode entry."""
+        payload = text.encode() if isinstance(text, str) else bytes(text)
+        if kind == "command":
+            self._append(COMMAND, b"", payload)
+            return
+        self._append(EVENT, b"", payload)
+        if b'"safe_mode"' in payload:
+            self.dump("safe_mode", automatic=True)
+
+    def _append(self, kind: int, extra: bytes, payload: bytes):
+        ts = now_ns()
+        size = len(payload) + len(extra) + RECORD_OVERHEAD
+        with self._lock:
+            records = self._records
+            records.append((ts, kind, extra, payload, size))
+            self._bytes += size
+            cutoff = ts - self._window_ns
+            while records and (self._bytes > self._max_bytes or records[0][0] < cutoff):
+                self._bytes -= records.popleft()[4]
+                self.evicted += 1
+
+    # --- Dumping ---
+
+    def dump(self, reason: str = "request", automatic: bool = False,
+             wait: bool = False) -> str | None:
+        """Write the current ring to a file in the background.
+
+        Returns:
+            The file path, or None when an automatic dump was rate-limited.
+        """
+        now = time.monotonic()
+        if automatic:
+            if now - self._last_auto_dump < MIN_DUMP_INTERVAL:
+                return None
+            self._last_auto_dump = now
+        with self._lock:
+            records = list(self._records)
+        wall = time.time()
+        ms = int(wall * 1000) % 1000
+        stamp = f"{time.strftime('%Y%m%d-%H%M%S', time.localtime(wall))}.{ms:03d}"
+        name = f"blackbox-{stamp}-{next(self._dump_ids)}-{reason}.rbb"
+        path = os.path.join(self._out_dir, name)
+        writer = threading.Thread(target=self._write, args=(path, records, reason),
+                                  name="blackbox-writer", daemon=True)
+        writer.start()
+        if wait:
+            writer.join(timeout=10.0)
+        return path
+
+    def status(self) -> dict:
+        with self._lock:
+            count, size = len(self._records), self._bytes
+            span = (self._records[-1][0] - self._records[0][0]) / 1e9 if count else 0.0
+        return {"records": count, "bytes": size, "max_bytes": self._max_bytes,
+                "seconds": round(span, 2), "evicted": self.evicted}
+
+    def install_crash_hooks(self):
+        """Dump before the default handler runs on any uncaught exception."""
+        previous_sys, previous_thread = sys.excepthook, threading.excepthook
+
+        def sys_hook(exc_type, exc, tb):
+            self.dump("crash", wait=True)
+            previous_sys(exc_type, exc, tb)
+
+        def thread_hook(args):
+            self.dump("crash", wait=True)
+            previous_thread(args)
+
+        sys.excepthook = sys_hook
+        threading.excepthook = thread_hook
+
+    def _write(self, path: str, records: list, reason: str):
+        meta = json.dumps({
+            "reason": reason,
+            "created": time.time(),
+            "clock_ns": now_ns(),
+            "kinds": KINDS,
+        }).encode()
+        try:
+            os.makedirs(self._out_dir, exist_ok=True)
+            index = []
+            with open(path, "wb") as f:
+                f.write(MAGIC + bytes([VERSION]) + struct.pack("<I", len(meta)) + meta)
+                for ts, kind, extra, payload, _ in records:
+                    index.append(INDEX.pack(f.tell(), ts, kind))
+                    f.write(RECORD.pack(ts, kind, len(extra), len(payload)))
+                    f.write(extra)
+                    f.write(payload)
+                index_offset = f.tell()
+                f.write(b"".join(index))
+                f.write(TRAILER.pack(index_offset, len(records), INDEX_MAGIC))
+            _log(f"wrote {len(records)} records ({os.path.getsize(path) >> 10} KiB) to {path}")
+            self._prune()
+        except OSError as e:
+            _log(f"could not write {path}: {e}")
+
+    def _prune(self):
+        dumps = sorted(n for n in os.listdir(self._out_dir) if n.endswith(".rbb"))
+        for name in dumps[:-MAX_FILES]:
+            try:
+                os.remove(os.path.join(self._out_dir, name))
+            except OSError:
+                pass
+
+
+# --- Reader ---
+
+class Reader:
+    """Random access to a dump through its index."""
+
+    def __init__(self, path: str):
+        self._f = open(path, "rb")
+        head = self._f.read(9)
+        if head[:4] != MAGIC:
+            raise ValueError(f"{path}: not a black-box file")
+        (meta_len,) = struct.unpack("<I", head[5:9])
+        self.meta = json.loads(self._f.read(meta_len))
+        self._f.seek(-TRAILER.size, os.SEEK_END)
+        index_offset, count, magic = TRAILER.unpack(self._f.read(TRAILER.size))
+        if magic != INDEX_MAGIC:
+            raise ValueError(f"{path}: truncated (no index)")
+        self._f.seek(index_offset)
+        raw = self._f.read(count * INDEX.size)
+        self.index = [INDEX.unpack_from(raw, i * INDEX.size) for i in range(count)]
+
+    def read(self, i: int) -> tuple[int, str, bytes, bytes]:
+        """Record i as (ts_ns, kind name, extra, payload)."""
+        offset = self.index[i][0]
+        self._f.seek(offset)
+        ts, kind, extra_len, length = RECORD.unpack(self._f.read(RECORD.size))
+        extra = self._f.read(extra_len)
+        return ts, KINDS[kind], extra, self._f.read(length)
+
+    def close(self):
+        self._f.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect a black-box dump")
+    parser.add_argument("path")
+    parser.add_argument("--list", action="store_true", help="Print non-frame records")
+    parser.add_argument("--frames", metavar="DIR", help="Extract frames as JPEG files")
+    args = parser.parse_args()
+
+    reader = Reader(args.path)
+    index = reader.index
+    if not index:
+        print("empty dump")
+        return
+    t0 = index[0][1]
+    counts = collections.Counter(KINDS[kind] for _, _, kind in index)
+    print(f"reason: {reader.meta.get('reason')}, "
+          f"created {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(reader.meta['created']))}")
+    print(f"span: {(index[-1][1] - t0) / 1e9:.2f} s, "
+          + ", ".join(f"{counts[k]} {k}" for k in KINDS))
+
+    for i, (_, ts, kind) in enumerate(index):
+        rel = (ts - t0) / 1e9
+        if kind == FRAME and args.frames:
+            _, _, extra, jpeg = reader.read(i)
+            seq, _ = FRAME_EXTRA.unpack(extra)
+            os.makedirs(args.frames, exist_ok=True)
+            with open(os.path.join(args.frames, f"{rel:08.3f}-{seq}.jpg"), "wb") as f:
+                f.write(jpeg)
+        elif kind != FRAME and args.list:
+            _, name, _, payload = reader.read(i)
+            text = " ".join(str(b) for b in payload) if kind == MOTOR else payload.decode(
+                errors="replace")
+            print(f"{rel:9.3f} {name:<8} {text}")
+    reader.close()
+
+
+def _log(msg: str):
+    print(f"[blackbox] {msg}")
+
+
+if __name__ == "__main__":
+    main()
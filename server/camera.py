@@ -1,153 +1,796 @@
 """MJPEG camera streaming server.
 
-Streams JPEG frames from Pi Camera Module 3 (IMX708) over HTTP.
-Falls back to a placeholder on systems without a camera.
+Streams JPEG frames from one or more named camera sources over HTTP,
+selected with /video_feed?source=NAME (default: the first, primary
+source). Each source tries its backends in order and falls back to a
+synthetic test pattern, so a failed camera still has a stream:
+
+  picamera2[:N]      Pi camera N through libcamera (IMX708 on the front)
+  v4l2[:/dev/videoN] USB webcam, memory-mapped capture (server.v4l2)
+  synthetic          labelled test pattern
+
+Every source has two streams: `main` (640x480) and `lores` (160x120),
+selected with &stream=main|lores. On a Pi camera the ISP produces both
+from each capture, each with its own JPEG encoder; a V4L2 source serves
+the webcam's MJPEG as main and derives lores with a reduced-size JPEG
+decode on its capture thread. Each source's capture and encoding CPU
+time is metered and reported with its bitrate in /health and
+robothector_camera_cpu_seconds_total.
+
+HTTP is served by server.httpd on an asyncio loop — either a dedicated
+loop thread or the control loop itself — so each viewer is a coroutine,
+not an OS thread. Frames are handed to the transport as-is with
+writelines (part header, JPEG, trailer), never concatenated or copied.
+
+Each part carries timing headers, built once per frame and shared by
+all viewers (times in ns on the server.clock reference):
+  X-Frame-Seq         per-stream sequence number (gaps = skipped frames)
+  X-Sensor-Timestamp  SensorTimestamp from the picamera2 request
+  X-Encode-Time       when the encoder handed us the JPEG
+
+set_roi(zoom, x, y, source) zooms into one source's field of view
+around a normalized center. On a Pi camera it sets ScalerCrop, so the
+ISP crops the sensor image before scaling and both streams show more
+detail for the same encoder cost; one crop applies to main and lores
+alike. The test pattern is cropped by array slicing instead; V4L2
+sources keep the full view.
+
+Usage:
+    camera = CameraServer([("front", ("picamera2:0", "v4l2:/dev/video0")),
+                           ("rear", ("picamera2:1",))])
+    camera.start(port=5000)
 """
 
+import asyncio
+import collections
 import io
+import math
 import threading
 import time
 
 try:
     from picamera2 import Picamera2
     from picamera2.encoders import JpegEncoder
-    from picamera2.outputs import FileOutput
+    from picamera2.outputs import Output
     _has_camera = True
 except ImportError:
     _has_camera = False
 
-from flask import Flask, Response, jsonify
+from common import netqos, tracing
+from server import metrics
+from server.clock import now_ns
+from server.httpd import HttpServer, Response, json_response, response_head
+
+STATS_WINDOW = 2.0  # seconds of history behind the fps/bitrate/CPU figures
+BACKENDS = ("picamera2", "v4l2", "synthetic")
+DEFAULT_CAMERAS = (("front", ("picamera2:0",)),)
+MAX_ZOOM = 5.0      # IMX708 4:3 crop is 3456 px wide: ~5x before main is upscaled
+PLACEHOLDER_SENSOR = (1280, 960)  # test pattern the placeholder ROI is cut from
+VIEWER_BUFFER = 256 * 1024  # bytes queued per viewer before frames are skipped
+BOUNDARY = b"--frame\r\n"
+
+_FRAMES_ENCODED = metrics.counter("robothector_video_frames_encoded_total",
+                                  "JPEG frames produced by the encoder", ("source", "stream"))
+_FRAMES_SENT = metrics.counter("robothector_video_frames_sent_total",
+                               "Frames written to a viewer", ("source", "stream", "viewer"))
+_BYTES_SENT = metrics.counter("robothector_video_bytes_sent_total",
+                              "MJPEG bytes written to a viewer", ("source", "stream", "viewer"))
+_VIEWERS = metrics.gauge("robothector_video_viewers", "Connected MJPEG viewers",
+                         ("source", "stream"))
+_CPU = metrics.counter("robothector_camera_cpu_seconds_total",
+                       "Thread CPU time spent capturing and encoding", ("source",))
 
 
 class StreamingOutput(io.BufferedIOBase):
-    """Thread-safe buffer for the latest JPEG frame."""
+    """Thread-safe buffer for the latest JPEG frame.
+
+    Blocking consumers wait on `condition`; coroutines use wait_frame(),
+    which costs one call_soon_threadsafe per event loop per frame no
+    matter how many viewers are waiting on that loop.
+    """
 
-    def __init__(self):
+    def __init__(self, name: str = "main", source: str = "front"):
+        self.name = name
+        self.source = source
         self.frame = None
+        self.part_header = b""
+        self.seq = 0
+        self.trace_id = None
         self.condition = threading.Condition()
+        self._history = collections.deque()  # (time, nbytes) within STATS_WINDOW
+        self._async_waiters: dict = {}  # loop -> [Future]
+        self._taps: list = []
+        self.viewers = 0
+        self.bytes_sent = 0
+        self._encoded = _FRAMES_ENCODED.labels(source=source, stream=name)
+
+    def add_tap(self, tap, copy: bool = False):
+        """Call `tap(seq, sensor_ns, jpeg)` with every frame, on the encoder thread.
+
+        `copy` is for RingOutput compatibility: frames here are already
+        bytes that nothing overwrites.
+        """
+        self._taps.append(tap)
 
-    def write(self, buf):
+    def write(self, buf, sensor_ns: int | None = None):
+        now = time.monotonic()
+        encode_ns = now_ns()
+        if sensor_ns is None:
+            sensor_ns = encode_ns
+        self._encoded.inc()
+        trace_id = tracing.new_id()
+        if trace_id is not None:
+            tracing.record("capture", sensor_ns, encode_ns, trace_id,
+                           source=self.source, stream=self.name)
         with self.condition:
             self.frame = buf
+            self.seq += 1
+            seq = self.seq
+            self.trace_id = trace_id
+            self.part_header = (
+                b"%sContent-Type: image/jpeg\r\nContent-Length: %d\r\n"
+                b"X-Frame-Seq: %d\r\nX-Sensor-Timestamp: %d\r\nX-Encode-Time: %d\r\n%s\r\n"
+                % (BOUNDARY, len(buf), self.seq, sensor_ns, encode_ns,
+                   b"X-Trace-Id: %d\r\n" % trace_id if trace_id is not None else b"")
+            )
+            self._history.append((now, len(buf)))
+            while now - self._history[0][0] > STATS_WINDOW:
+                self._history.popleft()
             self.condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, {}
+        for loop, futures in waiters.items():
+            try:
+                loop.call_soon_threadsafe(_wake_all, futures)
+            except RuntimeError:
+                pass  # loop closed
+        for tap in self._taps:
+            tap(seq, sensor_ns, buf)
         return len(buf)
 
+    async def wait_frame(self, last_seq: int) -> tuple[int, bytes, bytes, int | None]:
+        """Wait for a frame newer than `last_seq`.
 
-class CameraServer:
-    def __init__(self):
-        self._cam = None
-        self._output = StreamingOutput()
-        self._thread = None
-        self._app = Flask(__name__)
-        self._resolution = (640, 480)
-        self._setup_routes()
+        Returns:
+            (seq, part_header, frame, trace_id)
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            with self.condition:
+                if self.seq != last_seq and self.frame is not None:
+                    return self.seq, self.part_header, self.frame, self.trace_id
+                future = loop.create_future()
+                self._async_waiters.setdefault(loop, []).append(future)
+            await future
 
-    def _setup_routes(self):
-        @self._app.route("/video_feed")
-        def video_feed():
-            return Response(
-                self._generate_frames(),
-                mimetype="multipart/x-mixed-replace; boundary=frame",
-            )
+    def stats(self) -> dict:
+        """Frame rate and bitrate over the last STATS_WINDOW seconds."""
+        with self.condition:
+            history = list(self._history)
+        if len(history) < 2:
+            return {"fps": 0.0, "kbps": 0.0, "viewers": self.viewers}
+        span = max(history[-1][0] - history[0][0], time.monotonic() - history[-1][0])
+        nbytes = sum(n for _, n in history[1:])
+        return {
+            "fps": round((len(history) - 1) / span, 1),
+            "kbps": round(nbytes * 8 / 1000 / span, 1),
+            "viewers": self.viewers,
+        }
 
-        @self._app.route("/health")
-        def health():
-            return jsonify({
-                "status": "ok",
-                "resolution": list(self._resolution),
-                "camera": _has_camera and self._cam is not None,
-            })
 
-    def _generate_frames(self):
-        """Yield MJPEG frames as multipart response."""
-        while True:
-            with self._output.condition:
-                self._output.condition.wait()
-                frame = self._output.frame
-            if frame is not None:
-                yield (
-                    b"--frame\r\n"
-                    b"Content-Type: image/jpeg\r\n\r\n"
-                    + frame
-                    + b"\r\n"
-                )
-
-    def _start_camera(self):
-        """Initialize and start the Pi camera."""
-        if not _has_camera:
-            _log("picamera2 not available, serving placeholder")
-            self._start_placeholder()
+class _CpuMeter:
+    """Thread CPU time one source spends on capture and encoding."""
+
+    def __init__(self, source: str):
+        self.total = 0.0
+        self._lock = threading.Lock()
+        self._history = collections.deque()  # (time, total) within STATS_WINDOW
+        self._series = _CPU.labels(source=source)
+
+    def add(self, seconds: float):
+        now = time.monotonic()
+        with self._lock:
+            self.total += seconds
+            self._history.append((now, self.total))
+            while now - self._history[0][0] > STATS_WINDOW:
+                self._history.popleft()
+        self._series.inc(seconds)
+
+    def percent(self) -> float:
+        """Share of one core over the last STATS_WINDOW seconds."""
+        with self._lock:
+            history = list(self._history)
+        if len(history) < 2:
+            return 0.0
+        span = max(history[-1][0] - history[0][0], time.monotonic() - history[-1][0])
+        return round((history[-1][1] - history[0][1]) / span * 100, 1)
+
+
+if _has_camera:
+    class _SensorTimedOutput(Output):
+        """picamera2 output that passes each frame's SensorTimestamp along.
+
+        Encoders report timestamps in µs relative to their first frame;
+        adding encoder.firsttimestamp recovers the absolute CLOCK_BOOTTIME
+        value from the request metadata.
+        """
+
+        def __init__(self, stream: StreamingOutput, encoder):
+            super().__init__()
+            self._stream = stream
+            self._encoder = encoder
+
+        def outputframe(self, frame, keyframe=True, timestamp=None, *args, **kwargs):
+            first = getattr(self._encoder, "firsttimestamp", None)
+            sensor_ns = None
+            if timestamp is not None and first is not None:
+                sensor_ns = (first + timestamp) * 1000
+            self._stream.write(frame, sensor_ns)
+
+    class _MeteredJpegEncoder(JpegEncoder):
+        """JpegEncoder charging the encode time of its worker threads to a source."""
+
+        def __init__(self, cpu: _CpuMeter):
+            super().__init__()
+            self._cpu = cpu
+
+        def encode_func(self, request, name):
+            t0 = time.thread_time()
+            try:
+                return super().encode_func(request, name)
+            finally:
+                self._cpu.add(time.thread_time() - t0)
+
+
+class CameraSource:
+    """One named camera: its main/lores outputs and the backend filling them.
+
+    Args:
+        name: Source name used in URLs, metrics and ROI messages.
+        backends: Backend specs ("picamera2:0", "v4l2:/dev/video1",
+            "synthetic") tried in order; synthetic is always appended as
+            the last resort.
+        resolution: Main stream size.
+        lores_size: Lores stream size.
+    """
+
+    def __init__(self, name: str, backends, resolution: tuple = (640, 480),
+                 lores_size: tuple = (160, 120)):
+        self.name = name
+        self.backends = list(backends)
+        if "synthetic" not in self.backends:
+            self.backends.append("synthetic")
+        self.resolution = resolution
+        self.lores_size = lores_size
+        self.streams = {
+            "main": StreamingOutput("main", name),
+            "lores": StreamingOutput("lores", name),
+        }
+        self.roi = (1.0, 0.5, 0.5)  # zoom, center x, center y
+        self.cpu = _CpuMeter(name)
+        self.kind = None
+        self._backend = None
+        self._lock = threading.Lock()
+
+    @property
+    def camera(self) -> bool:
+        """Whether a real camera (not the test pattern) is running."""
+        return self._backend is not None and self._backend.camera
+
+    def sizes(self) -> dict:
+        return {"main": self.resolution, "lores": self.lores_size}
+
+    def start(self):
+        self._start_from(0)
+
+    def stop(self):
+        with self._lock:
+            backend, self._backend = self._backend, None
+        if backend is not None:
+            backend.stop()
+
+    def set_roi(self, zoom: float, x: float, y: float):
+        self.roi = clamp_roi(zoom, x, y)
+        if self._backend is not None:
+            self._backend.apply_roi()
+
+    def lores_source(self):
+        """The backend's lores luma reader, or None (see CameraServer.lores_source)."""
+        return self._backend.lores_source() if self._backend is not None else None
+
+    def stats(self) -> dict:
+        streams = {name: {"size": list(self.sizes()[name]), **output.stats()}
+                   for name, output in self.streams.items()}
+        return {
+            "backend": self.kind,
+            "camera": self.camera,
+            "cpu_pct": self.cpu.percent(),
+            "kbps": round(sum(s["kbps"] for s in streams.values()), 1),
+            "sent_mb": round(sum(o.bytes_sent for o in self.streams.values()) / 1e6, 1),
+            "roi": _roi_dict(self.roi),
+            "streams": streams,
+        }
+
+    def _start_from(self, index: int):
+        for spec in self.backends[index:]:
+            kind, _, arg = spec.partition(":")
+            backend = _BACKENDS[kind](self, arg)
+            try:
+                backend.start()
+            except Exception as e:
+                _log(f"{self.name}: {spec} unavailable ({e})")
+                continue
+            with self._lock:
+                self._backend, self.kind = backend, spec
+            _log(f"{self.name}: {spec} started")
             return
 
+    def _failed(self, backend, error: Exception):
+        """Called by a backend whose capture died: move on to the next backend."""
+        with self._lock:
+            if self._backend is not backend:
+                return
+            self._backend = None
+        _log(f"{self.name}: {self.kind} failed ({error}), falling back")
+        backend.stop()
+        self._start_from(self.backends.index(self.kind) + 1)
+
+
+class _PicameraBackend:
+    """Pi camera through picamera2: ISP main + lores, one JPEG encoder each."""
+
+    camera = True
+
+    def __init__(self, source: CameraSource, arg: str):
+        self._source = source
+        self._index = int(arg or 0)
+        self._cam = None
+
+    def start(self):
+        if not _has_camera:
+            raise RuntimeError("picamera2 not installed")
+        source = self._source
+        self._cam = Picamera2(self._index)
         try:
-            self._cam = Picamera2()
             config = self._cam.create_video_configuration(
-                main={"size": self._resolution}
+                main={"size": source.resolution},
+                lores={"size": source.lores_size, "format": "YUV420"},
             )
             self._cam.configure(config)
-            encoder = JpegEncoder()
-            self._cam.start_recording(encoder, FileOutput(self._output))
-            _log(f"camera started at {self._resolution[0]}x{self._resolution[1]}")
+            # One encoder per stream; both are fed from the same capture
+            for name, output in source.streams.items():
+                encoder = _MeteredJpegEncoder(source.cpu)
+                self._cam.start_encoder(encoder, _SensorTimedOutput(output, encoder), name=name)
+            self._cam.start()
+        except Exception:
+            self.stop()
+            raise
+        if source.roi[0] > 1.0:
+            self.apply_roi()
+
+    def stop(self):
+        if self._cam is None:
+            return
+        try:
+            self._cam.stop_recording()
+            self._cam.close()
         except Exception as e:
-            _log(f"camera failed to start: {e}, using placeholder")
-            self._cam = None
-            self._start_placeholder()
-
-    def _start_placeholder(self):
-        """Write a placeholder frame periodically when no camera is available."""
-        # Generate a placeholder JPEG using pygame (already a dependency)
-        import pygame
-        pygame.init()
-        surface = pygame.Surface(self._resolution)
-        surface.fill((30, 30, 30))
-        font = pygame.font.SysFont(None, 36)
-        text = font.render("NO CAMERA", True, (180, 180, 180))
-        rect = text.get_rect(center=(self._resolution[0] // 2, self._resolution[1] // 2))
-        surface.blit(text, rect)
-        frame = pygame.image.tobytes(surface, "RGB")
-
-        # Convert raw RGB to JPEG via PIL if available, otherwise use raw
+            _log(f"{self._source.name}: camera stop error: {e}")
+        self._cam = None
+
+    def apply_roi(self):
         try:
-            from PIL import Image
-            img = Image.frombytes("RGB", self._resolution, frame)
+            self._cam.set_controls({"ScalerCrop": self._scaler_crop()})
+        except Exception as e:
+            _log(f"{self._source.name}: ScalerCrop failed: {e}")
+
+    def _scaler_crop(self) -> tuple[int, int, int, int]:
+        """The ROI as a ScalerCrop rectangle in sensor pixels, at the output aspect."""
+        props = self._cam.camera_properties
+        x0, y0, w0, h0 = props.get("ScalerCropMaximum") or (0, 0, *props["PixelArraySize"])
+        x0, y0, w, h = _fit_aspect(x0, y0, w0, h0, self._source.resolution)
+        zoom, cx, cy = self._source.roi
+        cw, ch = w / zoom, h / zoom
+        return (int(x0 + cx * w - cw / 2), int(y0 + cy * h - ch / 2), int(cw), int(ch))
+
+    def lores_source(self):
+        cam = self._cam
+        w, h = self._source.lores_size
+
+        def read():
+            # YUV420 array is (h * 3 / 2, w); the first h rows are the Y plane
+            return cam.capture_array("lores")[:h, :w]
+
+        return read
+
+
+class _V4l2Backend:
+    """USB webcam through server.v4l2, on its own capture/encode thread.
+
+    MJPEG frames are served as they come from the camera; YUYV frames
+    are JPEG-encoded here. Lores is a reduced-size decode (PIL draft
+    mode, i.e. DCT scaling) of main. ROI is not applied.
+    """
+
+    camera = True
+
+    def __init__(self, source: CameraSource, arg: str):
+        self._source = source
+        self._device = arg or "/dev/video0"
+        self._capture = None
+        self._running = False
+
+    def start(self):
+        from PIL import Image  # noqa: F401 (needed for lores and YUYV; fail over early)
+
+        from server.v4l2 import V4l2Capture
+
+        self._capture = V4l2Capture(self._device, self._source.resolution)
+        fmt = self._capture.open()
+        self._running = True
+        threading.Thread(target=self._run, name=f"camera-{self._source.name}",
+                         daemon=True).start()
+        _log(f"{self._source.name}: {self._capture.card} on {self._device}, {fmt} "
+             f"{self._capture.size[0]}x{self._capture.size[1]}")
+
+    def stop(self):
+        self._running = False
+
+    def apply_roi(self):
+        pass
+
+    def lores_source(self):
+        return None
+
+    def _run(self):
+        source = self._source
+        main, lores = source.streams["main"], source.streams["lores"]
+        capture = self._capture
+        try:
+            while self._running:
+                with capture.frame() as (view, sensor_ns):
+                    t0 = time.thread_time()
+                    if capture.format == "MJPG":
+                        jpeg = bytes(view)  # viewers keep it after the buffer is requeued
+                    else:
+                        jpeg = _encode_yuyv(view, capture.size)
+                try:
+                    small = _shrink_jpeg(jpeg, source.lores_size)
+                except OSError:
+                    small = None  # the camera's JPEG did not decode; main still goes out
+                source.cpu.add(time.thread_time() - t0)
+                main.write(jpeg, sensor_ns)
+                if small is not None:
+                    lores.write(small, sensor_ns)
+        except Exception as e:
+            if self._running:
+                source._failed(self, e)
+        finally:
+            capture.close()
+
+
+class _SyntheticBackend:
+    """Labelled test pattern, cut through the ROI and re-encoded only when it changes."""
+
+    camera = False
+
+    def __init__(self, source: CameraSource, arg: str):
+        self._source = source
+        self._stop = threading.Event()
+
+    def start(self):
+        from PIL import Image
+
+        source = self._source
+        sensor = _test_pattern(PLACEHOLDER_SENSOR, f"NO CAMERA ({source.name})")
+
+        def encode(size: tuple) -> bytes:
             buf = io.BytesIO()
-            img.save(buf, format="JPEG", quality=50)
-            jpeg_frame = buf.getvalue()
-        except ImportError:
-            # Fallback: serve raw bytes (won't display as JPEG, but /health still works)
-            _log("PIL not available, placeholder will not render")
-            return
+            Image.fromarray(_crop(sensor, source.roi, size)).save(buf, format="JPEG", quality=50)
+            return buf.getvalue()
 
         def _loop():
+            frames, roi = {}, None
+            while not self._stop.is_set():
+                if roi != source.roi:
+                    t0 = time.thread_time()
+                    roi = source.roi
+                    frames = {name: encode(size) for name, size in source.sizes().items()}
+                    source.cpu.add(time.thread_time() - t0)
+                for name, jpeg_frame in frames.items():
+                    source.streams[name].write(jpeg_frame)
+                self._stop.wait(0.5)
+
+        threading.Thread(target=_loop, name=f"camera-{source.name}", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def apply_roi(self):
+        pass  # picked up by the next frame
+
+    def lores_source(self):
+        return None
+
+
+_BACKENDS = {"picamera2": _PicameraBackend, "v4l2": _V4l2Backend, "synthetic": _SyntheticBackend}
+
+
+class CameraServer:
+    """Video HTTP server for one or more camera sources.
+
+    Args:
+        cameras: (name, backend specs) pairs, primary first; see
+            parse_camera_spec(). Defaults to DEFAULT_CAMERAS.
+    """
+
+    def __init__(self, cameras=None):
+        self._thread = None
+        self._http = HttpServer("video")
+        metrics.add_routes(self._http)
+        self._resolution = (640, 480)
+        self._lores_size = (160, 120)
+        self._sources = {name: CameraSource(name, backends, self._resolution, self._lores_size)
+                         for name, backends in cameras or DEFAULT_CAMERAS}
+        self._primary = next(iter(self._sources))
+        self._roi_source = self._primary  # source of the last set_roi()
+        self._setup_routes()
+
+    def sources(self) -> list:
+        """Source names, primary first."""
+        return list(self._sources)
+
+    def output(self, name: str, source: str | None = None) -> StreamingOutput:
+        """The StreamingOutput of stream `name` ("main" or "lores") of a source (default primary)."""
+        return self._sources[source or self._primary].streams[name]
+
+    def set_roi(self, zoom: float = 1.0, x: float = 0.5, y: float = 0.5,
+                source: str | None = None) -> dict:
+        """Zoom into a source's field of view; x, y is the crop center (0-1).
+
+        Values are clamped so the crop stays inside the image. Returns
+        the region actually applied.
+
+        Raises:
+            ValueError: Unknown source.
+        """
+        source = source or self._primary
+        if source not in self._sources:
+            raise ValueError(f"unknown camera source {source!r}")
+        self._sources[source].set_roi(zoom, x, y)
+        self._roi_source = source
+        return self.roi()
+
+    def roi(self) -> dict:
+        """ROI of the source last zoomed (initially the primary), with its name."""
+        return {**_roi_dict(self._sources[self._roi_source].roi), "source": self._roi_source}
+
+    def _source(self, request) -> CameraSource | None:
+        return self._sources.get(request.arg("source", self._primary))
+
+    def _stream(self, request):
+        source = self._source(request)
+        return source.streams.get(request.arg("stream", "main")) if source else None
+
+    def _setup_routes(self):
+        @self._http.route("/video_feed")
+        async def video_feed(request):
+            output = self._stream(request)
+            if output is None:
+                return Response(b"unknown source or stream\n", status=404)
+            await self._stream_frames(request.writer, output)
+
+        @self._http.route("/snapshot.jpg")
+        async def snapshot(request):
+            output = self._stream(request)
+            if output is None:
+                return Response(b"unknown source or stream\n", status=404)
+            frame = output.frame
+            if frame is None:
+                return Response(b"no frame yet\n", status=503)
+            return Response(frame, "image/jpeg", headers={"X-Frame-Seq": output.seq})
+
+        @self._http.route("/health")
+        async def health(request):
+            sources = {name: source.stats() for name, source in self._sources.items()}
+            primary = sources[self._primary]
+            return json_response({
+                "status": "ok",
+                "resolution": list(self._resolution),
+                "camera": primary["camera"],
+                "roi": primary["roi"],
+                "streams": primary["streams"],
+                "sources": sources,
+            })
+
+    async def _stream_frames(self, writer: asyncio.StreamWriter, output: StreamingOutput):
+        """Write the multipart MJPEG response, newest frame first.
+
+        drain() blocks while this viewer's socket buffer is above
+        VIEWER_BUFFER; frames produced meanwhile are skipped, not queued.
+        The "video" QoS class (common/netqos.py) keeps the kernel's unsent
+        backlog small too, so that buffer is where the backlog shows up.
+        """
+        writer.transport.set_write_buffer_limits(high=VIEWER_BUFFER)
+        writer.write(response_head(200, "multipart/x-mixed-replace; boundary=frame"))
+        peer = writer.get_extra_info("peername") or ("?", 0)
+        netqos.apply(writer.get_extra_info("socket"), "video", f"{peer[0]}:{peer[1]}")
+        labels = {"source": output.source, "stream": output.name, "viewer": f"{peer[0]}:{peer[1]}"}
+        frames_sent = _FRAMES_SENT.labels(**labels)
+        bytes_sent = _BYTES_SENT.labels(**labels)
+        viewers = _VIEWERS.labels(source=output.source, stream=output.name)
+        viewers.inc()
+        output.viewers += 1
+        try:
+            seq = output.seq
             while True:
-                self._output.write(jpeg_frame)
-                time.sleep(0.5)
-
-        t = threading.Thread(target=_loop, daemon=True)
-        t.start()
-
-    def start(self, port: int = 5000):
-        """Start camera and HTTP server in a daemon thread."""
-        self._start_camera()
-        self._thread = threading.Thread(
-            target=self._app.run,
-            kwargs={"host": "0.0.0.0", "port": port, "threaded": True},
-            daemon=True,
-        )
-        self._thread.start()
+                seq, header, frame, trace_id = await output.wait_frame(seq)
+                with tracing.span("send", trace_id, viewer=labels["viewer"]):
+                    writer.writelines((header, frame, b"\r\n"))
+                    n = len(header) + len(frame) + 2
+                    frames_sent.inc()
+                    bytes_sent.inc(n)
+                    output.bytes_sent += n
+                    await writer.drain()
+        finally:
+            viewers.dec()
+            output.viewers -= 1
+            _FRAMES_SENT.remove(**labels)
+            _BYTES_SENT.remove(**labels)
+
+    def lores_source(self):
+        """Callable returning the primary's next lores luma frame, or None without a camera.
+
+        The ISP produces the lores stream alongside main, so analysis
+        stages get small frames without any software resize; only Pi
+        camera sources provide it.
+        """
+        return self._sources[self._primary].lores_source()
+
+    def start(self, port: int = 5000, dedicated_loop: bool = True):
+        """Start every source, and the HTTP server on its own loop thread.
+
+        With dedicated_loop=False only the sources start; the caller must
+        await serve(port) on its own event loop (e.g. the control loop).
+        """
+        for source in self._sources.values():
+            source.start()
+        if dedicated_loop:
+            self._thread = threading.Thread(
+                target=asyncio.run, args=(self.serve(port),), name="video-http", daemon=True
+            )
+            self._thread.start()
+
+    async def serve(self, port: int = 5000):
+        """Serve the video endpoints on the running event loop."""
         _log(f"HTTP server started on port {port}")
+        lag_probe = asyncio.create_task(metrics.watch_loop_lag("video"))
+        try:
+            await self._http.serve("0.0.0.0", port)
+        finally:
+            lag_probe.cancel()
 
     def stop(self):
-        """Stop camera recording."""
-        if self._cam is not None:
-            try:
-                self._cam.stop_recording()
-                self._cam.close()
-            except Exception as e:
-                _log(f"camera stop error: {e}")
-            self._cam = None
+        """Stop every source (all encoders)."""
+        for source in self._sources.values():
+            source.stop()
         _log("camera stopped")
 
 
+def parse_camera_spec(text: str) -> tuple[str, tuple[str, ...]]:
+    """Parse --camera NAME=BACKEND[:ARG][,BACKEND[:ARG]...].
+
+    Raises:
+        ValueError: Malformed spec or unknown backend.
+    """
+    name, sep, backends = text.partition("=")
+    if not sep or not name or not backends:
+        raise ValueError(f"expected NAME=BACKEND[,BACKEND...], got {text!r}")
+    specs = tuple(b.strip() for b in backends.split(","))
+    for spec in specs:
+        if spec.partition(":")[0] not in BACKENDS:
+            raise ValueError(f"unknown camera backend {spec!r} (choose from {', '.join(BACKENDS)})")
+    return name.strip(), specs
+
+
+def clamp_roi(zoom: float, x: float, y: float) -> tuple[float, float, float]:
+    """(zoom, x, y) limited to 1..MAX_ZOOM with the crop inside the image.
+
+    Raises:
+        ValueError: A value is not a finite number (min/max would pin NaN to a limit).
+    """
+    zoom, x, y = float(zoom), float(x), float(y)
+    if not all(map(math.isfinite, (zoom, x, y))):
+        raise ValueError("roi: zoom, x and y must be finite")
+    zoom = max(1.0, min(MAX_ZOOM, zoom))
+    half = 0.5 / zoom
+    return zoom, max(half, min(1.0 - half, x)), max(half, min(1.0 - half, y))
+
+
+def _roi_dict(roi: tuple) -> dict:
+    zoom, x, y = roi
+    return {"zoom": round(zoom, 3), "x": round(x, 4), "y": round(y, 4)}
+
+
+def _encode_yuyv(view, size: tuple) -> bytes:
+    """JPEG from a packed YUYV (4:2:2) frame."""
+    import numpy as np
+    from PIL import Image
+
+    w, h = size
+    packed = np.frombuffer(view, dtype=np.uint8, count=w * h * 2).reshape(h, w * 2)
+    ycbcr = np.empty((h, w, 3), dtype=np.uint8)
+    ycbcr[..., 0] = packed[:, 0::2]
+    ycbcr[..., 1] = np.repeat(packed[:, 1::4], 2, axis=1)
+    ycbcr[..., 2] = np.repeat(packed[:, 3::4], 2, axis=1)
+    buf = io.BytesIO()
+    Image.fromarray(ycbcr, "YCbCr").save(buf, format="JPEG", quality=80)
+    return buf.getvalue()
+
+
+def _shrink_jpeg(jpeg: bytes, size: tuple) -> bytes:
+    """Re-encode a JPEG at `size`, decoding at reduced scale (1/2-1/8) first."""
+    from PIL import Image
+
+    image = Image.open(io.BytesIO(jpeg))
+    image.draft("RGB", size)
+    if image.size != size:
+        image = image.resize(size)
+    buf = io.BytesIO()
+    image.save(buf, format="JPEG", quality=70)
+    return buf.getvalue()
+
+
+def _fit_aspect(x0: int, y0: int, w: int, h: int, size: tuple) -> tuple:
+    """Largest centered rectangle inside (x0, y0, w, h) with the aspect of `size`."""
+    aspect = size[0] / size[1]
+    if w / h > aspect:
+        fw, fh = h * aspect, h
+    else:
+        fw, fh = w, w / aspect
+    return x0 + (w - fw) / 2, y0 + (h - fh) / 2, fw, fh
+
+
+def _crop(image, roi: tuple, size: tuple):
+    """Slice the ROI out of an (h, w, 3) array and resize it to `size` (nearest)."""
+    import numpy as np
+
+    h, w = image.shape[:2]
+    x0, y0, fw, fh = _fit_aspect(0, 0, w, h, size)
+    zoom, cx, cy = roi
+    cw, ch = fw / zoom, fh / zoom
+    left, top = int(x0 + cx * fw - cw / 2), int(y0 + cy * fh - ch / 2)
+    region = image[top:top + int(ch), left:left + int(cw)]
+    rows = np.arange(size[1]) * region.shape[0] // size[1]
+    cols = np.arange(size[0]) * region.shape[1] // size[0]
+    return np.ascontiguousarray(region[rows[:, None], cols])
+
+
+def _test_pattern(size: tuple, text: str = "NO CAMERA"):
+    """Labelled grid with `text` in the middle, as an (h, w, 3) array."""
+    import pygame
+
+    pygame.init()
+    w, h = size
+    surface = pygame.Surface(size)
+    surface.fill((30, 30, 30))
+    font = pygame.font.SysFont(None, 28)
+    cell = 80
+    for i, x in enumerate(range(0, w, cell)):
+        pygame.draw.line(surface, (70, 70, 70), (x, 0), (x, h))
+        for j, y in enumerate(range(0, h, cell)):
+            pygame.draw.line(surface, (70, 70, 70), (0, y), (w, y))
+            label = font.render(f"{chr(65 + j % 26)}{i + 1}", True, (110, 110, 110))
+            surface.blit(label, (x + 6, y + 6))
+    label = pygame.font.SysFont(None, 96).render(text, True, (180, 180, 180))
+    surface.blit(label, label.get_rect(center=(w // 2, h // 2)))
+    return pygame.surfarray.array3d(surface).transpose(1, 0, 2)
+
+
+def _wake_all(futures: list):
+    for future in futures:
+        if not future.done():
+            future.set_result(None)
+
+
 def _log(msg: str):
     print(f"[camera] {msg}")
@@ -0,0 +1,375 @@
+"""Camera and video HTTP in a supervised child process.
+
+In one process the encoder callbacks and every MJPEG viewer coroutine
+share the GIL with the control loop, so a burst of viewers shows up as
+jitter in motor commands (python -m server.video_bench). CameraProcess
+runs CameraServer — picamera2, both encoders and the video HTTP server —
+in a child process instead (`--video-loop process`, the default).
+
+Frames come back to this process through one FrameRing per stream in
+shared memory, for in-process consumers only (black box, collision
+monitor); viewers are served by the child. The child copies each frame
+into the ring once and writes a byte to a non-blocking pipe; a
+dispatcher thread here wakes on the pipe and hands taps a memoryview of
+the slot, which is only valid during the call. With luma=True the child
+also publishes the lores Y plane for the collision monitor, whose reads
+are NumPy views on the ring. set_roi() goes the other way through a
+small shared array that the child polls every ROI_POLL. Only the
+primary camera source has rings; other sources (cameras=) are served by
+the child's HTTP alone.
+
+The child is restarted (with backoff) when it exits or stops producing
+frames for STALL_TIMEOUT, and exits by itself when this process dies.
+Its /metrics and /trace cover the video side; the control process serves
+its own on --metrics-port.
+"""
+
+import multiprocessing
+import os
+import signal
+import sys
+import threading
+import time
+
+from common import gcmode, netqos, tracing
+from server import cpulayout, metrics
+from server.clock import now_ns
+from server.frame_ring import FrameRing
+
+STREAMS = {"main": 512 * 1024, "lores": 64 * 1024}  # stream -> slot size
+LUMA_SIZE = (160, 120)
+SLOTS = 16               # frames a reader's view survives (~0.5 s at 30 fps)
+STARTUP_TIMEOUT = 20.0   # seconds to the first frame before the child counts as hung
+STALL_TIMEOUT = 5.0      # seconds without a frame (placeholder frames come every 0.5 s)
+RESTART_DELAY = 1.0
+MAX_RESTART_DELAY = 30.0
+STABLE_TIME = 60.0       # uptime after which the restart backoff resets
+ROI_POLL = 0.05          # seconds between the child's ROI checks
+
+_TORN = metrics.counter("robothector_ring_torn_frames_total",
+                        "Frames overwritten while a copying tap read them", ("stream",))
+_RESTARTS = metrics.counter("robothector_camera_process_restarts_total",
+                            "Camera child process restarts")
+
+
+class RingOutput:
+    """Control-process side of one stream: taps fed from its FrameRing."""
+
+    def __init__(self, name: str, ring: FrameRing):
+        self.name = name
+        self.ring = ring
+        self._taps: list = []
+        self._copy_taps: list = []
+        self._last = ring.head
+        self._torn = _TORN.labels(stream=name)
+
+    def add_tap(self, tap, copy: bool = False):
+        """Call `tap(seq, sensor_ns, view)` for every frame, on the dispatcher thread.
+
+        The view is only valid during the call. With `copy`, the tap gets
+        bytes instead: copied once per frame and checked with ring.valid()
+        afterwards, so a frame the writer overwrote mid-copy (a dispatcher
+        that fell a ring behind) is dropped rather than kept torn.
+        """
+        (self._copy_taps if copy else self._taps).append(tap)
+
+    def _dispatch(self):
+        ring = self.ring
+        head = ring.head
+        first = max(self._last + 1, head - ring.slots + 2)
+        self._last = head
+        if not self._taps and not self._copy_taps:
+            return
+        for seq in range(first, head + 1):
+            frame = ring.get(seq)
+            if frame is None:
+                continue
+            sensor_ns, _, view = frame
+            try:
+                for tap in self._taps:
+                    tap(seq, sensor_ns, view)
+                if self._copy_taps:
+                    data = bytes(view)
+                    if not ring.valid(seq):
+                        self._torn.inc()
+                        continue
+                    for tap in self._copy_taps:
+                        tap(seq, sensor_ns, data)
+            finally:
+                view.release()
+
+
+class CameraProcess:
+    """Supervises the camera child and exposes its frames.
+
+    Args:
+        port: Video HTTP port served by the child.
+        luma: Also publish the lores Y plane (for lores_source()).
+        source: Picklable `source(camera_server)` that starts frames
+            instead of the camera (video_bench's synthetic feed).
+        cameras: CameraServer camera sources, primary first.
+    """
+
+    def __init__(self, port: int = 5000, luma: bool = False, source=None, cameras=None):
+        from server.camera import DEFAULT_CAMERAS
+
+        self._port = port
+        self._source = source
+        self._cameras = tuple(cameras or DEFAULT_CAMERAS)
+        self._names = [name for name, _ in self._cameras]
+        self._ctx = multiprocessing.get_context("spawn")
+        self._outputs = {name: RingOutput(name, FrameRing.create(SLOTS, size))
+                         for name, size in STREAMS.items()}
+        self._luma = FrameRing.create(SLOTS, LUMA_SIZE[0] * LUMA_SIZE[1]) if luma else None
+        self._luma_cond = threading.Condition()
+        self._roi = self._ctx.Array("d", (0.0, 1.0, 0.5, 0.5, 0.0))  # version, zoom, x, y, source
+        self._proc = None
+        self._notify_r, self._notify_w = self._ctx.Pipe(duplex=False)
+        self._stop = threading.Event()
+        self._started_at = 0.0
+        self.restarts = 0
+
+    def output(self, name: str) -> RingOutput:
+        """The RingOutput of stream `name` ("main" or "lores")."""
+        return self._outputs[name]
+
+    def start(self):
+        threading.Thread(target=self._supervise, name="camera-supervisor", daemon=True).start()
+        threading.Thread(target=self._dispatch_loop, name="camera-frames", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        proc = self._proc
+        if proc is not None and proc.is_alive():
+            proc.terminate()
+            proc.join(timeout=5.0)
+            if proc.is_alive():
+                proc.kill()
+        for output in self._outputs.values():
+            output.ring.close()
+        if self._luma is not None:
+            self._luma.close()
+        _log("camera process stopped")
+
+    def sources(self) -> list:
+        """Camera source names, primary first."""
+        return list(self._names)
+
+    def set_roi(self, zoom: float = 1.0, x: float = 0.5, y: float = 0.5,
+                source: str | None = None) -> dict:
+        """CameraServer.set_roi in the child; applied within ROI_POLL.
+
+        Raises:
+            ValueError: Unknown source.
+        """
+        from server.camera import clamp_roi
+
+        source = source or self._names[0]
+        if source not in self._names:
+            raise ValueError(f"unknown camera source {source!r}")
+        zoom, x, y = clamp_roi(zoom, x, y)
+        with self._roi.get_lock():
+            self._roi[:] = (self._roi[0] + 1, zoom, x, y, self._names.index(source))
+        return self.roi()
+
+    def roi(self) -> dict:
+        with self._roi.get_lock():
+            _, zoom, x, y, index = self._roi[:]
+        return {"zoom": round(zoom, 3), "x": round(x, 4), "y": round(y, 4),
+                "source": self._names[int(index)]}
+
+    def status(self) -> dict:
+        proc = self._proc
+        alive = proc is not None and proc.is_alive()
+        return {
+            "pid": proc.pid if alive else None,
+            "alive": alive,
+            "restarts": self.restarts,
+            "uptime": round(time.monotonic() - self._started_at, 1) if alive else 0.0,
+            "seq": self._outputs["main"].ring.head,
+        }
+
+    def lores_source(self):
+        """Callable returning the next lores luma frame (a view), or None.
+
+        Returns None itself when the luma ring was not requested or
+        there is no camera to fill it.
+        """
+        from server.camera import _has_camera
+
+        if self._luma is None or not _has_camera:
+            return None
+        import numpy as np
+
+        ring = self._luma
+        w, h = LUMA_SIZE
+        last = ring.head
+
+        def read():
+            nonlocal last
+            with self._luma_cond:
+                if ring.head == last:
+                    self._luma_cond.wait(timeout=1.0)
+            last = ring.head
+            frame = ring.get(last) if last else None
+            if frame is None:
+                return None
+            return np.frombuffer(frame[2], dtype=np.uint8).reshape(h, w)
+
+        return read
+
+    # --- Control process threads ---
+
+    def _dispatch_loop(self):
+        fd = self._notify_r.fileno()
+        while not self._stop.is_set():
+            try:
+                if not os.read(fd, 4096):
+                    return
+            except OSError:
+                return
+            for output in self._outputs.values():
+                try:
+                    output._dispatch()
+                except Exception as e:
+                    _log(f"{output.name} tap error: {e}")
+            if self._luma is not None:
+                with self._luma_cond:
+                    self._luma_cond.notify_all()
+
+    def _supervise(self):
+        delay = RESTART_DELAY
+        while not self._stop.is_set():
+            self._proc = self._ctx.Process(
+                target=_child_main, name="camera",
+                args=(self._port, {n: o.ring.name for n, o in self._outputs.items()},
+                      self._luma.name if self._luma else None, self._notify_w,
+                      self._roi, self._source, self._cameras, netqos.settings(),
+                      tracing.capacity(), cpulayout.settings(), gcmode.settings(),
+                      os.getpid()),
+                daemon=True,
+            )
+            self._proc.start()
+            self._started_at = time.monotonic()
+            _log(f"camera process started (pid {self._proc.pid})")
+            reason = self._watch(self._proc)
+            if self._stop.is_set():
+                return
+            _log(f"camera process {reason}; restarting in {delay:.0f}s")
+            self.restarts += 1
+            _RESTARTS.inc()
+            if time.monotonic() - self._started_at > STABLE_TIME:
+                delay = RESTART_DELAY
+            if self._stop.wait(delay):
+                return
+            delay = min(delay * 2, MAX_RESTART_DELAY)
+
+    def _watch(self, proc) -> str:
+        """Block until the child exits or stalls; returns why."""
+        ring = self._outputs["main"].ring
+        head, changed = ring.head, time.monotonic()
+        timeout = STARTUP_TIMEOUT
+        while not self._stop.is_set():
+            proc.join(timeout=1.0)
+            if not proc.is_alive():
+                return f"exited with code {proc.exitcode}"
+            now = time.monotonic()
+            if ring.head != head:
+                head, changed, timeout = ring.head, now, STALL_TIMEOUT
+            elif now - changed > timeout:
+                proc.kill()
+                proc.join(timeout=5.0)
+                return f"stalled (no frame for {now - changed:.0f}s)"
+        return "stopped"
+
+
+# --- Child process ---
+
+def _child_main(port: int, ring_names: dict, luma_name: str | None, notify,
+                roi, source, cameras: tuple, qos: dict, trace_buffer: int,
+                cpu_layout: dict, gc_mode: dict, parent_pid: int):
+    import asyncio
+
+    from server.camera import CameraServer
+
+    # First, so every thread started below inherits the video role's CPUs and nice
+    cpulayout.restore(cpu_layout)
+    cpulayout.start(role="video")
+    netqos.restore(qos)
+    tracing.configure("server-camera", now_ns, trace_buffer)
+    gcmode.restore(gc_mode)
+    metrics.watch_gc()
+    signal.signal(signal.SIGTERM, lambda sig, frame: sys.exit(0))
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # Ctrl-C goes to the parent, which stops us
+    threading.Thread(target=_watch_parent, args=(parent_pid,), name="parent-watch",
+                     daemon=True).start()
+
+    fd = notify.fileno()
+    os.set_blocking(fd, False)
+    rings = [FrameRing.attach(name) for name in ring_names.values()]
+    camera = CameraServer(cameras)
+    for name, ring in zip(ring_names, rings):
+        camera.output(name).add_tap(_publisher(ring, fd))
+    threading.Thread(target=_follow_roi, args=(roi, camera), name="roi", daemon=True).start()
+    try:
+        if source is None:
+            camera.start(port=port, dedicated_loop=False)
+            if luma_name:
+                read = camera.lores_source()
+                if read is not None:
+                    rings.append(FrameRing.attach(luma_name))
+                    threading.Thread(target=_publish_luma, args=(read, rings[-1], fd),
+                                     name="luma", daemon=True).start()
+        else:
+            source(camera)
+        gcmode.freeze()
+        asyncio.run(camera.serve(port))
+    finally:
+        camera.stop()
+        for ring in rings:
+            ring.close()
+
+
+def _publisher(ring: FrameRing, fd: int):
+    def publish(seq, sensor_ns, buf):
+        if ring.publish(buf, sensor_ns, now_ns()):
+            _notify(fd)
+    return publish
+
+
+def _publish_luma(read, ring: FrameRing, fd: int):
+    import numpy as np
+
+    while True:
+        frame = read()
+        if frame is not None and ring.publish(np.ascontiguousarray(frame), now_ns(), now_ns()):
+            _notify(fd)
+
+
+def _follow_roi(roi, camera):
+    version = 0.0
+    names = camera.sources()
+    while True:
+        with roi.get_lock():
+            current = roi[:]
+        if current[0] != version:
+            version = current[0]
+            camera.set_roi(*current[1:4], source=names[int(current[4])])
+        time.sleep(ROI_POLL)
+
+
+def _notify(fd: int):
+    try:
+        os.write(fd, b"\0")
+    except OSError:
+        pass  # pipe full: the dispatcher is behind and catches up from head
+
+
+def _watch_parent(parent_pid: int):
+    while os.getppid() == parent_pid:
+        time.sleep(1.0)
+    os.kill(os.getpid(), signal.SIGTERM)
+
+
+def _log(msg: str):
+    print(f"[camera] {msg}")
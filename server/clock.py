@@ -0,0 +1,18 @@
+"""Server reference clock for timestamps shared with clients.
+
+libcamera stamps frames (SensorTimestamp) with CLOCK_BOOTTIME, so every
+timestamp the server hands out — video part headers, pong replies — uses
+the same clock. Clients estimate their offset to it from ping/pong.
+"""
+
+import time
+
+try:
+    _CLOCK = time.CLOCK_BOOTTIME
+except AttributeError:  # not Linux
+    _CLOCK = time.CLOCK_MONOTONIC
+
+
+def now_ns() -> int:
+    """Current server time in nanoseconds."""
+    return time.clock_gettime_ns(_CLOCK)
@@ -0,0 +1,277 @@
+"""Looming-based collision risk detection on the low-resolution stream.
+
+Optional analysis stage (python -m server.main --collision monitor|enforce).
+Pulls small grayscale frames from the camera's lores stream (or a
+synthetic source off the Pi) and estimates how fast the scene ahead is
+expanding. An obstacle approaching at constant speed grows by a factor
+s per frame, giving time-to-contact ttc = dt / (s - 1). The scale is
+found by matching the previous frame, magnified by each candidate
+factor, against the current one; all of it is NumPy indexing on
+~80x60 pixels.
+
+Every frame has a fixed CPU budget. Analysis stops trying further
+scales once the budget is spent, and when frames keep overrunning the
+stage decimates harder (fewer pixels, fewer scales). Frames that arrive
+while a frame is being analyzed are skipped, never queued.
+
+In enforce mode the forward gate in server.motors closes while ttc is
+below TTC_GATE, and reopens HOLD_TIME after the cue clears. It is binary
+on purpose: the H-bridge is driven on/off, so a graded throttle cap
+would not change the pins until it dropped below the 0.1 switching
+threshold.
+
+A zoom change (camera ROI) magnifies the scene just like an approaching
+obstacle, so reset() discards the reference frame and the expansion
+estimate and ignores frames until the new crop has come through.
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from server import motors
+
+LORES_SIZE = (160, 120)
+ANALYSIS_FPS = 15
+BUDGET_MS = 4.0          # CPU time allowed per analyzed frame
+CENTER_FRACTION = 0.6    # central region of the image that is matched
+SCALES = (1.0, 1.01, 1.02, 1.04, 1.06, 1.09, 1.12, 1.16)
+MIN_TEXTURE = 4.0        # mean abs gradient below this -> no reliable cue
+SMOOTHING = 0.5          # EMA weight of the newest expansion rate
+TTC_GATE = 1.5           # seconds: forward throttle blocked below this; covers ~0.2 s of
+                         # camera + smoothing lag and the coast of a full-speed stop
+HOLD_TIME = 1.0          # seconds the gate stays closed after the cue clears
+ROI_SETTLE = 0.3         # seconds of frames ignored after a zoom change
+STRIDES = (2, 3, 4)      # decimation levels of the lores frame
+
+
+class CollisionMonitor:
+    """Runs looming analysis in a background thread.
+
+    Args:
+        read_frame: Callable returning the next grayscale uint8 frame
+            (blocking until one is available) or None.
+        enforce: Block forward throttle through motors.set_forward_gate.
+        budget_ms: CPU budget per analyzed frame.
+    """
+
+    def __init__(self, read_frame, enforce: bool = False, budget_ms: float = BUDGET_MS):
+        self._read_frame = read_frame
+        self._enforce = enforce
+        self._budget = budget_ms / 1000
+        self._level = 0
+        self._grids: dict = {}
+        self._prev = None
+        self._prev_time = 0.0
+        self._expansion = 0.0
+        self._blocked = False
+        self._hold_until = 0.0
+        self._settle_until = 0.0
+        self._running = False
+        self._thread = None
+        self._analyzed = 0
+        self._overruns = 0
+        self._skipped = 0
+        self._last_ms = 0.0
+        self._status = {}
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="collision", daemon=True)
+        self._thread.start()
+        mode = "enforcing" if self._enforce else "monitoring"
+        _log(f"{mode}, budget {self._budget * 1000:.1f} ms/frame")
+
+    def stop(self):
+        self._running = False
+        if self._thread is not None:
+            self._thread.join(timeout=2.0)
+        if self._enforce:
+            motors.set_forward_gate(True)
+
+    def reset(self, settle: float = ROI_SETTLE):
+        """Forget the scene: no expansion cue from frames in the next `settle` s."""
+        self._settle_until = time.monotonic() + settle
+
+    def status(self) -> dict:
+        """Latest analysis result and timing, for the state stream."""
+        return self._status
+
+    def _loop(self):
+        interval = 1.0 / ANALYSIS_FPS
+        next_time = time.monotonic()
+        while self._running:
+            try:
+                frame = self._read_frame()
+            except Exception as e:
+                _log(f"frame source error: {e}")
+                time.sleep(1.0)
+                continue
+            now = time.monotonic()
+            if frame is None:
+                time.sleep(interval)
+                continue
+            if now < next_time:
+                self._skipped += 1
+                continue
+            # Skip ahead instead of catching up when we fell behind
+            next_time = max(next_time + interval, now)
+            if now < self._settle_until:
+                self._prev = None
+                self._expansion = 0.0
+                continue
+            self._process(frame, now)
+
+    def _process(self, frame: np.ndarray, now: float):
+        t0 = time.thread_time()
+        deadline = t0 + self._budget
+        stride = STRIDES[self._level]
+        cur = frame[::stride, ::stride]
+
+        scale, texture = None, 0.0
+        if self._prev is not None and self._prev.shape == cur.shape:
+            scale, texture = self._match_scale(self._prev, cur, deadline)
+
+        if scale is not None and texture >= MIN_TEXTURE:
+            dt = now - self._prev_time
+            rate = (scale - 1.0) / dt if dt > 0 else 0.0
+            self._expansion += SMOOTHING * (rate - self._expansion)
+        else:
+            self._expansion *= 1.0 - SMOOTHING
+        self._prev = cur
+        self._prev_time = now
+
+        ttc = 1.0 / self._expansion if self._expansion > 1e-3 else None
+        self._update_gate(ttc, now)
+
+        elapsed = time.thread_time() - t0
+        self._analyzed += 1
+        self._last_ms = elapsed * 1000
+        self._adapt(elapsed)
+        self._status = {
+            "ttc": round(ttc, 2) if ttc is not None else None,
+            "expansion": round(self._expansion, 3),
+            "texture": round(texture, 1),
+            "blocked": self._blocked,
+            "enforce": self._enforce,
+            "ms": round(self._last_ms, 2),
+            "budget_ms": round(self._budget * 1000, 1),
+            "stride": stride,
+            "analyzed": self._analyzed,
+            "overruns": self._overruns,
+            "skipped": self._skipped,
+        }
+
+    def _match_scale(self, prev: np.ndarray, cur: np.ndarray, deadline: float):
+        """Best magnification of prev onto cur, trying scales until the deadline."""
+        grids = self._grid(cur.shape)
+        rows, cols = grids[1.0]
+        target = cur[rows[:, None], cols].astype(np.int16)
+        target -= int(target.mean())
+        texture = float(np.abs(np.diff(target, axis=1)).mean())
+
+        best_scale, best_sad = None, None
+        for scale in self._scales():
+            rows, cols = grids[scale]
+            warped = prev[rows[:, None], cols].astype(np.int16)
+            warped -= int(warped.mean())
+            sad = int(np.abs(target - warped).sum())
+            if best_sad is None or sad < best_sad:
+                best_scale, best_sad = scale, sad
+            if time.thread_time() > deadline:
+                break
+        return best_scale, texture
+
+    def _scales(self) -> tuple:
+        # Harder decimation also drops every other candidate scale
+        return SCALES if self._level == 0 else SCALES[::2] + SCALES[-1:]
+
+    def _grid(self, shape: tuple) -> dict:
+        """Nearest-neighbour sample positions of the center region per scale."""
+        if shape not in self._grids:
+            h, w = shape
+            ch, cw = int(h * CENTER_FRACTION), int(w * CENTER_FRACTION)
+            cy, cx = (h - 1) / 2, (w - 1) / 2
+            ys = np.arange(ch) + (h - ch) // 2
+            xs = np.arange(cw) + (w - cw) // 2
+            self._grids[shape] = {
+                s: (np.rint(cy + (ys - cy) / s).astype(np.intp),
+                    np.rint(cx + (xs - cx) / s).astype(np.intp))
+                for s in SCALES
+            }
+        return self._grids[shape]
+
+    def _adapt(self, elapsed: float):
+        """Degrade on budget overrun, recover when well under budget."""
+        if elapsed > self._budget:
+            self._overruns += 1
+            if self._level < len(STRIDES) - 1:
+                self._level += 1
+                self._prev = None
+                _log(f"over budget ({elapsed * 1000:.1f} ms), stride -> {STRIDES[self._level]}")
+        elif elapsed < self._budget * 0.3 and self._level > 0 and self._analyzed % 30 == 0:
+            self._level -= 1
+            self._prev = None
+
+    def _update_gate(self, ttc: float | None, now: float):
+        if ttc is not None and ttc < TTC_GATE:
+            self._hold_until = now + HOLD_TIME
+            if not self._blocked:
+                self._set_blocked(True, ttc)
+        elif self._blocked and now >= self._hold_until:
+            self._set_blocked(False, ttc)
+
+    def _set_blocked(self, blocked: bool, ttc: float | None):
+        if blocked:
+            _log(f"obstacle approaching (ttc {ttc:.2f} s), forward throttle blocked")
+        else:
+            _log("path clear, forward throttle allowed")
+        self._blocked = blocked
+        if self._enforce:
+            motors.set_forward_gate(not blocked)
+
+
+class SyntheticSource:
+    """Textured wall the camera periodically drives toward.
+
+    Stands in for the lores stream off the Pi so the whole path, including
+    the forward gate, can be exercised on a laptop. The wall sits at 5
+    units, closes to 0.5 units over APPROACH seconds, then resets.
+    """
+
+    PERIOD = 6.0       # seconds per approach cycle
+    APPROACH = 3.0     # seconds of each cycle the wall is closing in
+    TEXTURE = 512
+
+    def __init__(self, size: tuple = LORES_SIZE, fps: float = 30.0):
+        w, h = size
+        rng = np.random.default_rng(0)
+        # Blocky random texture so there is detail at every magnification
+        coarse = rng.integers(0, 256, size=(self.TEXTURE // 8, self.TEXTURE // 8), dtype=np.uint8)
+        self._texture = np.kron(coarse, np.ones((8, 8), dtype=np.uint8))
+        self._ys = np.arange(h) - (h - 1) / 2
+        self._xs = np.arange(w) - (w - 1) / 2
+        self._interval = 1.0 / fps
+        self._next = time.monotonic()
+        self._start = self._next
+
+    def read(self) -> np.ndarray:
+        delay = self._next - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        self._next += self._interval
+        phase = (time.monotonic() - self._start) % self.PERIOD
+        distance = 5.0 - 4.5 * min(phase, self.APPROACH) / self.APPROACH
+        if phase >= self.APPROACH:
+            distance = 5.0
+        # Image size of the wall grows as 1/distance
+        step = distance / 2.5
+        c = self.TEXTURE // 2
+        rows = (c + self._ys * step).astype(np.intp)
+        cols = (c + self._xs * step).astype(np.intp)
+        return self._texture[rows[:, None], cols]
+
+
+def _log(msg: str):
+    print(f"[collision] {msg}")
@@ -1,72 +1,162 @@
 """WebSocket control server with dead-man's switch.
 
-Accepts one client at a time. Routes drive/mode/ping messages
-to motors and sirens. Implements watchdog safety timeout.
+Accepts one driver and any number of read-only spectators
+(ws://host:8765/?role=spectator). Routes the driver's drive/mode/ping
+messages to motors and sirens, timed motion programs to
+server.motion, other message types to handlers registered with
+add_command(), and implements the watchdog safety timeout. State is
+serialized once per tick and fanned out to every connection through a
+small per-connection queue, so a slow viewer drops updates instead of
+stalling the loop.
+
+The motor stop after DEADMAN_TIMEOUT is enforced by server.deadman on
+its own thread, independent of this loop; the loop's watchdog task
+only handles the slower safe-mode timeout. server.loopmon watches the
+loop itself: lag, and any callback that blocks it past
+slow_callback_ms, reported with its stack as a "slow_callback" event.
 """
 
 import asyncio
 import json
 import time
+from urllib.parse import parse_qs, urlsplit
 
 import websockets
 
-from server import motors, sirens
+from common import gcmode, netqos, tracing
+from server import metrics, motors, sirens
+from server.clock import now_ns
+from server.deadman import Deadman
+from server.loopmon import BUDGET_MS, LoopMonitor
+from server.motion import MotionError, MotionRunner
 
 WS_PORT = 8765
 DEADMAN_TIMEOUT = 0.5    # seconds without message -> stop motors
 SAFE_MODE_TIMEOUT = 5.0  # seconds without message -> safe mode warning
 STATE_INTERVAL = 0.2     # 5Hz state broadcast
+SUBSCRIBER_QUEUE = 2     # pending state messages per connection before dropping
+
+ROLE_DRIVER = "driver"
+ROLE_SPECTATOR = "spectator"
+# Metric label values; anything else is "other"
+MESSAGE_TYPES = ("drive", "mode", "ping", "motion", "profile", "blackbox", "roi", "trace")
+
+_MESSAGES = metrics.counter("robothector_ws_messages_received_total",
+                            "WebSocket messages received", ("role", "type"))
+_DISPATCH = metrics.histogram("robothector_dispatch_seconds",
+                              "JSON decode + dispatch time of a driver message")
+_WATCHDOG_TRIPS = metrics.counter("robothector_watchdog_trips_total",
+                                  "Dead-man's switch activations", ("kind",))
+_CONNECTIONS = metrics.gauge("robothector_ws_connections", "Open WebSocket connections",
+                             ("role",))
 
 
 class ControlServer:
-    def __init__(self, port: int = WS_PORT):
+    def __init__(self, port: int = WS_PORT, slow_callback_ms: float = BUDGET_MS):
         self.port = port
-        self._client = None
+        self._client = None      # the driver connection
+        self._subscribers: dict = {}  # ws -> _Subscriber, driver included
         self._last_message_time = 0.0
         self._safe_mode = False
         self._current_mode = ""
+        self._loop = None
         self._running = False
+        self._state_sources: dict = {}
+        self._commands: dict = {}
+        self._taps: list = []
+        self._motion = MotionRunner(self._motion_event)
+        self._deadman = Deadman(DEADMAN_TIMEOUT, on_trip=self._deadman_trip)
+        self._loopmon = LoopMonitor("control", slow_callback_ms)
+        self._loopmon.add_listener(self._on_slow_callback)
+        self.add_state_source("motion", self._motion.status)
+        self.add_state_source("deadman", self._deadman.status)
+        self.add_state_source("loop", self._loopmon.status)
+
+    def add_command(self, msg_type: str, handler):
+        """Route driver messages of `msg_type` to `handler(msg)`.
+
+        A dict returned by the handler is sent back to the driver.
+        """
+        self._commands[msg_type] = handler
+
+    def add_tap(self, tap):
+        """Call `tap(kind, text)` with each raw driver message ("command")
+        and each connection/watchdog event as JSON ("event")."""
+        self._taps.append(tap)
+
+    def add_state_source(self, key: str, source):
+        """Include `source()` under `key` in every state broadcast."""
+        self._state_sources[key] = source
 
     async def start(self):
         """Start the WebSocket server (blocks on the event loop)."""
         self._running = True
+        self._loop = asyncio.get_running_loop()
+        self._deadman.start()
+        self._loopmon.start()
         async with websockets.serve(self._handle_client, "0.0.0.0", self.port):
             _log(f"listening on ws://0.0.0.0:{self.port}")
             watchdog = asyncio.create_task(self._watchdog())
             state_sender = asyncio.create_task(self._state_loop())
+            lag_probe = asyncio.create_task(self._loopmon.watch_lag())
             try:
                 await asyncio.Future()  # run forever
             finally:
                 self._running = False
                 watchdog.cancel()
                 state_sender.cancel()
+                lag_probe.cancel()
+                self._loopmon.stop()
+                self._deadman.stop()
                 _safe_stop()
 
     async def _handle_client(self, ws):
-        """Handle a single WebSocket client connection."""
+        """Handle a WebSocket connection as driver or spectator."""
+        remote = ws.remote_address or ("?", 0)
+        netqos.apply(ws.transport.get_extra_info("socket"), "control", f"{remote[0]}:{remote[1]}")
+        role = _requested_role(ws)
+        if role == ROLE_SPECTATOR:
+            await self._handle_spectator(ws)
+            return
+
         if self._client is not None:
             _log("kicking previous client")
+            self._emit("driver_kicked")
             try:
                 await self._client.close()
             except Exception:
                 pass
             self._client = None
+            self._deadman.disarm()
+            self._motion.cancel("replaced driver")
             _safe_stop()
             sirens.stop_sirens()
 
         self._client = ws
         self._last_message_time = time.monotonic()
+        self._deadman.feed()
         self._safe_mode = False
         remote = ws.remote_address
         _log(f"client connected: {remote}")
+        self._emit("driver_connected", remote=str(remote))
+        subscriber = self._subscribe(ws)
 
         try:
             async for raw in ws:
+                t0 = time.perf_counter()
+                for tap in self._taps:
+                    tap("command", raw)
                 self._last_message_time = time.monotonic()
+                self._deadman.feed()
                 self._safe_mode = False
                 try:
                     msg = json.loads(raw)
-                    self._dispatch(msg)
+                    _count_message(ROLE_DRIVER, msg)
+                    with tracing.span("dispatch", tracing.parse_id(msg.get("trace")),
+                                      type=msg.get("type")):
+                        self._dispatch(msg)
+                    _DISPATCH.observe(time.perf_counter() - t0)
+                    gcmode.safe_point()  # the command is applied; the next is ~50 ms away
                 except json.JSONDecodeError:
                     await ws.send(json.dumps({
                         "type": "error",
@@ -75,12 +165,98 @@ class ControlServer:
         except websockets.ConnectionClosed:
             pass
         finally:
-            self._client = None
-            _safe_stop()
-            sirens.stop_sirens()
-            self._current_mode = ""
+            self._unsubscribe(subscriber)
+            if self._client is ws:
+                self._client = None
+                self._deadman.disarm()
+                self._motion.cancel("disconnect")
+                _safe_stop()
+                sirens.stop_sirens()
+                self._current_mode = ""
+            self._emit("driver_disconnected", remote=str(remote))
             _log(f"client disconnected: {remote}")
 
+    async def _handle_spectator(self, ws):
+        """Read-only connection: receives state, may only ping."""
+        remote = ws.remote_address
+        subscriber = self._subscribe(ws)
+        _log(f"spectator connected: {remote} ({self._spectator_count()} watching)")
+        try:
+            async for raw in ws:
+                try:
+                    msg = json.loads(raw)
+                except json.JSONDecodeError:
+                    continue
+                _count_message(ROLE_SPECTATOR, msg)
+                if msg.get("type") == "ping":
+                    await ws.send(json.dumps(_pong(msg)))
+                else:
+                    await ws.send(json.dumps({
+                        "type": "error",
+                        "message": "spectators are read-only",
+                    }))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self._unsubscribe(subscriber)
+            _log(f"spectator disconnected: {remote} (dropped {subscriber.dropped} updates)")
+
+    def _subscribe(self, ws) -> "_Subscriber":
+        subscriber = _Subscriber(ws)
+        self._subscribers[ws] = subscriber
+        self._update_connection_gauges()
+        return subscriber
+
+    def _unsubscribe(self, subscriber: "_Subscriber"):
+        self._subscribers.pop(subscriber.ws, None)
+        subscriber.close()
+        self._update_connection_gauges()
+
+    def _update_connection_gauges(self):
+        spectators = self._spectator_count()
+        _CONNECTIONS.labels(role=ROLE_SPECTATOR).set(spectators)
+        _CONNECTIONS.labels(role=ROLE_DRIVER).set(len(self._subscribers) - spectators)
+
+    def _spectator_count(self) -> int:
+        return sum(1 for ws in self._subscribers if ws is not self._client)
+
+    def _emit(self, event: str, **fields):
+        if self._taps:
+            fields["event"] = event
+            text = json.dumps(fields)
+            for tap in self._taps:
+                tap("event", text)
+
+    def _motion_event(self, msg: dict):
+        # A running program is bounded by MAX_PROGRAM_DURATION instead of the dead-man
+        self._deadman.hold(msg["status"] == "started")
+        self._emit("motion", status=msg["status"], id=msg.get("id"))
+        self._send_to_driver(msg)
+
+    def _deadman_trip(self, latency: float):
+        """Deadman callback, on its thread."""
+        loop = self._loop
+        if loop is not None:
+            loop.call_soon_threadsafe(self._on_deadman, latency)
+
+    def _on_deadman(self, latency: float):
+        _WATCHDOG_TRIPS.labels(kind="deadman").inc()
+        self._emit("deadman", latency_ms=round(latency * 1000, 3))
+
+    def _on_slow_callback(self, record: dict):
+        self._emit("slow_callback", ms=record["ms"], callback=record["callback"],
+                   stack=record["stack"])
+
+    def _send_to_driver(self, msg: dict):
+        """Queue a reply to the driver without awaiting it."""
+        if self._client:
+            asyncio.get_event_loop().create_task(self._client.send(json.dumps(msg)))
+
+    def _broadcast(self, payload: str):
+        """Queue one pre-serialized message on every connection."""
+        for subscriber in self._subscribers.values():
+            subscriber.offer(payload)
+
     def _dispatch(self, msg: dict):
         """Route an incoming message to the appropriate handler."""
         msg_type = msg.get("type")
@@ -88,8 +264,10 @@ class ControlServer:
         if msg_type == "drive":
             axis_x = float(msg.get("axis_x", 0))
             axis_y = float(msg.get("axis_y", 0))
-            left, right = motors.arcade_mix(axis_x, axis_y)
-            motors.set_motors(left, right)
+            # A centered stick must not stop a running motion program
+            if self._motion.preempted_by(axis_x, axis_y):
+                left, right = motors.arcade_mix(axis_x, axis_y)
+                motors.set_motors(left, right)
 
         elif msg_type == "mode":
             mode = msg.get("mode", "")
@@ -97,38 +275,107 @@ class ControlServer:
             sirens.play_siren(mode)
 
         elif msg_type == "ping":
-            if self._client:
-                asyncio.get_event_loop().create_task(
-                    self._client.send(json.dumps({"type": "pong"}))
-                )
+            self._send_to_driver(_pong(msg))
+
+        elif msg_type == "motion":
+            if msg.get("action") == "cancel":
+                self._motion.cancel()
+                return
+            try:
+                self._motion.start(msg)
+            except MotionError as e:
+                self._send_to_driver({"type": "error", "message": f"motion: {e}"})
+
+        elif msg_type in self._commands:
+            reply = self._commands[msg_type](msg)
+            if reply is not None:
+                self._send_to_driver(reply)
 
     async def _watchdog(self):
-        """Dead-man's switch: stop motors if no messages received."""
+        """Safe mode after SAFE_MODE_TIMEOUT without messages (the motor stop is server.deadman's)."""
         while self._running:
             await asyncio.sleep(0.1)
+            gcmode.safe_point()  # also collects while no driver is sending
             if self._client is None:
                 continue
             elapsed = time.monotonic() - self._last_message_time
             if elapsed > SAFE_MODE_TIMEOUT and not self._safe_mode:
                 self._safe_mode = True
+                _WATCHDOG_TRIPS.labels(kind="safe_mode").inc()
+                self._emit("safe_mode")
+                self._motion.cancel("safe mode")
                 _safe_stop()
                 _log("SAFE MODE: no messages for 5s")
-            elif elapsed > DEADMAN_TIMEOUT:
-                _safe_stop()
 
     async def _state_loop(self):
-        """Broadcast state to connected client at 5Hz."""
+        """Broadcast state to every connection at 5Hz."""
         while self._running:
             await asyncio.sleep(STATE_INTERVAL)
-            if self._client is not None:
-                try:
-                    await self._client.send(json.dumps({
-                        "type": "state",
-                        "mode": self._current_mode,
-                        "connected": True,
-                    }))
-                except websockets.ConnectionClosed:
-                    pass
+            if self._subscribers:
+                state = {
+                    "type": "state",
+                    "mode": self._current_mode,
+                    "connected": True,
+                    "driver": self._client is not None,
+                    "spectators": self._spectator_count(),
+                }
+                for key, source in self._state_sources.items():
+                    state[key] = source()
+                self._broadcast(json.dumps(state))
+
+
+class _Subscriber:
+    """Per-connection outbound queue with drop-oldest backpressure.
+
+    The sender task awaits ws.send(), which blocks while the socket's
+    write buffer is full. Meanwhile new payloads replace the oldest
+    queued ones, so a stalled viewer only ever holds SUBSCRIBER_QUEUE
+    messages and never delays anyone else.
+    """
+
+    def __init__(self, ws):
+        self.ws = ws
+        self.dropped = 0
+        self._queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE)
+        self._task = asyncio.create_task(self._sender())
+
+    def offer(self, payload: str):
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(payload)
+
+    def close(self):
+        self._task.cancel()
+
+    async def _sender(self):
+        try:
+            while True:
+                payload = await self._queue.get()
+                await self.ws.send(payload)
+        except websockets.ConnectionClosed:
+            pass
+
+
+def _count_message(role: str, msg: dict):
+    msg_type = msg.get("type")
+    _MESSAGES.labels(role=role, type=msg_type if msg_type in MESSAGE_TYPES else "other").inc()
+
+
+def _pong(ping: dict) -> dict:
+    """Pong echoing the client's send time `t`, stamped with server time."""
+    pong = {"type": "pong", "server_ns": now_ns()}
+    if "t" in ping:
+        pong["t"] = ping["t"]
+    return pong
+
+
+def _requested_role(ws) -> str:
+    """Role from the ?role= query parameter; driver unless spectator is asked for."""
+    request = getattr(ws, "request", None)  # websockets >= 13 asyncio API
+    path = request.path if request is not None else getattr(ws, "path", "/")
+    role = parse_qs(urlsplit(path).query).get("role", [ROLE_DRIVER])[0]
+    return ROLE_SPECTATOR if role == ROLE_SPECTATOR else ROLE_DRIVER
 
 
 def _safe_stop():
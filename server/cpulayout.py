@@ -0,0 +1,340 @@
+"""CPU pinning and scheduling priorities per server subsystem.
+
+Threads are sorted into roles by name:
+
+  control     MainThread, which runs the asyncio control loop
+  deadman     the dead-man watchdog (SCHED_FIFO already, server/deadman.py)
+  video       video-http and camera-* threads, plus the whole camera
+              child process with --video-loop process
+  background  everything else: beacon, collision, black box, telemetry,
+              profiler, loop monitor, simulator, and threads Python did not start
+              (libcamera's own, for example)
+
+A layout gives each role a CPU set and optionally a nice value or a
+SCHED_FIFO priority. Threads inherit their creator's settings, so a
+role's threads get the process's starting CPUs and nice value back
+wherever the layout says nothing (SCHED_FIFO is only ever set, never
+undone):
+
+    control:cpus=3,nice=-5;video:cpus=0-2,nice=5;background:cpus=0-2,nice=10
+
+PRESETS holds named layouts. "pi4" keeps core 3 for the control loop and
+the watchdog, and moves encode bursts and housekeeping onto cores 0-2.
+Combine it with `isolcpus=3` on the kernel command line, so that nothing
+else is scheduled on core 3 either. Negative nice values and rt= need
+CAP_SYS_NICE (or LimitNICE= / LimitRTPRIO= in the systemd unit).
+Settings the kernel refuses are reported and otherwise skipped.
+
+start() applies the layout and logs it, together with the limits it
+found: isolated CPUs, the cgroup's cpuset and CPU quota, and the CPUs
+this process may use. A watcher thread then re-applies it every RESCAN
+seconds to threads started later, such as encoder workers or the
+profiler. Settings are per thread (Linux TIDs). Because threads inherit
+them, the camera child only needs to set its main thread, as long as it
+does so before starting any other.
+
+Usage:
+    cpulayout.configure("pi4")
+    cpulayout.start()
+    python -m server.video_bench --layout off pi4 "control:cpus=0;video:cpus=0"
+"""
+
+import os
+import threading
+import time
+
+ROLES = ("control", "deadman", "video", "background")
+SETTINGS = ("cpus", "nice", "rt")
+PRESETS = {
+    "off": "",
+    "pi4": "control:cpus=3,nice=-5;deadman:cpus=3;video:cpus=0-2,nice=5;"
+           "background:cpus=0-2,nice=10",
+}
+RESCAN = 2.0    # seconds between passes over new threads
+
+_layout: dict = {}      # role -> {"cpus": set, "nice": int, "rt": int}
+_default: dict = {}     # {"cpus", "nice"} before any pinning, for roles without one
+_applied: dict = {}     # tid -> thread name it was applied under
+_watcher = None
+
+
+def configure(text: str):
+    """Set the layout from a preset name or "ROLE:SETTING=VALUE[,...];..." text.
+
+    Raises:
+        ValueError: Unknown preset, role or setting, or a bad value.
+    """
+    global _layout
+    _layout = parse_layout(text)
+    if hasattr(os, "sched_getaffinity"):
+        _default.update(cpus=os.sched_getaffinity(0), nice=os.getpriority(os.PRIO_PROCESS, 0))
+
+
+def parse_layout(text: str) -> dict:
+    """Parse a layout (see configure()) into {role: {setting: value}}.
+
+    Raises:
+        ValueError: Unknown preset, role or setting, or a bad value.
+    """
+    text = PRESETS.get(text, text)
+    layout = {}
+    for spec in filter(None, (s.strip() for s in text.split(";"))):
+        role, sep, assignments = spec.partition(":")
+        if role not in ROLES or not sep:
+            raise ValueError(f"cpu layout {spec!r}: expected a preset ({', '.join(PRESETS)}) or "
+                             f"ROLE:SETTING=VALUE[,...] with ROLE {'|'.join(ROLES)}")
+        settings = layout.setdefault(role, {})
+        for assignment in assignments.split(","):
+            name, _, value = assignment.partition("=")
+            if name not in SETTINGS:
+                raise ValueError(f"cpu layout {spec!r}: unknown setting {name!r} "
+                                 f"(expected {', '.join(SETTINGS)})")
+            try:
+                settings[name] = _parse_cpus(value) if name == "cpus" else int(value)
+            except ValueError:
+                raise ValueError(f"cpu layout {spec!r}: bad {name} value {value!r}") from None
+        if "nice" in settings and "rt" in settings:
+            raise ValueError(f"cpu layout {spec!r}: nice and rt are exclusive")
+    return layout
+
+
+def settings() -> dict:
+    """Current layout, for handing to a child process (see restore()).
+
+    Includes the defaults from configure(): a child started by a pinned
+    thread would otherwise take that thread's CPUs for the process's.
+    """
+    return {"layout": {role: dict(s) for role, s in _layout.items()},
+            "default": dict(_default)}
+
+
+def restore(state: dict):
+    global _layout
+    _layout = {role: dict(s) for role, s in state["layout"].items()}
+    _default.clear()
+    _default.update(state["default"])
+
+
+def start(role: str | None = None):
+    """Apply the layout, log it with the system's limits, and keep applying it.
+
+    Args:
+        role: Put every thread of this process in one role (the camera
+            child passes "video"); it is then applied to the calling
+            thread only, before any others exist, and no watcher runs.
+    """
+    global _watcher
+    if not _layout:
+        return
+    if not hasattr(os, "sched_setaffinity"):
+        _log("CPU layout needs Linux; not applied")
+        return
+    if role is not None:
+        report = {role: _apply_thread(threading.get_native_id(), role)}
+        _log(f"pid {os.getpid()}, all threads " + _describe(role, report[role]))
+        return
+    _log(_describe_limits(limits()))
+    for role, result in apply().items():
+        _log(_describe(role, result))
+    if _watcher is None:
+        _watcher = threading.Thread(target=_watch, name="cpu-layout", daemon=True)
+        _watcher.start()
+
+
+def apply() -> dict:
+    """Apply the layout to this process's threads not yet seen.
+
+    Returns:
+        {role: {"threads": n, "cpus": [...], "nice": n, "rt": n, "failed": [...]}}
+        for the roles that had new threads.
+    """
+    names = {t.native_id: t.name for t in threading.enumerate() if t.native_id}
+    report: dict = {}
+    for tid in _task_ids():
+        name = names.get(tid)
+        if name is None:
+            name = _comm(tid)  # a thread Python did not start
+        if _applied.get(tid) == name:
+            continue
+        _applied[tid] = name
+        role = _role(name)
+        result = _apply_thread(tid, role)
+        entry = report.setdefault(role, dict(result, threads=0, failed=[]))
+        entry["threads"] += 1
+        entry["failed"] = sorted(set(entry["failed"]) | set(result["failed"]))
+    return report
+
+
+def limits() -> dict:
+    """CPUs available to this process and what restricts them."""
+    return {
+        "online": os.cpu_count(),
+        "allowed": sorted(os.sched_getaffinity(0)),
+        "isolated": sorted(_parse_cpus(_read("/sys/devices/system/cpu/isolated") or "")),
+        "cgroup_cpus": _cgroup_cpuset(),
+        "cgroup_quota": _cgroup_quota(),
+    }
+
+
+def _role(name: str) -> str:
+    if name == "MainThread":
+        return "control"
+    if name == "deadman":
+        return "deadman"
+    if name == "video-http" or name.startswith("camera-"):
+        return "video"
+    return "background"
+
+
+def _apply_thread(tid: int, role: str) -> dict:
+    wanted = _layout.get(role, {})
+    failed = []
+    allowed = _default["cpus"]
+    cpus = wanted.get("cpus", allowed)
+    if cpus - allowed:
+        failed.append(f"cpus {_format_cpus(cpus - allowed)} not available")
+    try:
+        os.sched_setaffinity(tid, (cpus & allowed) or allowed)
+    except OSError as e:
+        failed.append(f"cpus: {e.strerror}")
+    if "rt" not in wanted:
+        nice = wanted.get("nice", _default["nice"])
+        try:
+            os.setpriority(os.PRIO_PROCESS, tid, nice)
+        except OSError as e:
+            failed.append(f"nice {nice}: {e.strerror}")
+    else:
+        try:
+            os.sched_setscheduler(tid, os.SCHED_FIFO, os.sched_param(wanted["rt"]))
+        except OSError as e:
+            failed.append(f"rt {wanted['rt']}: {e.strerror}")
+    return dict(_read_back(tid), failed=failed)
+
+
+def _read_back(tid: int) -> dict:
+    """CPUs and policy the thread actually has."""
+    try:
+        cpus = sorted(os.sched_getaffinity(tid))
+        policy = os.sched_getscheduler(tid)
+        if policy == os.SCHED_FIFO:
+            return {"cpus": cpus, "rt": os.sched_getparam(tid).sched_priority}
+        return {"cpus": cpus, "nice": os.getpriority(os.PRIO_PROCESS, tid)}
+    except OSError:
+        return {"cpus": []}  # the thread exited meanwhile
+
+
+def _watch():
+    while True:
+        time.sleep(RESCAN)
+        for role, result in apply().items():
+            _log("new threads: " + _describe(role, result))
+        live = set(_task_ids())
+        for tid in list(_applied):
+            if tid not in live:
+                del _applied[tid]
+
+
+def _describe(role: str, result: dict) -> str:
+    policy = (f"SCHED_FIFO {result['rt']}" if "rt" in result
+              else f"nice {result['nice']}" if "nice" in result else "?")
+    n = result.get("threads")
+    threads = "" if n is None else f" ({n} thread{'' if n == 1 else 's'})"
+    text = f"{role}: cpus {_format_cpus(result['cpus'])}, {policy}{threads}"
+    if result["failed"]:
+        text += f" (failed: {'; '.join(result['failed'])})"
+    return text
+
+
+def _describe_limits(info: dict) -> str:
+    text = f"{info['online']} CPUs online, allowed {_format_cpus(info['allowed'])}"
+    if info["isolated"]:
+        text += f", isolcpus {_format_cpus(info['isolated'])}"
+    if info["cgroup_cpus"] is not None:
+        text += f", cgroup cpuset {_format_cpus(info['cgroup_cpus'])}"
+    if info["cgroup_quota"] is not None:
+        text += f", cgroup quota {info['cgroup_quota']:.2f} CPUs"
+    return text
+
+
+def _task_ids() -> list:
+    try:
+        return [int(tid) for tid in os.listdir("/proc/self/task")]
+    except OSError:
+        return [threading.get_native_id()]
+
+
+def _comm(tid: int) -> str:
+    return (_read(f"/proc/self/task/{tid}/comm") or f"tid-{tid}").strip()
+
+
+def _cgroup_paths() -> dict:
+    """Controller -> this process's cgroup directory ("" for cgroup v2)."""
+    paths = {}
+    for line in (_read("/proc/self/cgroup") or "").splitlines():
+        _, controllers, path = line.split(":", 2)
+        for controller in controllers.split(",") if controllers else [""]:
+            paths[controller] = path
+    return paths
+
+
+def _cgroup_cpuset() -> list | None:
+    paths = _cgroup_paths()
+    candidates = []
+    if "" in paths:
+        candidates.append(f"/sys/fs/cgroup{paths['']}/cpuset.cpus.effective")
+    if "cpuset" in paths:
+        candidates.append(f"/sys/fs/cgroup/cpuset{paths['cpuset']}/cpuset.effective_cpus")
+    for path in candidates:
+        text = _read(path)
+        if text:
+            return sorted(_parse_cpus(text))
+    return None
+
+
+def _cgroup_quota() -> float | None:
+    """CPU bandwidth limit in CPUs, or None if unlimited."""
+    paths = _cgroup_paths()
+    if "" in paths:
+        text = _read(f"/sys/fs/cgroup{paths['']}/cpu.max")
+        if text:
+            quota, period = text.split()[:2]
+            return None if quota == "max" else int(quota) / int(period)
+    if "cpu" in paths:
+        for mount in ("cpu", "cpu,cpuacct"):
+            base = f"/sys/fs/cgroup/{mount}{paths['cpu']}"
+            quota, period = _read(f"{base}/cpu.cfs_quota_us"), _read(f"{base}/cpu.cfs_period_us")
+            if quota and period:
+                return None if int(quota) < 0 else int(quota) / int(period)
+    return None
+
+
+def _parse_cpus(text: str) -> set:
+    """"0-2,5" -> {0, 1, 2, 5}."""
+    cpus = set()
+    for part in filter(None, (p.strip() for p in text.split(","))):
+        first, _, last = part.partition("-")
+        cpus.update(range(int(first), int(last or first) + 1))
+    return cpus
+
+
+def _format_cpus(cpus) -> str:
+    """{0, 1, 2, 5} -> "0-2,5"."""
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ",".join(f"{a}-{b}" if b > a else str(a) for a, b in ranges) or "none"
+
+
+def _read(path: str) -> str | None:
+    try:
+        with open(path) as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _log(msg: str):
+    print(f"[cpulayout] {msg}")
@@ -0,0 +1,137 @@
+"""Dead-man's switch on its own real-time thread.
+
+The control loop calls feed() for every driver message. A dedicated
+thread sleeps until the current deadline — it never polls — and when a
+deadline passes unfed it writes all-low straight to the GPIO driver
+(motors.emergency_stop), so a stalled event loop cannot keep the motors
+running. The thread asks for SCHED_FIFO at PRIORITY (needs CAP_SYS_NICE
+or an rtprio limit, e.g. `LimitRTPRIO=50` in the systemd unit) and falls
+back to normal scheduling. It still needs the GIL after waking, so a
+thread holding it delays the stop by up to sys.getswitchinterval()
+(5 ms) rather than by a whole loop stall.
+
+Every trip records the time from the deadline to the completed write in
+robothector_deadman_stop_latency_seconds.
+"""
+
+import os
+import threading
+import time
+
+from server import metrics, motors
+
+TIMEOUT = 0.5   # seconds without a driver message -> stop motors
+PRIORITY = 50   # SCHED_FIFO priority (1-99), level with the kernel's threaded IRQ handlers
+
+_STOP_LATENCY = metrics.histogram("robothector_deadman_stop_latency_seconds",
+                                  "Time from a missed dead-man deadline to the motor stop write")
+
+
+class Deadman:
+    """Stops the motors when feed() is not called for `timeout` seconds.
+
+    Args:
+        timeout: Seconds between feeds before tripping.
+        on_trip: Called (on the watchdog thread) after each stop with
+            the stop latency in seconds; must not block.
+        priority: SCHED_FIFO priority for the thread, 0 for none.
+    """
+
+    def __init__(self, timeout: float = TIMEOUT, on_trip=None, priority: int = PRIORITY):
+        self.timeout = timeout
+        self._on_trip = on_trip
+        self._priority = priority
+        self._cond = threading.Condition()
+        self._deadline = None    # None: disarmed (no driver, or tripped until the next feed)
+        self._held = False
+        self._running = False
+        self._thread = None
+        self.policy = "other"
+        self.trips = 0
+        self.last_latency = None
+        self.max_latency = 0.0
+
+    def start(self):
+        self._running = True
+        self._thread = threading.Thread(target=self._run, name="deadman", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        with self._cond:
+            self._running = False
+            self._cond.notify()
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def feed(self):
+        """Push the deadline out by `timeout`; arms the switch if it was not."""
+        with self._cond:
+            idle = self._deadline is None
+            self._deadline = time.monotonic() + self.timeout
+            if idle:
+                self._cond.notify()
+
+    def disarm(self):
+        """No driver: nothing to time out until the next feed()."""
+        with self._cond:
+            self._deadline = None
+
+    def hold(self, held: bool):
+        """Suspend the switch (a running motion program is bounded by its own limits).
+
+        Releasing restarts the timeout from now.
+        """
+        with self._cond:
+            self._held = held
+            if not held and self._deadline is not None:
+                self._deadline = time.monotonic() + self.timeout
+            self._cond.notify()
+
+    def status(self) -> dict:
+        return {
+            "armed": self._deadline is not None and not self._held,
+            "policy": self.policy,
+            "trips": self.trips,
+            "last_ms": None if self.last_latency is None else round(self.last_latency * 1000, 3),
+            "max_ms": round(self.max_latency * 1000, 3),
+        }
+
+    def _run(self):
+        self.policy = _set_realtime(self._priority)
+        with self._cond:
+            while self._running:
+                deadline = self._deadline
+                if deadline is None or self._held:
+                    self._cond.wait()
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                # Under the lock, so a feed() racing with us cannot be undone by this stop
+                motors.emergency_stop()
+                latency = time.monotonic() - deadline
+                self._deadline = None
+                self.trips += 1
+                self.last_latency = latency
+                self.max_latency = max(self.max_latency, latency)
+                _STOP_LATENCY.observe(latency)
+                if self._on_trip is not None:
+                    self._on_trip(latency)
+
+
+def _set_realtime(priority: int) -> str:
+    """Switch the calling thread to SCHED_FIFO; returns the policy in effect."""
+    if priority <= 0 or not hasattr(os, "sched_setscheduler"):
+        return "other"
+    try:
+        os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(priority))
+    except OSError as e:
+        _log(f"SCHED_FIFO unavailable ({e}), running at normal priority")
+        return "other"
+    _log(f"watchdog thread at SCHED_FIFO {priority}")
+    return "fifo"
+
+
+def _log(msg: str):
+    print(f"[deadman] {msg}")
@@ -64,7 +64,8 @@ def start():
     if _thread is not None and _thread.is_alive():
         return
     _stop_event = threading.Event()
-    _thread = threading.Thread(target=_beacon_loop, args=(_stop_event,), daemon=True)
+    _thread = threading.Thread(target=_beacon_loop, args=(_stop_event,), name="beacon",
+                               daemon=True)
     _thread.start()
 
 
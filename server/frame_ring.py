@@ -0,0 +1,105 @@
+"""Single-writer frame ring in multiprocessing.shared_memory.
+
+The camera process publishes each frame into the next of `slots`
+fixed-size slots; readers in other processes get a memoryview straight
+into the slot, with no copy and no lock:
+
+  header:  b"RHFR" u32 slots  u32 slot_size  u64 head (latest seq)
+  slot:    u64 begin  u64 end  i64 sensor_ns  i64 encode_ns  u32 length  data
+
+A slot is being written while begin != end. The writer sets begin, copies
+the frame, then sets end and head, so get(seq) only hands out complete
+frames. A view stays valid until the writer comes round to the slot
+again, `slots` frames later; readers that hold on to a frame longer
+either check valid(seq) afterwards or copy it. Sequence numbers keep
+counting across writer restarts (they continue from head), so readers
+never see them go backwards.
+"""
+
+import struct
+from multiprocessing import shared_memory
+
+MAGIC = b"RHFR"
+HEADER = struct.Struct("<4sIIQ")
+SLOT = struct.Struct("<QQqqI")
+_HEAD_OFFSET = 12
+
+
+class FrameRing:
+    """A ring created with create() or opened by name with attach()."""
+
+    def __init__(self, shm: shared_memory.SharedMemory, owner: bool):
+        self._shm = shm
+        self._owner = owner
+        self._buf = shm.buf
+        magic, self.slots, self.slot_size, _ = HEADER.unpack_from(self._buf, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{shm.name}: not a frame ring")
+        self._stride = SLOT.size + self.slot_size
+        self.dropped = 0  # frames larger than a slot (writer side)
+
+    @classmethod
+    def create(cls, slots: int, slot_size: int) -> "FrameRing":
+        size = HEADER.size + slots * (SLOT.size + slot_size)
+        shm = shared_memory.SharedMemory(create=True, size=size)
+        HEADER.pack_into(shm.buf, 0, MAGIC, slots, slot_size, 0)
+        return cls(shm, owner=True)
+
+    @classmethod
+    def attach(cls, name: str) -> "FrameRing":
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    @property
+    def name(self) -> str:
+        return self._shm.name
+
+    @property
+    def head(self) -> int:
+        """Sequence number of the newest complete frame (0 = none yet)."""
+        return struct.unpack_from("<Q", self._buf, _HEAD_OFFSET)[0]
+
+    def publish(self, data, sensor_ns: int, encode_ns: int) -> int:
+        """Copy a frame into the next slot; returns its seq, or 0 if it did not fit.
+
+        `data` is any C-contiguous buffer (bytes, a NumPy array, ...).
+        """
+        data = memoryview(data).cast("B")
+        length = data.nbytes
+        if length > self.slot_size:
+            self.dropped += 1
+            return 0
+        seq = self.head + 1
+        offset = self._offset(seq)
+        buf = self._buf
+        struct.pack_into("<Q", buf, offset, seq)
+        start = offset + SLOT.size
+        buf[start:start + length] = data
+        SLOT.pack_into(buf, offset, seq, seq, sensor_ns, encode_ns, length)
+        struct.pack_into("<Q", buf, _HEAD_OFFSET, seq)
+        return seq
+
+    def get(self, seq: int) -> tuple[int, int, memoryview] | None:
+        """(sensor_ns, encode_ns, view) of frame `seq`, or None if it is gone."""
+        offset = self._offset(seq)
+        begin, end, sensor_ns, encode_ns, length = SLOT.unpack_from(self._buf, offset)
+        if begin != seq or end != seq:
+            return None
+        start = offset + SLOT.size
+        return sensor_ns, encode_ns, self._buf[start:start + length]
+
+    def valid(self, seq: int) -> bool:
+        """Whether frame `seq` is still intact (the writer has not reused its slot)."""
+        return struct.unpack_from("<Q", self._buf, self._offset(seq))[0] == seq
+
+    def close(self):
+        """Detach; the creating side also removes the segment."""
+        self._buf = None
+        try:
+            self._shm.close()
+        except BufferError:
+            pass  # views still exported; the mapping goes with the process
+        if self._owner:
+            self._shm.unlink()
+
+    def _offset(self, seq: int) -> int:
+        return HEADER.size + (seq % self.slots) * self._stride
@@ -0,0 +1,186 @@
+"""GPIO output drivers for the four H-bridge inputs.
+
+Each driver owns a fixed set of output pins and writes all of them at
+once with write(levels), levels being a 0/1 tuple in pin order:
+
+  gpiod    libgpiod v2 line request; one GPIO_V2_LINE_SET_VALUES ioctl
+           per write, so all four lines change together. Default on
+           current Pi OS (Bookworm and later, required on the Pi 5).
+  rpigpio  RPi.GPIO; one register write per line.
+  pigpio   pigpiod daemon; clears then sets bank-1 masks (two atomic
+           writes, the intermediate state is all-off = brake).
+  mock     No hardware; keeps a timestamped trace of every write.
+
+open_driver("auto") picks the first that works in the order above,
+falling back to mock. server.gpio_bench compares their write latency.
+"""
+
+import collections
+import glob
+import time
+
+DRIVERS = ("gpiod", "rpigpio", "pigpio", "mock")
+CONSUMER = "robothector"
+PI_CHIP_LABELS = ("pinctrl-rp1", "pinctrl-bcm2712", "pinctrl-bcm2711", "pinctrl-bcm2835")
+TRACE_LENGTH = 10000
+
+
+class GpiodDriver:
+    """libgpiod v2: all pins in one line request.
+
+    Args:
+        pins: Line offsets on the chip (BCM numbers on a Pi).
+        chip: /dev/gpiochipN; by default the chip whose label is a Pi
+            pin controller (gpiochip0 on Pi 4, gpiochip4 or 0 on Pi 5).
+    """
+
+    name = "gpiod"
+    hardware = True
+
+    def __init__(self, pins: tuple, chip: str | None = None):
+        import gpiod
+        from gpiod.line import Direction, Value
+
+        self.pins = tuple(pins)
+        self.chip = chip or _find_pi_chip(gpiod)
+        if self.chip is None:
+            raise RuntimeError("no Raspberry Pi GPIO chip found (pass a chip path)")
+        self._values = (Value.INACTIVE, Value.ACTIVE)
+        self._request = gpiod.request_lines(
+            self.chip, consumer=CONSUMER,
+            config={self.pins: gpiod.LineSettings(direction=Direction.OUTPUT,
+                                                  output_value=Value.INACTIVE)},
+        )
+        self._cache: dict = {}
+
+    def write(self, levels: tuple):
+        values = self._cache.get(levels)
+        if values is None:
+            values = self._cache[levels] = {
+                pin: self._values[level] for pin, level in zip(self.pins, levels)
+            }
+        self._request.set_values(values)
+
+    def close(self):
+        self.write((0,) * len(self.pins))
+        self._request.release()
+
+
+class RpiGpioDriver:
+    """RPi.GPIO (deprecated on Bookworm, unavailable on the Pi 5)."""
+
+    name = "rpigpio"
+    hardware = True
+
+    def __init__(self, pins: tuple, chip: str | None = None):
+        import RPi.GPIO as GPIO
+
+        self._gpio = GPIO
+        self.pins = tuple(pins)
+        GPIO.setmode(GPIO.BCM)
+        GPIO.setwarnings(False)
+        for pin in self.pins:
+            GPIO.setup(pin, GPIO.OUT)
+            GPIO.output(pin, GPIO.LOW)
+
+    def write(self, levels: tuple):
+        self._gpio.output(self.pins, levels)
+
+    def close(self):
+        self.write((0,) * len(self.pins))
+        self._gpio.cleanup(self.pins)
+
+
+class PigpioDriver:
+    """pigpio daemon: one bank-clear and one bank-set per write.
+
+    Clearing first means a direction reversal passes through all-off,
+    never through both high-side inputs at once. Note pigpiod also
+    grabs the PCM clock and breaks I2S audio (docs/audio-design.md).
+    """
+
+    name = "pigpio"
+    hardware = True
+
+    def __init__(self, pins: tuple, chip: str | None = None):
+        import pigpio
+
+        self.pins = tuple(pins)
+        self._pi = pigpio.pi()
+        if not self._pi.connected:
+            raise RuntimeError("pigpiod is not running")
+        for pin in self.pins:
+            self._pi.set_mode(pin, pigpio.OUTPUT)
+        self._all = sum(1 << pin for pin in self.pins)
+        self._pi.clear_bank_1(self._all)
+
+    def write(self, levels: tuple):
+        high = sum(1 << pin for pin, level in zip(self.pins, levels) if level)
+        self._pi.clear_bank_1(self._all & ~high)
+        if high:
+            self._pi.set_bank_1(high)
+
+    def close(self):
+        self._pi.clear_bank_1(self._all)
+        self._pi.stop()
+
+
+class MockDriver:
+    """No hardware: records (perf_counter_ns, levels) for every write."""
+
+    name = "mock"
+    hardware = False
+
+    def __init__(self, pins: tuple, chip: str | None = None):
+        self.pins = tuple(pins)
+        self.levels = (0,) * len(self.pins)
+        self._trace = collections.deque(maxlen=TRACE_LENGTH)
+
+    def write(self, levels: tuple):
+        self.levels = tuple(levels)
+        self._trace.append((time.perf_counter_ns(), self.levels))
+
+    def trace(self) -> list:
+        """Recorded writes, oldest first (at most TRACE_LENGTH)."""
+        return list(self._trace)
+
+    def close(self):
+        self.write((0,) * len(self.pins))
+
+
+_CLASSES = {
+    "gpiod": GpiodDriver,
+    "rpigpio": RpiGpioDriver,
+    "pigpio": PigpioDriver,
+    "mock": MockDriver,
+}
+
+
+def open_driver(name: str, pins: tuple, chip: str | None = None):
+    """Open driver `name`, or the first working one for "auto".
+
+    Raises:
+        ImportError/RuntimeError/OSError when an explicitly named driver
+        cannot be opened.
+    """
+    if name != "auto":
+        return _CLASSES[name](pins, chip)
+    for candidate in DRIVERS[:-1]:
+        try:
+            return _CLASSES[candidate](pins, chip)
+        except (ImportError, RuntimeError, OSError):
+            continue
+    return MockDriver(pins)
+
+
+def _find_pi_chip(gpiod) -> str | None:
+    for path in sorted(glob.glob("/dev/gpiochip*")):
+        try:
+            if not gpiod.is_gpiochip_device(path):
+                continue
+            with gpiod.Chip(path) as chip:
+                if chip.get_info().label in PI_CHIP_LABELS:
+                    return path
+        except OSError:
+            continue
+    return None
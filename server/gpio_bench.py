@@ -0,0 +1,118 @@
+"""GPIO driver write-latency benchmark and readback check.
+
+Writes a drive-like pattern (forward, stop, reverse, spin, ...) to the
+H-bridge pins with each driver and reports per-write latency. With
+--verify, every write is read back: from the line request for gpiod
+(and from gpio-sim's sysfs attributes when the chip is simulated), or
+from the recorded trace for the mock.
+
+Off the Pi, gpiod can run against the kernel's gpio-sim chip
+(CONFIG_GPIO_SIM, needs root):
+
+    sudo modprobe gpio-sim
+    cd /sys/kernel/config/gpio-sim && sudo mkdir -p bench/bank0
+    echo 32 | sudo tee bench/bank0/num_lines
+    echo pinctrl-bcm2711 | sudo tee bench/bank0/label   # so auto-detection finds it
+    echo 1 | sudo tee bench/live
+    cat bench/bank0/chip_name                           # e.g. gpiochip0
+
+Usage:
+    uv run python -m server.gpio_bench
+    uv run python -m server.gpio_bench --drivers gpiod mock --chip /dev/gpiochip0 --verify
+"""
+
+import argparse
+import glob
+import os
+import statistics
+import time
+
+from server import gpio
+from server.motors import PINS
+
+PATTERN = (
+    (1, 0, 1, 0),  # forward
+    (0, 0, 0, 0),  # stop
+    (0, 1, 0, 1),  # reverse
+    (1, 0, 0, 1),  # spin right
+    (0, 1, 1, 0),  # spin left
+    (1, 0, 0, 0),  # arc
+)
+
+
+def _bench(driver, writes: int, verify: bool) -> dict:
+    latencies = []
+    mismatches = 0
+    readback = _readback(driver) if verify else None
+    for i in range(writes):
+        levels = PATTERN[i % len(PATTERN)]
+        t0 = time.perf_counter_ns()
+        driver.write(levels)
+        latencies.append(time.perf_counter_ns() - t0)
+        if readback is not None and readback() != levels:
+            mismatches += 1
+    latencies.sort()
+    n = len(latencies)
+    return {
+        "p50_us": latencies[n // 2] / 1000,
+        "p99_us": latencies[min(n - 1, int(n * 0.99))] / 1000,
+        "max_us": latencies[-1] / 1000,
+        "mean_us": statistics.fmean(latencies) / 1000,
+        "mismatches": mismatches if verify else None,
+    }
+
+
+def _readback(driver):
+    """Callable returning the levels currently on the pins, as far as we can see."""
+    if driver.name == "mock":
+        return lambda: driver.trace()[-1][1]
+    if driver.name == "gpiod":
+        sim = _gpio_sim_values(driver.chip)
+        if sim is not None:
+            return lambda: tuple(_read_int(sim[pin]) for pin in driver.pins)
+        request = driver._request
+        return lambda: tuple(int(v.value) for v in request.get_values(list(driver.pins)))
+    return None
+
+
+def _gpio_sim_values(chip: str) -> dict | None:
+    """pin -> sysfs value file when `chip` is a gpio-sim chip."""
+    name = os.path.basename(chip)
+    dirs = glob.glob(f"/sys/devices/platform/gpio-sim.*/{name}")
+    if not dirs:
+        return None
+    return {int(path.rsplit("sim_gpio", 1)[1]): os.path.join(path, "value")
+            for path in glob.glob(os.path.join(dirs[0], "sim_gpio*"))}
+
+
+def _read_int(path: str) -> int:
+    with open(path) as f:
+        return int(f.read())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GPIO driver write latency")
+    parser.add_argument("--drivers", nargs="+", choices=gpio.DRIVERS, default=list(gpio.DRIVERS))
+    parser.add_argument("--chip", default=None, help="gpiochip device for gpiod")
+    parser.add_argument("--writes", type=int, default=20000)
+    parser.add_argument("--verify", action="store_true", help="Read back every write")
+    args = parser.parse_args()
+
+    print(f"{'driver':>8} {'p50 us':>8} {'p99 us':>8} {'max us':>8} {'mean us':>8} {'bad':>5}")
+    for name in args.drivers:
+        try:
+            driver = gpio.open_driver(name, PINS, args.chip)
+        except (ImportError, RuntimeError, OSError) as e:
+            print(f"{name:>8} unavailable: {e}")
+            continue
+        try:
+            r = _bench(driver, args.writes, args.verify)
+        finally:
+            driver.close()
+        bad = "-" if r["mismatches"] is None else str(r["mismatches"])
+        print(f"{name:>8} {r['p50_us']:>8.2f} {r['p99_us']:>8.2f} {r['max_us']:>8.1f} "
+              f"{r['mean_us']:>8.2f} {bad:>5}")
+
+
+if __name__ == "__main__":
+    main()
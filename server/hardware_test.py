@@ -11,16 +11,17 @@ def test_motors() -> bool:
     """Test each motor: forward 1s, backward 1s, stop."""
     print("\n=== Motor Test ===")
     try:
-        from server.motors import init, set_motors, stop, cleanup, _has_gpio
+        from server.motors import init, set_motors, stop, cleanup, get_driver
     except ImportError as e:
         print(f"FAIL: cannot import motors module: {e}")
         return False
 
-    if not _has_gpio:
-        print("SKIP: RPi.GPIO not available (not running on Pi?)")
-        return False
-
     init()
+    if not get_driver().hardware:
+        cleanup()
+        print("SKIP: no GPIO driver available (not running on Pi?)")
+        return False
+    print(f"GPIO driver: {get_driver().name}")
     try:
         # Motor A
         print("Motor A forward...", end=" ", flush=True)
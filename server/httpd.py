@@ -0,0 +1,132 @@
+"""Minimal asyncio HTTP/1.x server for the video endpoints.
+
+Just enough HTTP for our clients (pygame client, fleet, browsers, curl):
+GET requests, query strings, one response per connection. Handlers are
+coroutines that either return a Response or stream directly to the
+writer (MJPEG). Every connection is a coroutine on one event loop, so
+adding viewers never adds OS threads.
+"""
+
+import asyncio
+import json
+from urllib.parse import parse_qs, urlsplit
+
+REQUEST_TIMEOUT = 10.0
+MAX_HEADER_BYTES = 16384
+
+_REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found",
+            405: "Method Not Allowed", 500: "Internal Server Error",
+            503: "Service Unavailable"}
+
+
+class Request:
+    def __init__(self, method: str, path: str, query: dict, headers: dict,
+                 reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.reader = reader
+        self.writer = writer
+
+    def arg(self, name: str, default: str | None = None) -> str | None:
+        """First value of a query parameter."""
+        return self.query.get(name, [default])[0]
+
+
+class Response:
+    def __init__(self, body: bytes = b"", content_type: str = "text/plain; charset=utf-8",
+                 status: int = 200, headers: dict | None = None):
+        self.body = body
+        self.content_type = content_type
+        self.status = status
+        self.headers = headers or {}
+
+
+def json_response(data, status: int = 200) -> Response:
+    return Response(json.dumps(data).encode(), "application/json", status)
+
+
+def response_head(status: int, content_type: str, extra: dict | None = None) -> bytes:
+    """Status line and headers, for handlers that stream their own body."""
+    lines = [f"HTTP/1.1 {status} {_REASONS.get(status, '')}",
+             f"Content-Type: {content_type}",
+             "Cache-Control: no-cache",
+             "Connection: close"]
+    for key, value in (extra or {}).items():
+        lines.append(f"{key}: {value}")
+    return ("\r\n".join(lines) + "\r\n\r\n").encode()
+
+
+class HttpServer:
+    def __init__(self, name: str = "http"):
+        self._name = name
+        self._routes: dict = {}
+        self._server = None
+
+    def route(self, path: str):
+        """Decorator registering `async def handler(request) -> Response | None`.
+
+        A handler returning None has written its own response.
+        """
+        def register(handler):
+            self._routes[path] = handler
+            return handler
+        return register
+
+    async def serve(self, host: str = "0.0.0.0", port: int = 5000):
+        """Listen and serve on the running loop until cancelled."""
+        self._server = await asyncio.start_server(self._handle, host, port)
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            request = await asyncio.wait_for(self._read_request(reader, writer), REQUEST_TIMEOUT)
+            if request is None:
+                return
+            handler = self._routes.get(request.path)
+            if request.method not in ("GET", "HEAD"):
+                response = Response(b"method not allowed\n", status=405)
+            elif handler is None:
+                response = Response(b"not found\n", status=404)
+            else:
+                response = await handler(request)
+            if response is not None:
+                await self._send(writer, response, head_only=request.method == "HEAD")
+        except (ConnectionError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError):
+            pass
+        except Exception as e:
+            _log(f"{self._name}: handler error: {e!r}")
+        finally:
+            writer.close()
+
+    async def _read_request(self, reader, writer) -> Request | None:
+        head = await reader.readuntil(b"\r\n\r\n")
+        if len(head) > MAX_HEADER_BYTES:
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, _version = lines[0].split(" ", 2)
+        except ValueError:
+            await self._send(writer, Response(b"bad request\n", status=400))
+            return None
+        headers = {}
+        for line in lines[1:]:
+            if ":" in line:
+                key, value = line.split(":", 1)
+                headers[key.strip().lower()] = value.strip()
+        url = urlsplit(target)
+        return Request(method, url.path, parse_qs(url.query), headers, reader, writer)
+
+    async def _send(self, writer, response: Response, head_only: bool = False):
+        extra = {"Content-Length": len(response.body), **response.headers}
+        writer.write(response_head(response.status, response.content_type, extra))
+        if not head_only and response.body:
+            writer.write(response.body)
+        await writer.drain()
+
+
+def _log(msg: str):
+    print(f"[httpd] {msg}")
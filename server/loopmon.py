@@ -0,0 +1,186 @@
+"""Event-loop lag and slow-callback monitor.
+
+Anything that blocks the control loop delays drive dispatch by the same
+amount. LoopMonitor watches one loop two ways:
+
+  lag    metrics.watch_loop_lag: how late a 100 ms sleep wakes, into
+         robothector_event_loop_lag_seconds plus a recent window for
+         the state stream.
+  slow   every callback the loop runs (including each coroutine step)
+         is timed by a wrapper around asyncio.Handle._run. A sampler
+         thread checks every budget/2 whether the current callback has
+         run past the budget and, if so, captures the loop thread's
+         stack while it is still blocked, so the report shows where
+         it was stuck rather than where the coroutine later suspended.
+
+Slow callbacks are counted in robothector_slow_callbacks_total, logged
+(at most once per LOG_INTERVAL, with the number suppressed) and passed
+to listeners, e.g. ControlServer turns them into events for the black
+box. The wrapper costs one dict lookup on loops that are not monitored.
+"""
+
+import asyncio
+import collections
+import statistics
+import sys
+import threading
+import time
+import traceback
+
+from server import metrics
+
+BUDGET_MS = 5.0
+STACK_DEPTH = 12
+LOG_INTERVAL = 1.0   # seconds between slow-callback log lines
+RECENT = 20          # slow callbacks kept for status()
+LAG_WINDOW = 100     # lag samples (10 s) behind the status percentiles
+
+_SLOW = metrics.counter("robothector_slow_callbacks_total",
+                        "Event-loop callbacks that ran longer than the budget", ("loop",))
+_SLOW_TIME = metrics.histogram("robothector_slow_callback_seconds",
+                               "Duration of callbacks over the budget", ("loop",))
+
+_monitors: dict = {}  # loop -> LoopMonitor
+_original_run = asyncio.events.Handle._run
+
+
+def _timed_run(handle):
+    monitor = _monitors.get(handle._loop)
+    if monitor is None:
+        return _original_run(handle)
+    t0 = time.perf_counter()
+    monitor._current = t0
+    try:
+        return _original_run(handle)
+    finally:
+        monitor._current = None
+        elapsed = time.perf_counter() - t0
+        if elapsed > monitor.budget:
+            monitor._report(handle, elapsed, t0)
+
+
+class LoopMonitor:
+    """Lag and slow-callback monitor for the loop it is started on.
+
+    Args:
+        name: Loop label for metrics and logs ("control").
+        budget_ms: Callbacks running longer than this are reported;
+            0 turns slow-callback detection off (lag only).
+    """
+
+    def __init__(self, name: str, budget_ms: float = BUDGET_MS):
+        self.name = name
+        self.budget = budget_ms / 1000
+        self.slow_count = 0
+        self._loop = None
+        self._thread_id = None
+        self._current = None      # perf_counter start of the running callback
+        self._sampled = (None, None, None)  # (start, task, stack) captured by the sampler
+        self._recent = collections.deque(maxlen=RECENT)
+        self._lags = collections.deque(maxlen=LAG_WINDOW)
+        self._listeners: list = []
+        self._last_log = 0.0
+        self._suppressed = 0
+        self._stop = threading.Event()
+        self._slow_series = _SLOW.labels(loop=name)
+        self._slow_time = _SLOW_TIME.labels(loop=name)
+
+    def add_listener(self, listener):
+        """Call `listener(record)` for every slow callback, on the loop thread."""
+        self._listeners.append(listener)
+
+    def start(self):
+        """Start monitoring the running loop (call from a coroutine on it)."""
+        self._loop = asyncio.get_running_loop()
+        self._thread_id = threading.get_ident()
+        if self.budget <= 0:
+            return
+        asyncio.events.Handle._run = _timed_run
+        _monitors[self._loop] = self
+        threading.Thread(target=self._sample, name=f"loopmon-{self.name}", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+        _monitors.pop(self._loop, None)
+
+    async def watch_lag(self):
+        """Lag probe coroutine; run it as a task on the monitored loop."""
+        await metrics.watch_loop_lag(self.name, window=self._lags)
+
+    def status(self) -> dict:
+        lags = sorted(self._lags)
+        last = self._recent[-1] if self._recent else None
+        return {
+            "lag_p50_ms": round(statistics.median(lags) * 1000, 2) if lags else None,
+            "lag_max_ms": round(lags[-1] * 1000, 2) if lags else None,
+            "slow": self.slow_count,
+            "last_slow": None if last is None else {
+                "ms": last["ms"], "callback": last["callback"],
+                "where": last["stack"][-1] if last["stack"] else None,
+            },
+        }
+
+    def recent(self) -> list:
+        """The last RECENT slow-callback records, oldest first."""
+        return list(self._recent)
+
+    def _sample(self):
+        interval = self.budget / 2
+        while not self._stop.wait(interval):
+            t0 = self._current
+            if t0 is None or t0 == self._sampled[0] or time.perf_counter() - t0 < self.budget:
+                continue
+            frame = sys._current_frames().get(self._thread_id)
+            if frame is None:
+                continue
+            task = asyncio.current_task(self._loop)
+            self._sampled = (t0, None if task is None else _describe_task(task),
+                             [f"{fs.filename}:{fs.lineno} in {fs.name}"
+                              for fs in traceback.extract_stack(frame, limit=STACK_DEPTH)])
+
+    def _report(self, handle, elapsed: float, t0: float):
+        start, task, stack = self._sampled
+        if start != t0:
+            task, stack = None, []
+        record = {
+            "loop": self.name,
+            "ms": round(elapsed * 1000, 2),
+            "callback": task or _describe(handle),
+            "stack": stack,
+            "time": time.time(),
+        }
+        self.slow_count += 1
+        self._slow_series.inc()
+        self._slow_time.observe(elapsed)
+        self._recent.append(record)
+        now = time.monotonic()
+        if now - self._last_log >= LOG_INTERVAL:
+            suppressed = f" ({self._suppressed} more since last report)" if self._suppressed else ""
+            lines = [f"{self.name}: slow callback {record['ms']:.1f} ms{suppressed}: "
+                     f"{record['callback']}"]
+            lines += [f"    {entry}" for entry in record["stack"]] or [
+                "    (finished before the stack was sampled)"]
+            _log("\n".join(lines))
+            self._last_log = now
+            self._suppressed = 0
+        else:
+            self._suppressed += 1
+        for listener in self._listeners:
+            try:
+                listener(record)
+            except Exception as e:
+                _log(f"listener error: {e}")
+
+
+def _describe(handle) -> str:
+    text = repr(handle)
+    return text if len(text) <= 200 else text[:197] + "..."
+
+
+def _describe_task(task) -> str:
+    coro = task.get_coro()
+    return f"task {task.get_name()} ({getattr(coro, '__qualname__', coro)})"
+
+
+def _log(msg: str):
+    print(f"[loopmon] {msg}")
@@ -1,9 +1,21 @@
 """Unified server entry point.
 
 Starts all server components: motors, sirens, camera, discovery beacon,
-and the WebSocket control server.
+and the WebSocket control server. Camera and video HTTP run in a
+supervised child process unless --video-loop says otherwise.
 
-Usage: uv run python -m server.main [--no-camera] [--no-motors]
+Usage: uv run python -m server.main [--no-camera] [--no-motors] [--collision MODE]
+                                    [--sim] [--profile SECONDS] [--blackbox SECONDS]
+                                    [--telemetry HZ]
+
+Profiling: `kill -USR1 <pid>` or a {"type": "profile"} control message
+toggles the sampling profiler; files land in --profile-dir.
+Black box: `kill -USR2 <pid>` or a {"type": "blackbox"} message dumps the
+last --blackbox seconds to --blackbox-dir (also on safe mode and crashes).
+Telemetry: --telemetry HZ logs motors, events, fps, temperature and RTT to
+compressed segments in --telemetry-dir; `python -m server.telemetry` exports CSV.
+Tracing: each process serves its recent spans at /trace; a {"type": "trace"}
+message returns the ports, which the client's F5 merges (client/trace.py).
 """
 
 import argparse
@@ -11,8 +23,11 @@ import asyncio
 import signal
 import sys
 
-from server import motors, sirens
-from server.camera import CameraServer
+from common import gcmode, netqos, tracing
+from common.profiler import SamplingProfiler, handle_message, install_signal
+from server import cpulayout, gpio, metrics, motors, sirens
+from server.camera import CameraServer, parse_camera_spec
+from server.clock import now_ns
 from server.control import ControlServer
 from server.discovery import start as beacon_start, stop as beacon_stop
 
@@ -22,13 +37,110 @@ def parse_args():
     parser.add_argument("--ws-port", type=int, default=8765, help="WebSocket port")
     parser.add_argument("--video-port", type=int, default=5000, help="MJPEG video port")
     parser.add_argument("--no-camera", action="store_true", help="Skip camera init")
+    parser.add_argument("--camera", action="append", type=_camera_spec, default=None,
+                        metavar="NAME=BACKEND[,BACKEND...]",
+                        help="Camera source, primary first (repeatable); backends "
+                             "picamera2[:N], v4l2[:/dev/videoN], synthetic, tried in order "
+                             "(default: front=picamera2:0)")
+    parser.add_argument("--video-loop", choices=("process", "dedicated", "shared"),
+                        default="process",
+                        help="Run camera and video HTTP in a child process, or in this one "
+                             "on their own event-loop thread or on the control loop")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Control-process /metrics port with --video-loop process "
+                             "(default: video port + 1)")
+    parser.add_argument("--slow-callback-ms", type=float, default=5.0,
+                        help="Log control-loop callbacks that block longer than this, "
+                             "with their stack (0 = off)")
+    parser.add_argument("--qos", action="append", type=_qos_spec, default=[],
+                        metavar="CLASS:OPTION=VALUE[,...]",
+                        help="Socket QoS for control/video traffic, e.g. video:dscp=10 or "
+                             "control:priority=5; 'off' leaves sockets untouched "
+                             "(repeatable, see common/netqos.py)")
+    parser.add_argument("--cpu-layout", type=_cpu_layout, default="off", metavar="LAYOUT",
+                        help="Pin control/deadman/video/background threads to CPUs with "
+                             "nice or SCHED_FIFO priorities: a preset (off, pi4) or "
+                             "'control:cpus=3,nice=-5;video:cpus=0-2,nice=5' "
+                             "(see server/cpulayout.py)")
+    parser.add_argument("--gc", choices=gcmode.MODES, default="off",
+                        help="Garbage collector: untouched, frozen after startup with raised "
+                             "thresholds, or collected at control-loop safe points "
+                             "(pauses are measured in every mode, see common/gcmode.py)")
+    parser.add_argument("--gc-threshold", type=_gc_thresholds, default=None,
+                        metavar="G0[,G1[,G2]]",
+                        help="Collector thresholds for --gc freeze; for --gc safepoint, the "
+                             "gen0 count a safe point waits for")
     parser.add_argument("--no-motors", action="store_true", help="Skip GPIO motor init")
+    parser.add_argument("--gpio", choices=("auto",) + gpio.DRIVERS, default="auto",
+                        help="GPIO driver for the H-bridge inputs")
+    parser.add_argument("--gpio-chip", default=None,
+                        help="gpiochip device for --gpio gpiod (default: the Pi's pin controller)")
+    parser.add_argument("--sim", action="store_true",
+                        help="Drive a simulated robot from the motor outputs (pose in state)")
+    parser.add_argument("--sim-speed", type=float, default=1.0,
+                        help="Simulated seconds per real second")
+    parser.add_argument("--collision", choices=("off", "monitor", "enforce"), default="off",
+                        help="Looming collision detection on the lores stream "
+                             "(enforce also blocks forward throttle)")
+    parser.add_argument("--collision-budget-ms", type=float, default=4.0,
+                        help="CPU budget per analyzed frame")
+    parser.add_argument("--blackbox", type=float, default=10.0, metavar="SECONDS",
+                        help="Seconds of frames/commands/motor output kept in memory (0 = off)")
+    parser.add_argument("--blackbox-mb", type=float, default=32.0, help="Black-box memory cap")
+    parser.add_argument("--blackbox-dir", default="blackbox", help="Where black-box dumps go")
+    parser.add_argument("--blackbox-stream", choices=("main", "lores"), default="main",
+                        help="Video stream recorded by the black box")
+    parser.add_argument("--telemetry", type=float, default=0.0, metavar="HZ",
+                        help="Samples per second of the on-disk telemetry log (0 = off)")
+    parser.add_argument("--telemetry-dir", default="telemetry", help="Where telemetry goes")
+    parser.add_argument("--telemetry-flush", type=float, default=60.0, metavar="SECONDS",
+                        help="Longest a telemetry record waits in memory before it is written "
+                             "(writes are otherwise batched in 64 KiB)")
+    parser.add_argument("--telemetry-fsync", choices=("never", "segment", "write"),
+                        default="segment",
+                        help="fsync telemetry never, when a segment is closed, or on every write")
+    parser.add_argument("--telemetry-segment-mb", type=float, default=8.0,
+                        help="Telemetry segment size before it is rotated and compressed")
+    parser.add_argument("--telemetry-keep-mb", type=float, default=256.0,
+                        help="Compressed telemetry kept; oldest segments are deleted beyond it")
+    parser.add_argument("--trace-buffer", type=int, default=tracing.CAPACITY, metavar="SPANS",
+                        help="Tracing spans kept per thread, served at /trace (0 = tracing off)")
+    parser.add_argument("--profile", type=float, default=None, metavar="SECONDS",
+                        help="Sample all threads from startup (0 = until stopped)")
+    parser.add_argument("--profile-dir", default=".", help="Where profile files are written")
+    parser.add_argument("--profile-format", choices=("speedscope", "collapsed"),
+                        default="speedscope")
     return parser.parse_args()
 
 
 def main():
     args = parse_args()
+    for spec in args.qos:
+        netqos.configure(spec)
+    tracing.configure("server", now_ns, args.trace_buffer)
+    cpulayout.configure(args.cpu_layout)  # before the camera child is spawned with it
+    gcmode.configure(args.gc, args.gc_threshold)
+    metrics.watch_gc()
     camera = None
+    collision = None
+    simulator = None
+    blackbox = None
+    if args.blackbox > 0:
+        from server.blackbox import BlackBox
+        blackbox = BlackBox(seconds=args.blackbox, max_bytes=int(args.blackbox_mb * (1 << 20)),
+                            out_dir=args.blackbox_dir)
+        blackbox.install_crash_hooks()
+        motors.add_output(blackbox.record_motor)
+    telemetry = None
+    if args.telemetry > 0:
+        from server.telemetry import TelemetryLogger
+        telemetry = TelemetryLogger(args.telemetry_dir, hz=args.telemetry,
+                                    flush=args.telemetry_flush, fsync=args.telemetry_fsync,
+                                    segment_bytes=int(args.telemetry_segment_mb * (1 << 20)),
+                                    keep_bytes=int(args.telemetry_keep_mb * (1 << 20)))
+    profiler = SamplingProfiler("server", out_dir=args.profile_dir, fmt=args.profile_format)
+    if args.profile is not None:
+        profiler.start(args.profile or None)
 
     print("=" * 50)
     print("Robothector Server")
@@ -38,7 +150,16 @@ def main():
     if args.no_motors:
         print("[main] motors: SKIPPED (--no-motors)")
     else:
-        motors.init()
+        try:
+            motors.init(args.gpio, args.gpio_chip)
+        except (ImportError, RuntimeError, OSError) as e:
+            print(f"[main] GPIO driver {args.gpio} unavailable: {e}")
+            sys.exit(1)
+
+    if args.sim:
+        from server.sim import Simulator
+        simulator = Simulator(speed=args.sim_speed)
+        simulator.start()
 
     # Sirens
     sirens.init()
@@ -47,12 +168,39 @@ def main():
     if args.no_camera:
         print("[main] camera: SKIPPED (--no-camera)")
     else:
-        camera = CameraServer()
-        camera.start(port=args.video_port)
+        if args.video_loop == "process":
+            from server.camera_process import CameraProcess
+            camera = CameraProcess(port=args.video_port, luma=args.collision != "off",
+                                   cameras=args.camera)
+            camera.start()
+        else:
+            camera = CameraServer(args.camera)
+            camera.start(port=args.video_port, dedicated_loop=args.video_loop == "dedicated")
+        if blackbox:
+            camera.output(args.blackbox_stream).add_tap(blackbox.record_frame, copy=True)
+        if telemetry:
+            camera.output("main").add_tap(telemetry.record_frame)
+
+    # Collision detection
+    if args.collision != "off":
+        from server.collision import CollisionMonitor, SyntheticSource
+        read_frame = camera.lores_source() if camera else None
+        if read_frame is None:
+            print("[main] collision: no lores stream, using synthetic source")
+            read_frame = SyntheticSource().read
+        collision = CollisionMonitor(read_frame, enforce=args.collision == "enforce",
+                                     budget_ms=args.collision_budget_ms)
+        collision.start()
+
+    if telemetry:
+        telemetry.start()
 
     # Discovery beacon
     beacon_start()
 
+    # Pin what is running now; the layout's watcher picks up later threads
+    cpulayout.start()
+
     # Signal handling
     def _shutdown(sig, frame):
         print(f"\n[main] received signal {sig}, shutting down...")
@@ -60,29 +208,129 @@ def main():
             motors.stop()
         except Exception:
             pass
+        if collision:
+            collision.stop()
+        if simulator:
+            simulator.stop()
         motors.cleanup()
         if camera:
             camera.stop()
         sirens.cleanup()
         beacon_stop()
+        if telemetry:
+            telemetry.stop()
+        profiler.stop(wait=True)
         print("[main] shutdown complete")
         sys.exit(0)
 
     signal.signal(signal.SIGTERM, _shutdown)
     signal.signal(signal.SIGINT, _shutdown)
+    install_signal(profiler)
+    if blackbox and hasattr(signal, "SIGUSR2"):
+        signal.signal(signal.SIGUSR2, lambda sig, frame: blackbox.dump("signal"))
 
     from server.discovery import _get_local_ip
     ip = _get_local_ip()
     print(f"[main] IP: {ip}")
     print(f"[main] WebSocket: ws://{ip}:{args.ws_port}")
     print(f"[main] Video: http://{ip}:{args.video_port}/video_feed")
-    print(f"[main] GPIO: {'available' if motors._has_gpio else 'stub'}")
+    metrics_port = args.video_port
+    if camera is not None and args.video_loop == "process":
+        metrics_port = args.metrics_port or args.video_port + 1
+        print(f"[main] Metrics: http://{ip}:{args.video_port}/metrics (video), "
+              f"http://{ip}:{metrics_port}/metrics (control)")
+    else:
+        print(f"[main] Metrics: http://{ip}:{metrics_port}/metrics")
+    driver = motors.get_driver()
+    print(f"[main] GPIO: {driver.name if driver else 'none'}")
     print("=" * 50)
     print("[main] ready — waiting for client")
 
     # WebSocket server (blocks on asyncio event loop)
-    control = ControlServer(port=args.ws_port)
-    asyncio.run(control.start())
+    control = ControlServer(port=args.ws_port, slow_callback_ms=args.slow_callback_ms)
+    control.add_command("profile", lambda msg: handle_message(profiler, msg))
+    trace_ports = sorted({args.video_port, metrics_port})  # every process serving /trace
+    control.add_command("trace", lambda msg: {"type": "trace", "ports": trace_ports})
+    if blackbox:
+        control.add_tap(blackbox.record_control)
+        control.add_command("blackbox", lambda msg: {
+            "type": "blackbox", "path": blackbox.dump("request"), **blackbox.status()})
+    if telemetry:
+        control.add_tap(telemetry.record_control)
+    if camera is not None:
+        control.add_command("roi", lambda msg: _set_roi(camera, collision, msg))
+        control.add_state_source("roi", camera.roi)
+        control.add_state_source("sources", camera.sources)
+    if collision:
+        control.add_state_source("collision", collision.status)
+    if simulator:
+        control.add_state_source("sim", simulator.status)
+    if camera is not None and args.video_loop == "process":
+        control.add_state_source("camera", camera.status)
+    control.add_state_source("gc", gcmode.status)
+    extra = []
+    if camera is None or args.video_loop == "process":
+        # No camera HTTP in this process: serve its /metrics here
+        from server.httpd import HttpServer
+        http = HttpServer("metrics")
+        metrics.add_routes(http)
+        extra.append(http.serve("0.0.0.0", metrics_port))
+    elif args.video_loop == "shared":
+        extra.append(camera.serve(args.video_port))
+    gcmode.freeze()  # startup is over: everything alive now lives until shutdown
+    asyncio.run(_serve(control, extra))
+
+
+def _set_roi(camera, collision, msg: dict) -> dict | None:
+    """Handle {"type": "roi"}; replies only on error (the state stream carries the ROI)."""
+    source = msg.get("source")
+    if source is not None and source not in camera.sources():
+        return {"type": "error", "message": f"roi: unknown camera source {source!r}"}
+    before = camera.roi()
+    try:
+        after = camera.set_roi(msg.get("zoom", 1.0), msg.get("x", 0.5), msg.get("y", 0.5),
+                               source=source)
+    except (TypeError, ValueError):
+        return {"type": "error", "message": "roi: zoom, x and y must be numbers"}
+    # The collision monitor watches the primary source
+    if collision and after != before and after["source"] == camera.sources()[0]:
+        collision.reset()
+    return None
+
+
+def _gc_thresholds(text: str) -> tuple:
+    try:
+        return gcmode.parse_thresholds(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+def _cpu_layout(text: str) -> str:
+    try:
+        cpulayout.parse_layout(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+    return text
+
+
+def _qos_spec(text: str) -> str:
+    try:
+        netqos.parse_spec(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+    return text
+
+
+def _camera_spec(text: str) -> tuple:
+    try:
+        return parse_camera_spec(text)
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e)) from None
+
+
+async def _serve(control: ControlServer, extra: list):
+    """Run the control server and any HTTP servers sharing its loop."""
+    await asyncio.gather(control.start(), *extra)
 
 
 if __name__ == "__main__":
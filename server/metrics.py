@@ -0,0 +1,285 @@
+"""Process-wide metrics registry with Prometheus text exposition.
+
+Counters, gauges and fixed-bucket histograms cheap enough for hot
+paths: an update is an attribute add or one bisect plus a list index,
+with no locks. Each series is normally written from a single thread
+(control loop, video loop, encoder), so increments are not lost in
+practice; a rare lost update under cross-thread contention is accepted
+in exchange for a lock-free fast path.
+
+Modules declare their metrics at import time:
+
+    FRAMES = metrics.counter("robothector_frames_total", "Frames", ("stream",))
+    FRAMES.labels(stream="main").inc()
+
+Metrics without label names return the single series directly. Values
+that are only interesting when scraped (temperature, RSS) are gauges
+backed by a function. Served at /metrics by add_routes(), next to
+/trace (this process's common.tracing spans).
+"""
+
+import asyncio
+import bisect
+import json
+import os
+import subprocess
+import time
+
+from common import gcmode, tracing
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                   0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+LAG_INTERVAL = 0.1  # seconds between event-loop lag probes
+VCGENCMD_CACHE = 10.0  # seconds a forked `vcgencmd get_throttled` result is reused
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0.0
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def _samples(self, name: str, labels: str):
+        yield name, labels, self.value
+
+
+class Gauge:
+    def __init__(self):
+        self.value = 0.0
+        self._fn = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def inc(self, amount: float = 1.0):
+        self.value += amount
+
+    def dec(self, amount: float = 1.0):
+        self.value -= amount
+
+    def set_function(self, fn):
+        """Evaluate `fn()` at scrape time instead; None omits the sample."""
+        self._fn = fn
+
+    def _samples(self, name: str, labels: str):
+        value = self.value
+        if self._fn is not None:
+            try:
+                value = self._fn()
+            except Exception:
+                value = None
+        if value is not None:
+            yield name, labels, value
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def _samples(self, name: str, labels: str):
+        cumulative = 0
+        sep = "," if labels else ""
+        for bound, n in zip(self.buckets, self.counts):
+            cumulative += n
+            yield f"{name}_bucket", f'{labels}{sep}le="{bound}"', cumulative
+        yield f"{name}_bucket", f'{labels}{sep}le="+Inf"', cumulative + self.counts[-1]
+        yield f"{name}_sum", labels, self.sum
+        yield f"{name}_count", labels, self.count
+
+
+class _Family:
+    """All series of one metric name, keyed by label values."""
+
+    def __init__(self, kind: str, factory, name: str, help_text: str, labelnames: tuple):
+        self.kind = kind
+        self.name = name
+        self.help = help_text
+        self.labelnames = labelnames
+        self._factory = factory
+        self._series: dict = {}
+
+    def labels(self, **values):
+        """Series for these label values, created on first use."""
+        key = tuple(str(values[n]) for n in self.labelnames)
+        series = self._series.get(key)
+        if series is None:
+            series = self._series[key] = self._factory()
+        return series
+
+    def remove(self, **values):
+        """Forget a series, e.g. when a viewer disconnects."""
+        self._series.pop(tuple(str(values[n]) for n in self.labelnames), None)
+
+    def _render(self, lines: list):
+        lines.append(f"# HELP {self.name} {self.help}")
+        lines.append(f"# TYPE {self.name} {self.kind}")
+        for key, series in list(self._series.items()):
+            labels = ",".join(f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, key))
+            for name, sample_labels, value in series._samples(self.name, labels):
+                suffix = f"{{{sample_labels}}}" if sample_labels else ""
+                lines.append(f"{name}{suffix} {_format(value)}")
+
+
+_families: dict = {}
+
+
+def counter(name: str, help_text: str, labelnames: tuple = ()):
+    return _register("counter", Counter, name, help_text, labelnames)
+
+
+def gauge(name: str, help_text: str, labelnames: tuple = ()):
+    return _register("gauge", Gauge, name, help_text, labelnames)
+
+
+def histogram(name: str, help_text: str, labelnames: tuple = (),
+              buckets: tuple = LATENCY_BUCKETS):
+    return _register("histogram", lambda: Histogram(buckets), name, help_text, labelnames)
+
+
+def _register(kind, factory, name, help_text, labelnames):
+    family = _families.get(name)
+    if family is None:
+        family = _families[name] = _Family(kind, factory, name, help_text, tuple(labelnames))
+    return family if labelnames else family.labels()
+
+
+def render() -> str:
+    """All metrics in Prometheus text exposition format."""
+    lines = []
+    for family in list(_families.values()):
+        family._render(lines)
+    return "\n".join(lines) + "\n"
+
+
+def add_routes(http):
+    """Register GET /metrics and GET /trace on a server.httpd.HttpServer."""
+    from server.httpd import Response
+
+    @http.route("/metrics")
+    async def metrics_endpoint(request):
+        # Gauge functions read sysfs or fork vcgencmd: keep them off the control loop
+        body = await asyncio.to_thread(render)
+        return Response(body.encode(), CONTENT_TYPE)
+
+    @http.route("/trace")
+    async def trace_endpoint(request):
+        # Megabytes of JSON: serialize off the loop
+        body = await asyncio.to_thread(_trace_json)
+        return Response(body, "application/json")
+
+
+def _trace_json() -> bytes:
+    return json.dumps(tracing.dump()).encode()
+
+
+# --- Garbage collector ---
+
+GC_PAUSE = histogram("robothector_gc_pause_seconds",
+                     "Garbage-collector pauses (common.gcmode)", ("generation", "trigger"))
+
+
+def watch_gc():
+    """Record every collection's pause in GC_PAUSE."""
+    series = {}
+
+    def _observe(generation: int, seconds: float, trigger: str):
+        key = (generation, trigger)
+        if key not in series:
+            series[key] = GC_PAUSE.labels(generation=str(generation), trigger=trigger)
+        series[key].observe(seconds)
+
+    gcmode.add_listener(_observe)
+
+
+# --- Event loop lag ---
+
+LOOP_LAG = histogram("robothector_event_loop_lag_seconds",
+                     "Extra delay of a 100 ms asyncio sleep", ("loop",))
+
+
+async def watch_loop_lag(name: str, window=None):
+    """Record how late the running loop wakes from LAG_INTERVAL sleeps.
+
+    Args:
+        name: The `loop` label.
+        window: Optional deque that also receives each sample (seconds).
+    """
+    series = LOOP_LAG.labels(loop=name)
+    loop = asyncio.get_running_loop()
+    while True:
+        t0 = loop.time()
+        await asyncio.sleep(LAG_INTERVAL)
+        lag = max(0.0, loop.time() - t0 - LAG_INTERVAL)
+        series.observe(lag)
+        if window is not None:
+            window.append(lag)
+
+
+# --- System gauges, read at scrape time ---
+
+def cpu_temperature() -> float | None:
+    """SoC temperature in °C, or None where there is no thermal zone."""
+    try:
+        with open("/sys/class/thermal/thermal_zone0/temp") as f:
+            return int(f.read()) / 1000
+    except (OSError, ValueError):
+        return None
+
+
+_vcgencmd = {"time": -VCGENCMD_CACHE, "value": None}
+
+
+def _throttled() -> int | None:
+    """Firmware throttling bitmask (sysfs, else vcgencmd get_throttled, cached)."""
+    try:
+        with open("/sys/devices/platform/soc/soc:firmware/get_throttled") as f:
+            return int(f.read(), 16)
+    except (OSError, ValueError):
+        pass
+    now = time.monotonic()
+    if now - _vcgencmd["time"] < VCGENCMD_CACHE:
+        return _vcgencmd["value"]
+    try:
+        out = subprocess.run(["vcgencmd", "get_throttled"], capture_output=True,
+                             text=True, timeout=1).stdout
+        value = int(out.strip().split("=")[1], 16)
+    except (OSError, subprocess.TimeoutExpired, IndexError, ValueError):
+        value = None
+    _vcgencmd.update(time=now, value=value)
+    return value
+
+
+def _rss_bytes() -> int | None:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        return None
+
+
+gauge("robothector_cpu_temperature_celsius", "SoC temperature").set_function(cpu_temperature)
+gauge("robothector_throttled_state",
+      "Firmware throttling bitmask (bit0 under-voltage, bit2 throttled, bit16+ = has occurred)"
+      ).set_function(_throttled)
+gauge("process_resident_memory_bytes", "Resident set size").set_function(_rss_bytes)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format(value) -> str:
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
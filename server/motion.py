@@ -0,0 +1,186 @@
+"""Timed motion programs executed on the server.
+
+A driver uploads a short list of steps and the control loop runs them
+against its own clock, so a maneuver's timing no longer depends on a
+steady stream of drive messages over a lossy link:
+
+    {"type": "motion", "id": "turn-1", "steps": [
+        {"left": 0.6, "right": 0.3, "duration": 1.5},   # arc
+        {"spin": 90},                                   # open-loop, + = clockwise
+        {"wait": 0.3}                                   # stopped
+    ]}
+
+Step boundaries are scheduled from the program start, so lateness of
+one step does not push back the next. Programs are validated against
+MAX_STEPS / MAX_STEP_DURATION / MAX_PROGRAM_DURATION before they start,
+still go through the motors forward gate, and are cancelled by stick
+input, {"type": "motion", "action": "cancel"}, driver disconnect or the
+watchdog's safe mode.
+"""
+
+import asyncio
+
+from server import motors
+
+MAX_STEPS = 32
+MAX_STEP_DURATION = 5.0      # seconds
+MAX_PROGRAM_DURATION = 10.0  # seconds
+SPIN_RATE = 300.0            # deg/s spinning at full power; open-loop, calibrate on the floor
+PREEMPT_THRESHOLD = 0.15     # stick deflection that cancels a running program
+
+
+class MotionError(ValueError):
+    """Program rejected by validation."""
+
+
+class MotionRunner:
+    """Runs one program at a time on the running event loop.
+
+    Args:
+        notify: Called with a {"type": "motion", ...} event dict when a
+            program starts, finishes, is cancelled or fails.
+    """
+
+    def __init__(self, notify):
+        self._notify = notify
+        self._task = None
+        self._id = None
+        self._step = 0
+        self._steps = 0
+        self._max_late_ms = 0.0
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self, msg: dict):
+        """Validate and start the program in `msg`, replacing any running one.
+
+        Raises:
+            MotionError: The program is malformed or exceeds the limits.
+        """
+        plan = compile_steps(msg.get("steps"))
+        self.cancel("replaced")
+        self._id = msg.get("id")
+        self._step, self._steps = 0, len(plan)
+        self._max_late_ms = 0.0
+        self._task = asyncio.get_running_loop().create_task(self._run(plan))
+        self._notify(self._event("started", duration=round(sum(d for _, _, d in plan), 3)))
+
+    def cancel(self, reason: str = "cancelled") -> bool:
+        """Stop a running program; returns whether one was running."""
+        task = self._task
+        if task is None:
+            return False
+        self._task = None
+        task.cancel()
+        _safe_stop()
+        self._notify(self._event("cancelled", reason=reason))
+        return True
+
+    def preempted_by(self, axis_x: float, axis_y: float) -> bool:
+        """Cancel if the stick moved; True when the stick is in control."""
+        if max(abs(axis_x), abs(axis_y)) < PREEMPT_THRESHOLD:
+            return not self.running
+        self.cancel("stick")
+        return True
+
+    def status(self) -> dict:
+        return {
+            "running": self.running,
+            "id": self._id,
+            "step": self._step,
+            "steps": self._steps,
+            "max_late_ms": round(self._max_late_ms, 2),
+        }
+
+    async def _run(self, plan: list):
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        at = start
+        error = None
+        try:
+            for i, (left, right, duration) in enumerate(plan):
+                self._step = i
+                self._max_late_ms = max(self._max_late_ms, (loop.time() - at) * 1000)
+                if left == right == 0.0:
+                    motors.stop()
+                else:
+                    motors.set_motors(left, right)
+                at += duration
+                await asyncio.sleep(at - loop.time())
+            motors.stop()
+        except asyncio.CancelledError:
+            return  # cancel() has stopped the motors and notified
+        except Exception as e:
+            error = e
+        finally:
+            # A terminal event must always follow: it releases the dead-man hold
+            if self._task is asyncio.current_task():
+                self._task = None
+        if error is not None:
+            _safe_stop()
+            _log(f"program {self._id!r} failed at step {self._step}: {error!r}")
+            self._notify(self._event("error", message=str(error) or type(error).__name__))
+            return
+        self._step = len(plan)
+        self._notify(self._event("done", elapsed=round(loop.time() - start, 3)))
+
+    def _event(self, status: str, **extra) -> dict:
+        event = {"type": "motion", "status": status, "id": self._id}
+        event.update(extra)
+        return event
+
+
+def compile_steps(steps) -> list[tuple[float, float, float]]:
+    """Turn a step list into (left, right, duration) segments.
+
+    Raises:
+        MotionError: Unknown step kind, bad values, or limits exceeded.
+    """
+    if not isinstance(steps, list) or not steps:
+        raise MotionError("steps must be a non-empty list")
+    if len(steps) > MAX_STEPS:
+        raise MotionError(f"at most {MAX_STEPS} steps")
+    plan = []
+    for step in steps:
+        if not isinstance(step, dict):
+            raise MotionError("each step must be an object")
+        try:
+            if "spin" in step:
+                degrees = float(step["spin"])
+                direction = 1.0 if degrees >= 0 else -1.0
+                plan.append((direction, -direction, abs(degrees) / SPIN_RATE))
+            elif "wait" in step:
+                plan.append((0.0, 0.0, float(step["wait"])))
+            elif "left" in step or "right" in step:
+                plan.append((_clamp(float(step.get("left", 0.0))),
+                             _clamp(float(step.get("right", 0.0))),
+                             float(step["duration"])))
+            else:
+                raise MotionError(f"unknown step {step}")
+        except (KeyError, TypeError, ValueError) as e:
+            if isinstance(e, MotionError):
+                raise
+            raise MotionError(f"bad step {step}: {e}") from None
+    for _, _, duration in plan:
+        if not 0.0 <= duration <= MAX_STEP_DURATION:
+            raise MotionError(f"step duration must be 0-{MAX_STEP_DURATION} s")
+    if sum(d for _, _, d in plan) > MAX_PROGRAM_DURATION:
+        raise MotionError(f"program longer than {MAX_PROGRAM_DURATION} s")
+    return plan
+
+
+def _clamp(value: float) -> float:
+    return max(-1.0, min(1.0, value))
+
+
+def _safe_stop():
+    try:
+        motors.stop()
+    except Exception:
+        pass
+
+
+def _log(msg: str):
+    print(f"[motion] {msg}")
@@ -6,44 +6,71 @@ Uses BCM pin numbering. Verified pinout from pinout.md:
   GPIO 19 = IN2 (black)  /
   GPIO 13 = IN3 (white)  \\ Motor B
   GPIO  6 = IN4 (grey)   /
+
+Every write is computed as one (IN1, IN2, IN3, IN4) level tuple, sent to
+the GPIO driver chosen in init() (server.gpio: gpiod, RPi.GPIO, pigpio or
+a mock) and to any sinks registered with add_output() (the simulator in
+server.sim). Writes are serialized by a lock, since the dead-man thread
+(server.deadman) stops the motors from outside the event loop.
 """
 
-try:
-    import RPi.GPIO as GPIO
-    _has_gpio = True
-except ImportError:
-    _has_gpio = False
+import threading
+import time
+
+from common import tracing
+from server import gpio, metrics
 
 # BCM pin numbers — verified against physical wiring
 IN1 = 26  # Motor A forward
 IN2 = 19  # Motor A backward
 IN3 = 13  # Motor B forward
 IN4 = 6   # Motor B backward
+PINS = (IN1, IN2, IN3, IN4)
+
+_GPIO_WRITE = metrics.histogram("robothector_gpio_write_seconds",
+                                "Time to write all four H-bridge inputs", ("op",))
+_GPIO_SET = _GPIO_WRITE.labels(op="set")
+_GPIO_STOP = _GPIO_WRITE.labels(op="stop")
 
 _initialized = False
+_driver = None
+_forward_open = True  # forward throttle allowed; closed by the collision monitor
+_outputs: list = []   # callables receiving every (IN1, IN2, IN3, IN4) write
+_levels = (0, 0, 0, 0)
+_setpoint = (0.0, 0.0)  # (left, right) of the last set_motors(), after the forward gate
+# Reentrant: the SIGINT/SIGTERM handler stops the motors on the main thread,
+# which may be inside a control-loop write already; an all-low write is idempotent.
+_write_lock = threading.RLock()
+
 
+def init(driver: str = "auto", chip: str | None = None):
+    """Open the GPIO driver and drive all inputs low.
 
-def init():
-    global _initialized
-    if _has_gpio:
-        GPIO.setmode(GPIO.BCM)
-        GPIO.setwarnings(False)
-        for pin in (IN1, IN2, IN3, IN4):
-            GPIO.setup(pin, GPIO.OUT)
-            GPIO.output(pin, GPIO.LOW)
+    Args:
+        driver: One of server.gpio.DRIVERS, or "auto".
+        chip: gpiochip device for the gpiod driver (default: the Pi's).
+    """
+    global _initialized, _driver
+    _driver = gpio.open_driver(driver, PINS, chip)
     _initialized = True
-    _log("motors initialized" + (" (GPIO)" if _has_gpio else " (stub)"))
+    _log(f"motors initialized ({_driver.name})")
 
 
 def cleanup():
-    global _initialized
+    global _initialized, _driver
     stop()
-    if _has_gpio:
-        GPIO.cleanup()
+    if _driver is not None:
+        _driver.close()
+        _driver = None
     _initialized = False
     _log("motors cleaned up")
 
 
+def get_driver():
+    """The open GPIO driver, or None before init()."""
+    return _driver
+
+
 def arcade_mix(axis_x: float, axis_y: float) -> tuple[float, float]:
     """Convert arcade joystick input to left/right motor speeds.
 
@@ -67,44 +94,99 @@ def set_motors(left: float, right: float):
     Currently digital only (on/off per direction). PWM speed control can be
     added later using the L298N ENA/ENB pins.
     """
-    _set_motor_a(left)
-    _set_motor_b(right)
+    global _setpoint
+    left, right = _apply_forward_gate(left, right)
+    _setpoint = (left, right)
+    _write(pin_levels(left, right), _GPIO_SET)
+
+
+def pin_levels(left: float, right: float) -> tuple[int, int, int, int]:
+    """H-bridge input levels (IN1, IN2, IN3, IN4) for left/right speeds."""
+    return _direction(left) + _direction(right)
+
+
+def get_levels() -> tuple[int, int, int, int]:
+    """Levels of the last write."""
+    return _levels
+
+
+def get_setpoint() -> tuple[float, float]:
+    """(left, right) speeds asked for by the last write, after the forward gate."""
+    return _setpoint
+
+
+def add_output(sink):
+    """Also deliver every level tuple to `sink(levels)`."""
+    _outputs.append(sink)
+
+
+def remove_output(sink):
+    if sink in _outputs:
+        _outputs.remove(sink)
+
+
+def set_forward_gate(open_: bool):
+    """Allow or block forward throttle.
+
+    A gate rather than a graded cap: the bridge is driven on/off (see
+    _direction()), so any cap above the 0.1 switching threshold would
+    still leave the motors at full forward.
+    """
+    global _forward_open
+    _forward_open = bool(open_)
+
+
+def forward_gate_open() -> bool:
+    return _forward_open
+
+
+def _apply_forward_gate(left: float, right: float) -> tuple[float, float]:
+    """Remove forward throttle while the gate is closed, keeping the turn component.
+
+    Reversing and spinning in place are never blocked, so the robot can
+    always back away from whatever it is approaching.
+    """
+    forward = (left + right) / 2
+    if _forward_open or forward <= 0:
+        return left, right
+    return left - forward, right - forward
 
 
 def stop():
     """Stop both motors immediately."""
-    if _has_gpio:
-        for pin in (IN1, IN2, IN3, IN4):
-            GPIO.output(pin, GPIO.LOW)
+    global _setpoint
+    _setpoint = (0.0, 0.0)
+    _write((0, 0, 0, 0), _GPIO_STOP)
     _log("motors stopped")
 
 
-def _set_motor_a(speed: float):
-    if not _has_gpio:
-        return
-    if speed > 0.1:
-        GPIO.output(IN1, GPIO.HIGH)
-        GPIO.output(IN2, GPIO.LOW)
-    elif speed < -0.1:
-        GPIO.output(IN1, GPIO.LOW)
-        GPIO.output(IN2, GPIO.HIGH)
-    else:
-        GPIO.output(IN1, GPIO.LOW)
-        GPIO.output(IN2, GPIO.LOW)
-
-
-def _set_motor_b(speed: float):
-    if not _has_gpio:
-        return
+def emergency_stop():
+    """stop() without logging, for the dead-man thread (stdout may block)."""
+    global _setpoint
+    _setpoint = (0.0, 0.0)
+    _write((0, 0, 0, 0), _GPIO_STOP)
+
+
+def _direction(speed: float) -> tuple[int, int]:
+    """(forward, backward) input levels for one motor."""
     if speed > 0.1:
-        GPIO.output(IN3, GPIO.HIGH)
-        GPIO.output(IN4, GPIO.LOW)
-    elif speed < -0.1:
-        GPIO.output(IN3, GPIO.LOW)
-        GPIO.output(IN4, GPIO.HIGH)
-    else:
-        GPIO.output(IN3, GPIO.LOW)
-        GPIO.output(IN4, GPIO.LOW)
+        return 1, 0
+    if speed < -0.1:
+        return 0, 1
+    return 0, 0
+
+
+def _write(levels: tuple, timer):
+    global _levels
+    with _write_lock:
+        t0 = time.perf_counter()
+        if _driver is not None:
+            with tracing.span("gpio_write"):
+                _driver.write(levels)
+        timer.observe(time.perf_counter() - t0)
+        _levels = levels
+    for sink in _outputs:
+        sink(levels)
 
 
 def _log(msg: str):
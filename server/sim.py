@@ -0,0 +1,306 @@
+"""Differential-drive physics simulator for the motor output.
+
+Models what the GPIO levels from server.motors would do to the real
+robot: L298N H-bridge, two brushed DC gear motors, wheel inertia and
+tank-drive kinematics. Each wheel is a first-order DC motor with the
+inductance neglected:
+
+    i  = (V - ke * w) / R
+    J dw/dt = kt * i - b * w - coulomb friction
+
+With ENA/ENB tied high, IN1=IN2=LOW shorts the motor through the
+bridge (fast motor stop), which is V = 0 above: back-EMF brakes it.
+Chassis yaw inertia is folded into the per-wheel inertia.
+
+All state is NumPy arrays of shape (n,), so the same model steps one
+robot in real time (Simulator, wired to motors.add_output) or
+thousands of parameter variations at once (sweep()).
+
+Usage:
+    uv run python -m server.main --sim            # simulated robot, pose in state["sim"]
+    uv run python -m server.sim --deadzone 0 0.05 0.1 0.15 --slew 0 4 10 \\
+        --deadman 0.2 0.5 1.0
+"""
+
+import argparse
+import itertools
+import math
+import threading
+import time
+
+import numpy as np
+
+from server import motors
+
+STEP = 0.005               # seconds per integration step (200 Hz)
+
+# Defaults for a ~1 kg chassis on TT gear motors from a 2S pack
+PARAMS = {
+    "supply": 7.4,         # V, battery
+    "bridge_drop": 1.8,    # V, L298N saturation drop (two transistors)
+    "resistance": 5.0,     # ohm, winding
+    "ke": 0.25,            # V*s/rad at the wheel (back-EMF, gearbox included)
+    "kt": 0.25,            # N*m/A at the wheel
+    "inertia": 8e-4,       # kg*m^2 per wheel, rotor + share of chassis mass
+    "viscous": 1e-3,       # N*m*s/rad
+    "coulomb": 0.01,       # N*m, static/dynamic friction torque
+    "wheel_radius": 0.033, # m
+    "track": 0.14,         # m, distance between wheel contact lines
+}
+
+
+class DiffDrive:
+    """Vectorized tank-drive model: n robots stepped together.
+
+    Args:
+        n: Number of simulated robots.
+        **params: Overrides of PARAMS, scalars or arrays of shape (n,).
+    """
+
+    def __init__(self, n: int = 1, **params):
+        unknown = set(params) - set(PARAMS)
+        if unknown:
+            raise ValueError(f"unknown parameters: {', '.join(sorted(unknown))}")
+        self.n = n
+        self.p = {k: np.broadcast_to(np.asarray(params.get(k, v), dtype=float), (n,))
+                  for k, v in PARAMS.items()}
+        self.t = 0.0
+        self.x = np.zeros(n)
+        self.y = np.zeros(n)
+        self.heading = np.zeros(n)  # rad, 0 = +x
+        self.w = np.zeros((2, n))   # wheel speeds rad/s (left, right)
+        self.distance = np.zeros(n)
+
+    def step(self, drive: np.ndarray, dt: float = STEP):
+        """Advance by dt with bridge outputs `drive` of shape (2, n) in [-1, 1].
+
+        -1/0/1 are the digital H-bridge states; fractions model PWM on ENA/ENB.
+        """
+        p = self.p
+        volts = drive * np.maximum(p["supply"] - p["bridge_drop"], 0.0)
+        current = (volts - p["ke"] * self.w) / p["resistance"]
+        torque = p["kt"] * current - p["viscous"] * self.w
+        # Coulomb friction opposes motion; a stopped wheel stays put until
+        # the drive torque overcomes it
+        moving = np.abs(self.w) > 1e-3
+        friction = np.where(moving, np.sign(self.w), np.sign(torque)) * p["coulomb"]
+        stuck = ~moving & (np.abs(torque) <= p["coulomb"])
+        w = self.w + (torque - friction) / p["inertia"] * dt
+        # Friction may stop a wheel but never reverse it within one step
+        w = np.where(moving & (np.sign(w) != np.sign(self.w)), 0.0, w)
+        self.w = np.where(stuck, 0.0, w)
+
+        v_left, v_right = self.w * p["wheel_radius"]
+        v = (v_left + v_right) / 2
+        omega = (v_right - v_left) / p["track"]
+        mid = self.heading + omega * dt / 2
+        self.x += v * np.cos(mid) * dt
+        self.y += v * np.sin(mid) * dt
+        self.heading += omega * dt
+        self.distance += np.abs(v) * dt
+        self.t += dt
+
+    def wheel_speeds(self) -> tuple[np.ndarray, np.ndarray]:
+        """Left/right wheel ground speeds in m/s."""
+        v = self.w * self.p["wheel_radius"]
+        return v[0], v[1]
+
+
+def levels_to_drive(levels: tuple) -> np.ndarray:
+    """(IN1, IN2, IN3, IN4) -> bridge outputs (left, right) in {-1, 0, 1}."""
+    in1, in2, in3, in4 = levels
+    return np.array([[in1 - in2], [in3 - in4]], dtype=float)
+
+
+class Simulator:
+    """One simulated robot following motors' pin writes in real time.
+
+    Args:
+        speed: Simulated seconds per wall-clock second; 0 runs as fast
+            as possible (for scripted runs).
+        **params: Overrides of PARAMS.
+    """
+
+    def __init__(self, speed: float = 1.0, **params):
+        self._model = DiffDrive(1, **params)
+        self._speed = speed
+        self._drive = levels_to_drive((0, 0, 0, 0))
+        self._running = False
+        self._thread = None
+        self._lag_steps = 0
+        self._status = {}
+
+    def set_levels(self, levels: tuple):
+        """motors output sink: latch the new H-bridge inputs."""
+        self._drive = levels_to_drive(levels)
+
+    def start(self):
+        motors.add_output(self.set_levels)
+        self.set_levels(motors.get_levels())
+        self._running = True
+        self._thread = threading.Thread(target=self._loop, name="sim", daemon=True)
+        self._thread.start()
+        _log(f"simulating at {1 / STEP:.0f} Hz"
+             + (f", {self._speed:g}x real time" if self._speed else ", unthrottled"))
+
+    def stop(self):
+        self._running = False
+        motors.remove_output(self.set_levels)
+        if self._thread is not None:
+            self._thread.join(timeout=1.0)
+
+    def status(self) -> dict:
+        """Pose and wheel speeds, for the state stream."""
+        return self._status
+
+    def _loop(self):
+        model = self._model
+        next_time = time.monotonic()
+        while self._running:
+            model.step(self._drive)
+            if model.t - self._status.get("t", 0.0) >= 0.05 or not self._status:
+                self._publish()
+            if not self._speed:
+                continue
+            next_time += STEP / self._speed
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            elif delay < -0.1:
+                # Fell far behind (suspended, overloaded): resync instead of bursting
+                self._lag_steps += 1
+                next_time = time.monotonic()
+
+    def _publish(self):
+        m = self._model
+        v_left, v_right = m.wheel_speeds()
+        self._status = {
+            "t": round(m.t, 3),
+            "x": round(float(m.x[0]), 3),
+            "y": round(float(m.y[0]), 3),
+            "heading": round(math.degrees(float(m.heading[0])) % 360, 1),
+            "v_left": round(float(v_left[0]), 3),
+            "v_right": round(float(v_right[0]), 3),
+            "distance": round(float(m.distance[0]), 3),
+            "resyncs": self._lag_steps,
+        }
+
+
+# --- Offline parameter sweep ---
+
+def sweep(deadzones, slews, deadmans, duration: float = 8.0, go_at: float = 1.0,
+          drop_at: float = 5.0, stick_bias: float = 0.08, stick_noise: float = 0.04,
+          pwm: bool = False, seed: int = 0) -> dict:
+    """Drive every combination of control parameters through one scenario.
+
+    The scenario, with a worn stick (steady bias plus noise on both axes):
+    stick released until `go_at`, then full forward; the link drops at
+    `drop_at` and the last command is held until the deadman fires.
+    Commands arrive at 20 Hz like the client's.
+
+    Args:
+        deadzones: Stick deadzone values (client side).
+        slews: Command slew limits in units/s; 0 = unlimited.
+        deadmans: Watchdog timeouts in seconds.
+        pwm: Model proportional ENA/ENB drive instead of today's on/off.
+
+    Returns:
+        Parameter and metric arrays of shape (n,): creep_m (distance moved
+        with the stick released), rise_s (time from `go_at` to 90 % of top
+        speed), drift_deg (heading change while driving straight), coast_m
+        (distance covered after the link drops). Metrics of a phase the
+        scenario never reaches (`duration` <= `drop_at`, say) are NaN.
+    """
+    combos = np.array(list(itertools.product(deadzones, slews, deadmans)), dtype=float)
+    deadzone, slew, deadman = combos.T
+    n = len(combos)
+    model = DiffDrive(n)
+    rng = np.random.default_rng(seed)
+    send_every = round(0.05 / STEP)
+
+    command = np.zeros((2, n))
+    target = np.zeros((2, n))
+    p = PARAMS
+    top = ((p["supply"] - p["bridge_drop"]) * p["kt"] / p["resistance"] - p["coulomb"]) / (
+        p["kt"] * p["ke"] / p["resistance"] + p["viscous"]) * p["wheel_radius"]
+    rise = np.full(n, np.nan)
+    creep = heading_at_go = coast_from = drift = None
+
+    for i in range(int(round(duration / STEP))):
+        t = i * STEP
+        if t >= go_at and creep is None:
+            creep = model.distance.copy()
+            heading_at_go = model.heading.copy()
+        if t < drop_at and i % send_every == 0:
+            axis_x, axis_y = stick_bias + stick_noise * rng.standard_normal(2)
+            if t >= go_at:
+                axis_y = -1.0
+            x = np.where(np.abs(axis_x) < deadzone, 0.0, axis_x)
+            y = np.where(np.abs(axis_y) < deadzone, 0.0, axis_y)
+            target = np.clip(np.stack([-y + x, -y - x]), -1.0, 1.0)
+        if t >= drop_at:
+            if coast_from is None:
+                coast_from = model.distance.copy()
+                if heading_at_go is not None:
+                    drift = np.degrees(np.abs(model.heading - heading_at_go))
+            target = np.where(t >= drop_at + deadman, 0.0, target)
+
+        max_delta = np.where(slew > 0, slew * STEP, np.inf)
+        command = command + np.clip(target - command, -max_delta, max_delta)
+        drive = command if pwm else np.where(
+            command > 0.1, 1.0, np.where(command < -0.1, -1.0, 0.0))
+        model.step(drive)
+
+        v = (model.w * model.p["wheel_radius"]).mean(axis=0)
+        rise = np.where(np.isnan(rise) & (t >= go_at) & (v >= 0.9 * top), t - go_at, rise)
+
+    missing = np.full(n, np.nan)
+    return {
+        "deadzone": deadzone, "slew": slew, "deadman": deadman,
+        "creep_m": missing if creep is None else creep, "rise_s": rise,
+        "drift_deg": missing if drift is None else drift,
+        "coast_m": missing if coast_from is None else model.distance - coast_from,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep control parameters on the drive model")
+    parser.add_argument("--deadzone", type=float, nargs="+", default=[0.0, 0.05, 0.1, 0.15])
+    parser.add_argument("--slew", type=float, nargs="+", default=[0.0, 4.0, 10.0],
+                        help="Command slew limits in units/s (0 = none)")
+    parser.add_argument("--deadman", type=float, nargs="+", default=[0.2, 0.5, 1.0])
+    parser.add_argument("--pwm", action="store_true", help="Proportional drive instead of on/off")
+    parser.add_argument("--stick-bias", type=float, default=0.08,
+                        help="Steering offset of a worn stick")
+    parser.add_argument("--duration", type=float, default=8.0)
+    parser.add_argument("--drop-at", type=float, default=5.0,
+                        help="Seconds into the run at which the link drops")
+    parser.add_argument("--csv", metavar="PATH", help="Also write all results as CSV")
+    args = parser.parse_args()
+    if not 1.0 < args.drop_at < args.duration:
+        parser.error("--drop-at must be after the stick goes forward (1 s) "
+                     "and before --duration")
+
+    t0 = time.perf_counter()
+    r = sweep(args.deadzone, args.slew, args.deadman, duration=args.duration,
+              drop_at=args.drop_at, pwm=args.pwm, stick_bias=args.stick_bias)
+    elapsed = time.perf_counter() - t0
+    n = len(r["deadzone"])
+
+    columns = ("deadzone", "slew", "deadman", "creep_m", "rise_s", "drift_deg", "coast_m")
+    print("".join(f"{c:>10}" for c in columns))
+    for i in range(n):
+        print("".join(f"{r[c][i]:>10.3f}" for c in columns))
+    print(f"[sim] {n} runs x {args.duration / STEP:.0f} steps in {elapsed:.2f} s")
+
+    if args.csv:
+        np.savetxt(args.csv, np.column_stack([r[c] for c in columns]), delimiter=",",
+                   header=",".join(columns), comments="", fmt="%.5f")
+
+
+def _log(msg: str):
+    print(f"[sim] {msg}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Driver latency vs. spectator count benchmark.
+
+Runs a ControlServer (motors stubbed) in a child process, attaches N
+spectators from a second process, and measures driver ping -> pong
+round-trip time from this process. State is broadcast at a raised rate
+so fan-out cost is visible. Some spectators can be made "slow" (they
+never read) to check that backpressure drops their updates instead of
+delaying the driver.
+
+Usage:
+    uv run python -m server.spectator_bench
+    uv run python -m server.spectator_bench --counts 0 1 8 32 --slow 2 --state-hz 50
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import socket
+import statistics
+import time
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _run_server(port: int, state_hz: float):
+    from server import control, motors
+    control.STATE_INTERVAL = 1.0 / state_hz
+    control._log = motors._log = lambda msg: None
+    asyncio.run(control.ControlServer(port=port).start())
+
+
+def _run_spectators(port: int, count: int, slow: int, ready):
+    import websockets
+
+    async def spectator(index: int):
+        async with websockets.connect(f"ws://127.0.0.1:{port}/?role=spectator") as ws:
+            if index < slow:
+                await asyncio.Future()  # never read: the server must drop for us
+            async for _ in ws:
+                pass
+
+    async def main():
+        tasks = [asyncio.create_task(spectator(i)) for i in range(count)]
+        await asyncio.sleep(0.5)
+        ready.set()
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+
+
+async def _measure(port: int, pings: int, rate: float) -> list[float]:
+    import websockets
+
+    rtts = []
+    async with websockets.connect(f"ws://127.0.0.1:{port}") as ws:
+        for _ in range(pings):
+            t0 = time.perf_counter()
+            await ws.send(json.dumps({"type": "drive", "axis_x": 0.0, "axis_y": 0.0}))
+            await ws.send(json.dumps({"type": "ping"}))
+            while True:
+                msg = json.loads(await ws.recv())
+                if msg.get("type") == "pong":
+                    break
+            rtts.append((time.perf_counter() - t0) * 1000)
+            await asyncio.sleep(1.0 / rate)
+    return rtts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Driver latency vs. spectator count")
+    parser.add_argument("--counts", type=int, nargs="+", default=[0, 1, 4, 16, 64])
+    parser.add_argument("--slow", type=int, default=0, help="Spectators that never read")
+    parser.add_argument("--pings", type=int, default=300)
+    parser.add_argument("--rate", type=float, default=50.0, help="Driver messages per second")
+    parser.add_argument("--state-hz", type=float, default=50.0, help="State broadcast rate")
+    args = parser.parse_args()
+
+    port = _free_port()
+    server = multiprocessing.Process(target=_run_server, args=(port, args.state_hz), daemon=True)
+    server.start()
+    time.sleep(1.0)
+
+    print(f"{'spectators':>10} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8}")
+    try:
+        for count in args.counts:
+            ready = multiprocessing.Event()
+            watchers = multiprocessing.Process(
+                target=_run_spectators, args=(port, count, min(args.slow, count), ready), daemon=True
+            )
+            watchers.start()
+            ready.wait(timeout=10)
+            rtts = sorted(asyncio.run(_measure(port, args.pings, args.rate)))
+            watchers.terminate()
+            watchers.join()
+            print(f"{count:>10} {statistics.median(rtts):>8.2f} "
+                  f"{rtts[int(len(rtts) * 0.95) - 1]:>8.2f} "
+                  f"{rtts[int(len(rtts) * 0.99) - 1]:>8.2f} {rtts[-1]:>8.2f}")
+    finally:
+        server.terminate()
+
+
+if __name__ == "__main__":
+    main()
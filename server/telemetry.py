@@ -0,0 +1,491 @@
+"""Long-term telemetry log, written in few large appends to spare the SD card.
+
+A sampler thread takes one fixed-size record every 1/hz seconds, plus
+one per connection or watchdog event (stamped when the event happened,
+with the other fields as of the next sample):
+
+  ts_ns    i64  server clock (server/clock.py)
+  left     f32  motor setpoints after the forward gate, -1.0..1.0
+  right    f32
+  levels   u8   H-bridge outputs, bits 3..0 = IN1..IN4
+  flags    u8   bit 0 driver connected, bit 1 safe mode
+  event    u16  index into EVENTS (0 = periodic sample)
+  fps      f32  video frames per second over the last FPS_WINDOW
+  temp_c   f32  SoC temperature
+  rtt_ms   f32  round trip the driver's client reported in its last ping
+
+32 bytes, NaN where a value is unknown. Records collect in memory, and
+a writer thread appends them to the current segment only in whole
+BLOCK-sized chunks: once BATCH bytes are pending, or `flush` seconds
+after the oldest pending record, with the last block padded by empty
+(ts_ns = 0) records. The header takes one block, so every write starts
+on a block boundary. Flash pages are rewritten whole, so this keeps
+write amplification at one page per BATCH instead of one per sample.
+Segments are closed at `segment_bytes`, gzip-compressed (about 5x) and
+pruned oldest first beyond `keep_bytes`. fsync policy: "never" (leave
+it to the kernel's writeback), "segment" (when a segment is closed) or
+"write" (after every append).
+
+Nothing here blocks the control loop: the control tap and the frame tap
+only append to a deque or bump a counter, and a stalled card only
+delays the writer, while the sampler drops records beyond MAX_PENDING.
+
+Segment:
+  block 0:  b"RHTL" u8 version  u16 record_size  u32 meta_len  meta JSON, zero padded
+  records:  RECORD, appended in multiples of BLOCK
+
+Reader:
+    uv run python -m server.main --telemetry 10 --telemetry-dir telemetry
+    uv run python -m server.telemetry telemetry/                     # segments and events
+    uv run python -m server.telemetry telemetry/ --csv out.csv \\
+        --since 2026-10-19T12:00 --until 2026-10-19T12:30
+    uv run python -m server.telemetry telemetry/ --csv - --events   # events only, to stdout
+"""
+
+import argparse
+import collections
+import csv
+import datetime
+import gzip
+import json
+import math
+import os
+import shutil
+import struct
+import sys
+import threading
+import time
+
+from server import metrics, motors
+from server.clock import now_ns
+
+MAGIC = b"RHTL"
+VERSION = 1
+HEADER = struct.Struct("<4sBHI")
+RECORD = struct.Struct("<qffBBHfff")
+FIELDS = ("ts_ns", "left", "right", "levels", "flags", "event", "fps", "temp_c", "rtt_ms")
+EVENTS = ("sample", "driver_connected", "driver_disconnected", "deadman", "safe_mode",
+          "motion", "slow_callback")
+FSYNC = ("never", "segment", "write")
+DRIVER, SAFE_MODE = 1, 2          # flags bits
+BLOCK = 4096                      # write and alignment unit (flash page / filesystem block)
+BATCH = 64 << 10                  # pending bytes that trigger a write
+MAX_PENDING = 4 << 20             # sampler drops records beyond this while the card stalls
+WRITE_POLL = 1.0                  # seconds between writer checks
+FPS_WINDOW = 1.0                  # seconds behind the fps field
+SUFFIX = ".rtl"
+
+_RECORDS = metrics.counter("robothector_telemetry_records_total", "Telemetry records taken")
+_DROPPED = metrics.counter("robothector_telemetry_dropped_total",
+                           "Telemetry records dropped while the writer was behind")
+_WRITTEN = metrics.counter("robothector_telemetry_written_bytes_total",
+                           "Bytes appended to telemetry segments (before compression)")
+_WRITE = metrics.histogram("robothector_telemetry_write_seconds",
+                           "Time of one telemetry append, fsync included",
+                           buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                                    1.0, 2.5))
+
+
+class TelemetryLogger:
+    """Sampler and writer threads for one telemetry directory.
+
+    Args:
+        out_dir: Where segments go.
+        hz: Periodic samples per second.
+        flush: Longest time a record waits in memory, in seconds.
+        fsync: One of FSYNC.
+        segment_bytes: Size at which a segment is closed and compressed.
+        keep_bytes: Total size of the directory's segments to keep.
+    """
+
+    def __init__(self, out_dir: str = "telemetry", hz: float = 10.0, flush: float = 60.0,
+                 fsync: str = "segment", segment_bytes: int = 8 << 20,
+                 keep_bytes: int = 256 << 20):
+        if fsync not in FSYNC:
+            raise ValueError(f"telemetry fsync must be one of {', '.join(FSYNC)}")
+        self._out_dir = out_dir
+        self._interval = 1.0 / hz
+        self._flush = flush
+        self._fsync = fsync
+        self._segment_bytes = max(segment_bytes, 2 * BLOCK)
+        self._keep_bytes = keep_bytes
+        self._events = collections.deque(maxlen=1024)  # (ts_ns, event index)
+        self._flags = 0
+        self._frames = 0
+        self._rtt_ms = math.nan
+        self._pending = bytearray()
+        self._oldest = None      # monotonic time the oldest pending record was taken
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._threads = []
+        self._fd = None
+        self._path = None
+        self._size = 0
+
+    # --- Taps (any thread, never block) ---
+
+    def record_control(self, kind: str, text):
+        """ControlServer tap: events, and the RTT carried by pings."""
+        if kind == "command":
+            self._flags &= ~SAFE_MODE  # any message ends safe mode
+            if isinstance(text, str) and '"rtt_ms"' in text:
+                try:
+                    self._rtt_ms = float(json.loads(text)["rtt_ms"])
+                except (ValueError, KeyError, TypeError):
+                    pass
+            return
+        event = json.loads(text)["event"]
+        if event == "driver_connected":
+            self._flags = DRIVER
+        elif event == "driver_disconnected":
+            self._flags = 0
+            self._rtt_ms = math.nan
+        elif event == "safe_mode":
+            self._flags |= SAFE_MODE
+        if event in EVENTS:
+            self._events.append((now_ns(), EVENTS.index(event)))
+
+    def record_frame(self, seq: int, sensor_ns: int, jpeg):
+        """StreamingOutput or RingOutput tap: counts frames for the fps field."""
+        self._frames += 1
+
+    # --- Lifecycle ---
+
+    def start(self):
+        for name, target in (("telemetry", self._sample_loop),
+                             ("telemetry-writer", self._write_loop)):
+            thread = threading.Thread(target=target, name=name, daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        _log(f"{1 / self._interval:g} Hz to {self._out_dir}/, flushed every {self._flush:g} s "
+             f"or {BATCH >> 10} KiB, fsync {self._fsync}, "
+             f"{self._segment_bytes / (1 << 20):g} MiB segments, "
+             f"keeping {self._keep_bytes / (1 << 20):g} MiB")
+
+    def stop(self):
+        """Write what is pending, close and compress the segment."""
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=10.0)
+        self._threads = []
+
+    # --- Sampler ---
+
+    def _sample_loop(self):
+        next_time = time.monotonic()
+        counts = collections.deque([(next_time, self._frames)])  # within FPS_WINDOW
+        while not self._stop.is_set():
+            next_time += self._interval
+            delay = next_time - time.monotonic()
+            if delay > 0:
+                self._stop.wait(delay)
+            elif delay < -1.0:
+                next_time = time.monotonic()  # suspended: resync instead of bursting
+            now = time.monotonic()
+            counts.append((now, self._frames))
+            while now - counts[1][0] >= FPS_WINDOW:
+                counts.popleft()
+            (start, first), (_, count) = counts[0], counts[-1]
+            fps = (count - first) / (now - start) if now > start else math.nan
+            left, right = motors.get_setpoint()
+            in1, in2, in3, in4 = motors.get_levels()
+            temp = metrics.cpu_temperature()
+            values = (left, right, in1 << 3 | in2 << 2 | in3 << 1 | in4, self._flags)
+            tail = (fps, math.nan if temp is None else temp, self._rtt_ms)
+            records = []
+            while self._events:
+                ts, event = self._events.popleft()
+                records.append(RECORD.pack(ts, *values, event, *tail))
+            records.append(RECORD.pack(now_ns(), *values, 0, *tail))
+            self._queue(b"".join(records), len(records))
+
+    def _queue(self, data: bytes, count: int):
+        with self._lock:
+            if len(self._pending) + len(data) > MAX_PENDING:
+                _DROPPED.inc(count)
+                return
+            if not self._pending:
+                self._oldest = time.monotonic()
+            self._pending += data
+        _RECORDS.inc(count)
+
+    # --- Writer ---
+
+    def _write_loop(self):
+        try:
+            os.makedirs(self._out_dir, exist_ok=True)
+        except OSError as e:
+            _log(f"cannot create {self._out_dir}: {e}")
+            return
+        for name in _segment_names(self._out_dir):
+            if name.endswith(SUFFIX):  # left open by a crash or power loss
+                self._compress(os.path.join(self._out_dir, name))
+        while True:
+            stopping = self._stop.wait(WRITE_POLL)
+            data = self._take(stopping)
+            if data:
+                self._append(data)
+            if stopping:
+                self._close()
+                return
+
+    def _take(self, everything: bool) -> bytes | None:
+        """Pending records to write now, as whole blocks."""
+        with self._lock:
+            pending = self._pending
+            if not pending:
+                return None
+            if everything or time.monotonic() - self._oldest >= self._flush:
+                data = bytes(pending)
+                data += bytes(-len(data) % BLOCK)  # empty records up to the block boundary
+                pending.clear()
+            elif len(pending) >= BATCH:
+                n = len(pending) - len(pending) % BLOCK
+                data = bytes(pending[:n])
+                del pending[:n]
+                self._oldest = time.monotonic()  # the remainder is at most one block old
+            else:
+                return None
+        return data
+
+    def _append(self, data: bytes):
+        t0 = time.perf_counter()
+        try:
+            if self._fd is None:
+                self._open()
+            view = memoryview(data)
+            while view:
+                view = view[os.write(self._fd, view):]
+            if self._fsync == "write":
+                os.fsync(self._fd)
+        except OSError as e:
+            _log(f"could not write {self._path}: {e}; {len(data) // RECORD.size} records lost")
+            self._close()
+            return
+        _WRITE.observe(time.perf_counter() - t0)
+        _WRITTEN.inc(len(data))
+        self._size += len(data)
+        if self._size >= self._segment_bytes:
+            self._close()
+
+    def _open(self):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        path = os.path.join(self._out_dir, f"telemetry-{stamp}{SUFFIX}")
+        n = 1
+        while os.path.exists(path) or os.path.exists(path + ".gz"):
+            n += 1
+            path = os.path.join(self._out_dir, f"telemetry-{stamp}-{n}{SUFFIX}")
+        meta = json.dumps({
+            "created": time.time(),
+            "clock_ns": now_ns(),
+            "hz": 1 / self._interval,
+            "fields": FIELDS,
+            "events": EVENTS,
+        }).encode()
+        header = HEADER.pack(MAGIC, VERSION, RECORD.size, len(meta)) + meta
+        header += bytes(-len(header) % BLOCK)
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._path = path
+        os.write(self._fd, header)
+        self._size = len(header)
+
+    def _close(self):
+        """Close the current segment, then compress it and prune old ones."""
+        if self._fd is None:
+            return
+        fd, path, self._fd = self._fd, self._path, None
+        try:
+            if self._fsync != "never":
+                os.fsync(fd)
+        except OSError as e:
+            _log(f"fsync {path}: {e}")
+        os.close(fd)
+        self._compress(path)
+        self._prune()
+
+    def _compress(self, path: str):
+        tmp = path + ".gz.tmp"
+        try:
+            with open(path, "rb") as src, open(tmp, "wb", buffering=BATCH) as raw:
+                with gzip.GzipFile(os.path.basename(path), "wb", fileobj=raw) as dst:
+                    shutil.copyfileobj(src, dst, BATCH)
+                if self._fsync != "never":
+                    raw.flush()
+                    os.fsync(raw.fileno())
+            os.replace(tmp, path + ".gz")
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError as e:
+            _log(f"could not compress {path}: {e}")
+            return
+        _log(f"closed {path} ({size / 1024:.1f} KiB -> "
+             f"{os.path.getsize(path + '.gz') / 1024:.1f} KiB)")
+
+    def _prune(self):
+        names = [n for n in _segment_names(self._out_dir) if n.endswith(".gz")]
+        sizes = {n: os.path.getsize(os.path.join(self._out_dir, n)) for n in names}
+        total = sum(sizes.values())
+        for name in names:
+            if total <= self._keep_bytes:
+                break
+            try:
+                os.remove(os.path.join(self._out_dir, name))
+            except OSError:
+                continue
+            total -= sizes[name]
+
+
+def _segment_names(out_dir: str) -> list:
+    """Segment file names, oldest first."""
+    return sorted(n for n in os.listdir(out_dir)
+                  if n.startswith("telemetry-") and n.endswith((SUFFIX, SUFFIX + ".gz")))
+
+
+# --- Reader ---
+
+def read_segment(path: str):
+    """Open a segment (.rtl or .rtl.gz).
+
+    Returns:
+        (meta, records): the header's JSON and an iterator of record
+        tuples in FIELDS order, empty padding skipped.
+
+    Raises:
+        ValueError: Not a telemetry segment.
+    """
+    meta, f = _open_segment(path)
+    return meta, _records(f)
+
+
+def _open_segment(path: str):
+    f = gzip.open(path, "rb") if path.endswith(".gz") else open(path, "rb")
+    head = f.read(BLOCK)
+    try:
+        magic, version, record_size, meta_len = HEADER.unpack_from(head)
+    except struct.error:
+        magic = None
+    if magic != MAGIC or record_size != RECORD.size:
+        f.close()
+        raise ValueError(f"{path}: not a telemetry segment")
+    return json.loads(head[HEADER.size:HEADER.size + meta_len]), f
+
+
+def _records(f):
+    with f:
+        while True:
+            chunk = f.read(BATCH)
+            if not chunk:
+                return
+            whole = len(chunk) - len(chunk) % RECORD.size  # a crash may cut the last one
+            for record in RECORD.iter_unpack(chunk[:whole]):
+                if record[0]:
+                    yield record
+
+
+def wall_time(meta: dict, ts_ns: int) -> float:
+    """Unix time of a record's server-clock timestamp."""
+    return meta["created"] + (ts_ns - meta["clock_ns"]) / 1e9
+
+
+def _segment_paths(paths: list) -> list:
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            found.extend(os.path.join(path, n) for n in _segment_names(path))
+        else:
+            found.append(path)
+    return found
+
+
+def _parse_time(text: str) -> float:
+    try:
+        return datetime.datetime.fromisoformat(text).timestamp()
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            f"{text!r}: expected an ISO date/time such as 2026-10-19T12:00") from None
+
+
+def _csv_row(meta: dict, record: tuple) -> list:
+    ts, left, right, levels, flags, event, fps, temp, rtt = record
+    t = wall_time(meta, ts)
+    stamp = datetime.datetime.fromtimestamp(t).isoformat(timespec="milliseconds")
+    return [stamp, ts, EVENTS[event] if event < len(EVENTS) else event,
+            f"{left:.2f}", f"{right:.2f}", f"{levels:04b}", flags & DRIVER, flags >> 1 & 1,
+            *("" if math.isnan(v) else f"{v:.1f}" for v in (fps, temp)),
+            "" if math.isnan(rtt) else f"{rtt:.3f}"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect or export the telemetry log")
+    parser.add_argument("paths", nargs="+", help="Segments or telemetry directories")
+    parser.add_argument("--since", type=_parse_time, default=None, metavar="TIME",
+                        help="First record to export (local ISO time)")
+    parser.add_argument("--until", type=_parse_time, default=None, metavar="TIME",
+                        help="Last record to export (local ISO time)")
+    parser.add_argument("--csv", metavar="PATH", help="Export records to CSV ('-' = stdout)")
+    parser.add_argument("--events", action="store_true", help="Only event records")
+    args = parser.parse_args()
+
+    since = args.since if args.since is not None else -math.inf
+    until = args.until if args.until is not None else math.inf
+    paths = _segment_paths(args.paths)
+    out = writer = None
+    if args.csv:
+        out = sys.stdout if args.csv == "-" else open(args.csv, "w", newline="")
+        writer = csv.writer(out)
+        writer.writerow(["time", "ts_ns", "event", "left", "right", "levels", "driver",
+                         "safe_mode", "fps", "temp_c", "rtt_ms"])
+    log = sys.stderr if args.csv == "-" else sys.stdout
+
+    for i, path in enumerate(paths):
+        try:
+            meta, records = read_segment(path)
+            if i + 1 < len(paths):
+                # Segments do not overlap: skip those that ended before --since
+                next_meta, f = _open_segment(paths[i + 1])
+                f.close()
+                if next_meta["created"] <= since:
+                    records.close()
+                    continue
+        except (OSError, ValueError, EOFError) as e:
+            print(f"{path}: {e}", file=log)
+            continue
+        count, first, last = 0, None, None
+        events = collections.Counter()
+        done = False
+        try:
+            for record in records:
+                t = wall_time(meta, record[0])
+                if t > until:
+                    done = True  # records are appended in time order
+                    break
+                if t < since or (args.events and not record[5]):
+                    continue
+                count += 1
+                first = t if first is None else first
+                last = t
+                if record[5]:
+                    events[EVENTS[record[5]] if record[5] < len(EVENTS) else record[5]] += 1
+                if writer:
+                    writer.writerow(_csv_row(meta, record))
+        except (OSError, EOFError) as e:
+            print(f"{path}: truncated ({e})", file=log)
+        if count:
+            span = (f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(first))} - "
+                    f"{time.strftime('%H:%M:%S', time.localtime(last))}")
+            detail = ", ".join(f"{n} {name}" for name, n in events.items())
+            print(f"{os.path.basename(path)}: {count} records, {span}"
+                  + (f" ({detail})" if detail else ""), file=log)
+        if done:
+            records.close()
+            break
+    if out is not None and out is not sys.stdout:
+        out.close()
+
+
+def _log(msg: str):
+    print(f"[telemetry] {msg}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+"""Memory-mapped Video4Linux2 capture (USB webcams), no extra dependencies.
+
+Talks to the driver with ioctl through ctypes structs laid out like
+linux/videodev2.h, so the sizes and ioctl numbers are right on both
+32- and 64-bit ARM. The driver fills BUFFERS kernel buffers that are
+mmap()ed once at open(); frame() dequeues one, yields a memoryview
+straight into it and queues it again afterwards, so nothing is copied
+unless the caller copies.
+
+MJPEG is preferred (the camera's own JPEG can be served as-is); YUYV
+is the fallback every UVC camera supports.
+
+Usage:
+    capture = V4l2Capture("/dev/video0", (640, 480))
+    fmt = capture.open()
+    with capture.frame() as (view, sensor_ns):
+        ...
+    capture.close()
+"""
+
+import contextlib
+import ctypes
+import fcntl
+import mmap
+import os
+import select
+import time
+
+from server.clock import now_ns
+
+BUFFERS = 4
+FRAME_TIMEOUT = 2.0  # seconds without a frame before frame() raises
+
+BUF_TYPE_VIDEO_CAPTURE = 1
+MEMORY_MMAP = 1
+CAP_VIDEO_CAPTURE = 0x00000001
+CAP_STREAMING = 0x04000000
+CAP_DEVICE_CAPS = 0x80000000
+BUF_FLAG_ERROR = 0x00000040
+
+
+def fourcc(code: str) -> int:
+    return int.from_bytes(code.encode("ascii"), "little")
+
+
+FORMATS = {fourcc("MJPG"): "MJPG", fourcc("YUYV"): "YUYV"}  # in order of preference
+
+
+class _Capability(ctypes.Structure):
+    _fields_ = [("driver", ctypes.c_char * 16), ("card", ctypes.c_char * 32),
+                ("bus_info", ctypes.c_char * 32), ("version", ctypes.c_uint32),
+                ("capabilities", ctypes.c_uint32), ("device_caps", ctypes.c_uint32),
+                ("reserved", ctypes.c_uint32 * 3)]
+
+
+class _PixFormat(ctypes.Structure):
+    _fields_ = [("width", ctypes.c_uint32), ("height", ctypes.c_uint32),
+                ("pixelformat", ctypes.c_uint32), ("field", ctypes.c_uint32),
+                ("bytesperline", ctypes.c_uint32), ("sizeimage", ctypes.c_uint32),
+                ("colorspace", ctypes.c_uint32), ("priv", ctypes.c_uint32),
+                ("flags", ctypes.c_uint32), ("ycbcr_enc", ctypes.c_uint32),
+                ("quantization", ctypes.c_uint32), ("xfer_func", ctypes.c_uint32)]
+
+
+class _FormatUnion(ctypes.Union):
+    # v4l2_window in the kernel union holds pointers, hence the alignment member
+    _fields_ = [("pix", _PixFormat), ("raw_data", ctypes.c_uint8 * 200),
+                ("_align", ctypes.c_void_p)]
+
+
+class _Format(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_uint32), ("fmt", _FormatUnion)]
+
+
+class _Fract(ctypes.Structure):
+    _fields_ = [("numerator", ctypes.c_uint32), ("denominator", ctypes.c_uint32)]
+
+
+class _CaptureParm(ctypes.Structure):
+    _fields_ = [("capability", ctypes.c_uint32), ("capturemode", ctypes.c_uint32),
+                ("timeperframe", _Fract), ("extendedmode", ctypes.c_uint32),
+                ("readbuffers", ctypes.c_uint32), ("reserved", ctypes.c_uint32 * 4)]
+
+
+class _ParmUnion(ctypes.Union):
+    _fields_ = [("capture", _CaptureParm), ("raw_data", ctypes.c_uint8 * 200)]
+
+
+class _StreamParm(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_uint32), ("parm", _ParmUnion)]
+
+
+class _RequestBuffers(ctypes.Structure):
+    _fields_ = [("count", ctypes.c_uint32), ("type", ctypes.c_uint32),
+                ("memory", ctypes.c_uint32), ("capabilities", ctypes.c_uint32),
+                ("flags", ctypes.c_uint8), ("reserved", ctypes.c_uint8 * 3)]
+
+
+class _Timeval(ctypes.Structure):
+    _fields_ = [("tv_sec", ctypes.c_long), ("tv_usec", ctypes.c_long)]
+
+
+class _Timecode(ctypes.Structure):
+    _fields_ = [("type", ctypes.c_uint32), ("flags", ctypes.c_uint32),
+                ("frames", ctypes.c_uint8), ("seconds", ctypes.c_uint8),
+                ("minutes", ctypes.c_uint8), ("hours", ctypes.c_uint8),
+                ("userbits", ctypes.c_uint8 * 4)]
+
+
+class _BufferM(ctypes.Union):
+    _fields_ = [("offset", ctypes.c_uint32), ("userptr", ctypes.c_ulong),
+                ("planes", ctypes.c_void_p), ("fd", ctypes.c_int32)]
+
+
+class _Buffer(ctypes.Structure):
+    _fields_ = [("index", ctypes.c_uint32), ("type", ctypes.c_uint32),
+                ("bytesused", ctypes.c_uint32), ("flags", ctypes.c_uint32),
+                ("field", ctypes.c_uint32), ("timestamp", _Timeval),
+                ("timecode", _Timecode), ("sequence", ctypes.c_uint32),
+                ("memory", ctypes.c_uint32), ("m", _BufferM), ("length", ctypes.c_uint32),
+                ("reserved2", ctypes.c_uint32), ("request_fd", ctypes.c_int32)]
+
+
+def _ioc(direction: int, nr: int, struct) -> int:
+    return (direction << 30) | (ctypes.sizeof(struct) << 16) | (ord("V") << 8) | nr
+
+
+_R, _W = 2, 1
+VIDIOC_QUERYCAP = _ioc(_R, 0, _Capability)
+VIDIOC_S_FMT = _ioc(_R | _W, 5, _Format)
+VIDIOC_REQBUFS = _ioc(_R | _W, 8, _RequestBuffers)
+VIDIOC_QUERYBUF = _ioc(_R | _W, 9, _Buffer)
+VIDIOC_QBUF = _ioc(_R | _W, 15, _Buffer)
+VIDIOC_DQBUF = _ioc(_R | _W, 17, _Buffer)
+VIDIOC_STREAMON = _ioc(_W, 18, ctypes.c_int)
+VIDIOC_STREAMOFF = _ioc(_W, 19, ctypes.c_int)
+VIDIOC_S_PARM = _ioc(_R | _W, 22, _StreamParm)
+
+
+class V4l2Capture:
+    """Streaming capture from one V4L2 device into mmap()ed buffers.
+
+    Args:
+        device: Device node, e.g. "/dev/video0".
+        size: Requested (width, height); the driver may pick the
+            nearest it supports (see `size` after open()).
+        fps: Requested frame rate (best effort).
+    """
+
+    def __init__(self, device: str = "/dev/video0", size: tuple = (640, 480), fps: int = 30):
+        self.device = device
+        self.size = size
+        self.fps = fps
+        self.format = None
+        self.card = ""
+        self._fd = None
+        self._maps: list = []
+
+    def open(self) -> str:
+        """Open, negotiate MJPEG or YUYV and start streaming; returns the format.
+
+        Raises:
+            OSError: The device is missing, busy, or not a capture device
+                with a supported format.
+        """
+        self._fd = os.open(self.device, os.O_RDWR | os.O_NONBLOCK)
+        try:
+            cap = _Capability()
+            fcntl.ioctl(self._fd, VIDIOC_QUERYCAP, cap)
+            caps = cap.device_caps if cap.capabilities & CAP_DEVICE_CAPS else cap.capabilities
+            if not caps & CAP_VIDEO_CAPTURE or not caps & CAP_STREAMING:
+                raise OSError(f"{self.device}: not a streaming capture device")
+            self.card = cap.card.decode(errors="replace")
+            self._set_format()
+            self._set_fps()
+            self._map_buffers()
+            fcntl.ioctl(self._fd, VIDIOC_STREAMON, ctypes.c_int(BUF_TYPE_VIDEO_CAPTURE))
+        except Exception:
+            self.close()
+            raise
+        return self.format
+
+    @contextlib.contextmanager
+    def frame(self, timeout: float = FRAME_TIMEOUT):
+        """Yield (view, sensor_ns) of the next frame; the buffer is requeued on exit.
+
+        The view points into the driver's buffer and is only valid
+        inside the with-block. sensor_ns is the driver's capture time
+        converted to the server.clock reference.
+
+        Raises:
+            TimeoutError: No frame within `timeout` seconds.
+            OSError: The device went away.
+        """
+        buf = self._dequeue(timeout)
+        view = memoryview(self._maps[buf.index])[:buf.bytesused]
+        try:
+            ts = buf.timestamp.tv_sec * 1_000_000_000 + buf.timestamp.tv_usec * 1000
+            yield view, ts + now_ns() - time.monotonic_ns()  # CLOCK_MONOTONIC -> server clock
+        finally:
+            view.release()
+            fcntl.ioctl(self._fd, VIDIOC_QBUF, buf)
+
+    def close(self):
+        if self._fd is None:
+            return
+        try:
+            fcntl.ioctl(self._fd, VIDIOC_STREAMOFF, ctypes.c_int(BUF_TYPE_VIDEO_CAPTURE))
+        except OSError:
+            pass
+        for mapped in self._maps:
+            try:
+                mapped.close()
+            except BufferError:
+                pass  # a view escaped; the mapping goes with the process
+        self._maps = []
+        os.close(self._fd)
+        self._fd = None
+
+    def _set_format(self):
+        for code, name in FORMATS.items():
+            fmt = _Format(type=BUF_TYPE_VIDEO_CAPTURE)
+            fmt.fmt.pix.width, fmt.fmt.pix.height = self.size
+            fmt.fmt.pix.pixelformat = code
+            fcntl.ioctl(self._fd, VIDIOC_S_FMT, fmt)
+            if fmt.fmt.pix.pixelformat == code:  # drivers substitute what they support
+                self.format = name
+                self.size = (fmt.fmt.pix.width, fmt.fmt.pix.height)
+                return
+        raise OSError(f"{self.device}: neither MJPEG nor YUYV supported")
+
+    def _set_fps(self):
+        parm = _StreamParm(type=BUF_TYPE_VIDEO_CAPTURE)
+        parm.parm.capture.timeperframe = _Fract(1, self.fps)
+        try:
+            fcntl.ioctl(self._fd, VIDIOC_S_PARM, parm)
+        except OSError:
+            pass  # fixed-rate camera
+
+    def _map_buffers(self):
+        req = _RequestBuffers(count=BUFFERS, type=BUF_TYPE_VIDEO_CAPTURE, memory=MEMORY_MMAP)
+        fcntl.ioctl(self._fd, VIDIOC_REQBUFS, req)
+        if req.count < 2:
+            raise OSError(f"{self.device}: driver granted {req.count} buffers")
+        for index in range(req.count):
+            buf = _Buffer(index=index, type=BUF_TYPE_VIDEO_CAPTURE, memory=MEMORY_MMAP)
+            fcntl.ioctl(self._fd, VIDIOC_QUERYBUF, buf)
+            self._maps.append(mmap.mmap(self._fd, buf.length, mmap.MAP_SHARED, mmap.PROT_READ,
+                                        offset=buf.m.offset))
+            fcntl.ioctl(self._fd, VIDIOC_QBUF, buf)
+
+    def _dequeue(self, timeout: float) -> _Buffer:
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError(f"{self.device}: no frame for {timeout:.0f}s")
+            readable, _, _ = select.select([self._fd], [], [], remaining)
+            if not readable:
+                continue
+            buf = _Buffer(type=BUF_TYPE_VIDEO_CAPTURE, memory=MEMORY_MMAP)
+            try:
+                fcntl.ioctl(self._fd, VIDIOC_DQBUF, buf)
+            except BlockingIOError:
+                continue
+            if buf.flags & BUF_FLAG_ERROR:
+                fcntl.ioctl(self._fd, VIDIOC_QBUF, buf)  # corrupt frame: drop it
+                continue
+            return buf
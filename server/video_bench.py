@@ -0,0 +1,214 @@
+"""Video server scaling benchmark: asyncio httpd vs. the old Flask server.
+
+Feeds synthetic JPEG-sized frames into a StreamingOutput at a fixed
+rate, serves them with either implementation, attaches N MJPEG viewers
+from a child process, and meanwhile measures event-loop lag on a
+stand-in control loop in this process (10 ms ticks that decode a drive
+message, like ControlServer does). Reports thread count, loop lag
+percentiles and the frame rate each viewer actually received.
+
+The Flask variant reproduces the previous CameraServer (threaded dev
+server, one generator thread per viewer) and needs flask installed. The
+process variant is the default server layout: the frames are fed and
+served in a camera child process (server.camera_process), so only the
+shared-memory frame ring dispatch is left in this process.
+
+--layout repeats every run under each CPU layout (server/cpulayout.py):
+the stand-in control loop takes the control role, the feed and video
+threads (or the camera process) the video role, and the viewer
+process the background role, so the table shows control-loop jitter
+under video load per layout.
+
+Usage:
+    uv run python -m server.video_bench
+    uv run python -m server.video_bench --impl asyncio process --viewers 1 8 32 --fps 30
+    uv run python -m server.video_bench --impl process --layout off pi4 --viewers 4 16
+"""
+
+import argparse
+import asyncio
+import functools
+import json
+import multiprocessing
+import os
+import socket
+import statistics
+import threading
+import time
+
+from server import cpulayout
+from server.camera import CameraServer, StreamingOutput
+
+TICK = 0.01
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _feed(output: StreamingOutput, fps: float, frame_kb: int, stop: threading.Event):
+    body = os.urandom(frame_kb * 1024).replace(b"\xff", b"\x00")
+    frame = b"\xff\xd8" + body + b"\xff\xd9"
+    interval = 1.0 / fps
+    next_time = time.monotonic()
+    while not stop.is_set():
+        output.write(frame)
+        next_time += interval
+        stop.wait(max(0.0, next_time - time.monotonic()))
+
+
+def _feed_camera(fps: float, frame_kb: int, camera: CameraServer):
+    """CameraProcess source: synthetic frames instead of the camera."""
+    threading.Thread(target=_feed, args=(camera.output("main"), fps, frame_kb, threading.Event()),
+                     name="camera-feed", daemon=True).start()
+
+
+def _start_process(port: int, fps: float, frame_kb: int):
+    from server.camera_process import CameraProcess
+
+    camera = CameraProcess(port, source=functools.partial(_feed_camera, fps, frame_kb))
+    camera.output("main").add_tap(lambda seq, sensor_ns, view: None)
+    camera.start()
+    return camera
+
+
+def _start_asyncio(port: int) -> StreamingOutput:
+    camera = CameraServer()
+    threading.Thread(target=asyncio.run, args=(camera.serve(port),), name="video-http",
+                     daemon=True).start()
+    return camera.output("main")
+
+
+def _start_flask(port: int) -> StreamingOutput:
+    import logging
+    from flask import Flask, Response
+
+    logging.getLogger("werkzeug").setLevel(logging.ERROR)
+    output = StreamingOutput()
+    app = Flask(__name__)
+
+    @app.route("/video_feed")
+    def video_feed():
+        def generate():
+            while True:
+                with output.condition:
+                    output.condition.wait()
+                    frame = output.frame
+                yield b"--frame\r\nContent-Type: image/jpeg\r\n\r\n" + frame + b"\r\n"
+        return Response(generate(), mimetype="multipart/x-mixed-replace; boundary=frame")
+
+    threading.Thread(
+        target=app.run, kwargs={"host": "127.0.0.1", "port": port, "threaded": True}, daemon=True
+    ).start()
+    return output
+
+
+def _run_viewers(port: int, count: int, duration: float, results, layout: dict):
+    cpulayout.restore(layout)
+    cpulayout.start(role="background")
+
+    async def viewer() -> int:
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        writer.write(b"GET /video_feed?stream=main HTTP/1.0\r\n\r\n")
+        frames = 0
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            chunk = await reader.read(65536)
+            if not chunk:
+                break
+            frames += chunk.count(b"--frame")
+        writer.close()
+        return frames
+
+    async def main():
+        counts = await asyncio.gather(*(viewer() for _ in range(count)))
+        results.put([c / duration for c in counts])
+
+    asyncio.run(main())
+
+
+async def _control_loop(duration: float) -> list[float]:
+    """Lag of 10 ms ticks beyond their deadline, in ms."""
+    raw = json.dumps({"type": "drive", "axis_x": 0.1, "axis_y": -0.5})
+    lags = []
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + duration
+    while loop.time() < deadline:
+        t0 = time.perf_counter()
+        await asyncio.sleep(TICK)
+        lags.append(max(0.0, (time.perf_counter() - t0 - TICK) * 1000))
+        json.loads(raw)
+    return lags
+
+
+def _bench(impl: str, layout: str, viewers: list[int], fps: float, frame_kb: int,
+           duration: float):
+    port = _free_port()
+    stop = threading.Event()
+    cpulayout.configure(layout)
+    if impl == "process":
+        camera = _start_process(port, fps, frame_kb)
+        deadline = time.monotonic() + 20.0
+        while camera.status()["seq"] == 0 and time.monotonic() < deadline:
+            time.sleep(0.1)  # spawn and import
+        time.sleep(1.0)
+    else:
+        output = _start_asyncio(port) if impl == "asyncio" else _start_flask(port)
+        threading.Thread(target=_feed, args=(output, fps, frame_kb, stop), name="camera-feed",
+                         daemon=True).start()
+        time.sleep(1.0)
+    cpulayout.start()
+
+    for count in viewers:
+        results = multiprocessing.Queue()
+        proc = multiprocessing.Process(target=_run_viewers,
+                                       args=(port, count, duration, results, cpulayout.settings()))
+        proc.start()
+        time.sleep(0.5)
+        lags = sorted(asyncio.run(_control_loop(duration - 1.0)))
+        threads = threading.active_count()
+        rates = results.get(timeout=duration + 10) if count else [0.0]
+        proc.join()
+        print(f"{impl:>8} {layout[:12]:>12} {count:>7} {threads:>7} {statistics.median(lags):>8.2f} "
+              f"{lags[int(len(lags) * 0.99) - 1]:>8.2f} {lags[-1]:>8.2f} "
+              f"{min(rates):>8.1f} {statistics.mean(rates):>8.1f}")
+        time.sleep(0.5)
+    stop.set()
+    if impl == "process":
+        camera.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Video server viewer scaling benchmark")
+    parser.add_argument("--impl", nargs="+", choices=("asyncio", "process", "flask"),
+                        default=["asyncio", "process", "flask"])
+    parser.add_argument("--viewers", type=int, nargs="+", default=[0, 1, 4, 16, 32])
+    parser.add_argument("--fps", type=float, default=30.0)
+    parser.add_argument("--frame-kb", type=int, default=40, help="Synthetic frame size")
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds per viewer count")
+    parser.add_argument("--layout", nargs="+", default=["off"],
+                        help="CPU layouts to compare: presets (off, pi4) or layout text")
+    args = parser.parse_args()
+    for layout in args.layout:
+        try:
+            cpulayout.parse_layout(layout)
+        except ValueError as e:
+            parser.error(str(e))
+
+    print(f"{'impl':>8} {'layout':>12} {'viewers':>7} {'threads':>7} {'lag p50':>8} "
+          f"{'lag p99':>8} {'lag max':>8} {'fps min':>8} {'fps avg':>8}")
+    for impl in args.impl:
+        for layout in args.layout:
+            # Each run in its own process so threads and pinning don't carry over
+            proc = multiprocessing.Process(
+                target=_bench,
+                args=(impl, layout, args.viewers, args.fps, args.frame_kb, args.duration),
+            )
+            proc.start()
+            proc.join()
+
+
+if __name__ == "__main__":
+    main()